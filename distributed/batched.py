@@ -1,4 +1,4 @@
-from collections import deque
+from collections import defaultdict, deque
 import logging
 
 import dask
@@ -6,7 +6,8 @@ from tornado import gen, locks
 from tornado.ioloop import IOLoop
 
 from .core import CommClosedError
-from .utils import parse_timedelta
+from .sizeof import safe_sizeof as sizeof
+from .utils import parse_bytes, parse_timedelta
 
 
 logger = logging.getLogger(__name__)
@@ -15,12 +16,24 @@ logger = logging.getLogger(__name__)
 class BatchedSend(object):
     """ Batch messages in batches on a stream
 
-    This takes an IOStream and an interval (in ms) and ensures that we send no
-    more than one message every interval milliseconds.  We send lists of
+    This takes a comm and sends lists of messages on it.  Batching several
+    messages at once helps performance when sending a myriad of tiny
     messages.
 
-    Batching several messages at once helps performance when sending
-    a myriad of tiny messages.
+    Messages sent while the stream is idle go out on the next iteration of
+    the event loop, together with anything else sent until then.  Messages
+    sent while a batch is being written, or while the comm still drains
+    earlier batches to a slow peer (see ``Comm.drain``), wait and go out
+    together after that.  So batches grow with the load instead of with a
+    fixed delay.  The ``interval`` is the least time between two batches of
+    fewer than ``min_batch_size`` messages, which keeps a stream of sparse
+    messages from costing one write each.
+
+    We split long backlogs into batches of about ``max_batch_bytes``, judged
+    from the average size of the messages written so far.  Senders that can
+    wait should await ``wait_for_buffer`` to pause while the stream holds
+    more than about ``max_buffer_bytes``.  Until the first batch is written
+    we judge this from the ``sizeof`` of the first few messages.
 
     Example
     -------
@@ -37,12 +50,30 @@ class BatchedSend(object):
 
     # XXX why doesn't BatchedSend follow either the IOStream or Comm API?
 
-    def __init__(self, interval, loop=None, serializers=None):
+    def __init__(
+        self,
+        interval,
+        loop=None,
+        serializers=None,
+        min_batch_size=None,
+        max_batch_bytes=None,
+        max_buffer_bytes=None,
+    ):
         # XXX is the loop arg useful?
         self.loop = loop or IOLoop.current()
         self.interval = parse_timedelta(interval, default="ms")
+        config = dask.config.get("distributed.comm.batched-send")
+        if min_batch_size is None:
+            min_batch_size = config["min-batch-size"]
+        self.min_batch_size = min_batch_size
+        self.max_batch_bytes = parse_bytes(max_batch_bytes or config["max-batch-size"])
+        self.max_buffer_bytes = parse_bytes(
+            max_buffer_bytes or config["max-buffer-size"]
+        )
         self.waker = locks.Event()
         self.stopped = locks.Event()
+        self.below_limit = locks.Event()
+        self.below_limit.set()
         self.please_stop = False
         self.buffer = []
         self.comm = None
@@ -50,6 +81,17 @@ class BatchedSend(object):
         self.batch_count = 0
         self.byte_count = 0
         self.next_deadline = None
+        # Age of the oldest message in the buffer, and metrics
+        self.oldest = None
+        self.bytes_per_message = None
+        self._sampled_bytes = 0  # sizeof of the first messages
+        self._sampled_count = 0
+        self.max_queue_depth = 0
+        self.batch_sizes = defaultdict(int)  # power of two -> count
+        self.batch_nbytes = defaultdict(int)
+        self.latency_total = 0
+        self.latency_max = 0
+        self.backpressure_count = 0
         self.recent_message_log = deque(
             maxlen=dask.config.get("distributed.comm.recent-messages-log-length")
         )
@@ -70,24 +112,70 @@ class BatchedSend(object):
 
     __str__ = __repr__
 
+    @property
+    def buffer_bytes(self):
+        """ Estimated size of the messages waiting to be sent """
+        bytes_per_message = self.bytes_per_message
+        if bytes_per_message is None and self._sampled_count:
+            bytes_per_message = self._sampled_bytes / self._sampled_count
+        return len(self.buffer) * (bytes_per_message or 0)
+
+    def _next_batch(self):
+        """ Take the next batch out of the buffer
+
+        Returns the batch, and the time since which its oldest message waited.
+        """
+        if self.bytes_per_message:
+            n = max(1, int(self.max_batch_bytes // self.bytes_per_message))
+        else:
+            n = len(self.buffer)
+        if n >= len(self.buffer):
+            payload, self.buffer = self.buffer, []
+        else:
+            payload, self.buffer = self.buffer[:n], self.buffer[n:]
+        # The rest of the backlog waits from now on for the next batch
+        oldest = self.oldest
+        self.oldest = self.loop.time() if self.buffer else None
+        return payload, oldest
+
+    def _record_batch(self, payload, nbytes, oldest):
+        n = len(payload)
+        self.batch_sizes[1 << (n.bit_length() - 1)] += 1
+        self.batch_nbytes[1 << (max(nbytes, 1).bit_length() - 1)] += 1
+        if self.bytes_per_message is None:
+            self.bytes_per_message = nbytes / n
+        else:
+            # Moving average over batches, weighted by their messages
+            weight = min(n / 100, 1)
+            self.bytes_per_message += weight * (nbytes / n - self.bytes_per_message)
+        latency = self.loop.time() - oldest
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+        if self.buffer_bytes <= self.max_buffer_bytes:
+            self.below_limit.set()
+
     @gen.coroutine
     def _background_send(self):
         while not self.please_stop:
-            try:
-                yield self.waker.wait(self.next_deadline)
-                self.waker.clear()
-            except gen.TimeoutError:
-                pass
             if not self.buffer:
                 # Nothing to send
-                self.next_deadline = None
+                yield self.waker.wait()
+                self.waker.clear()
                 continue
             if self.next_deadline is not None and self.loop.time() < self.next_deadline:
-                # Send interval not expired yet
+                # A small batch went out recently, let more messages gather
+                try:
+                    yield self.waker.wait(self.next_deadline)
+                except gen.TimeoutError:
+                    pass
+                self.waker.clear()
                 continue
-            payload, self.buffer = self.buffer, []
+            payload, oldest = self._next_batch()
             self.batch_count += 1
-            self.next_deadline = self.loop.time() + self.interval
+            if len(payload) < self.min_batch_size:
+                self.next_deadline = self.loop.time() + self.interval
+            else:
+                self.next_deadline = None
             try:
                 nbytes = yield self.comm.write(
                     payload, serializers=self.serializers, on_error="raise"
@@ -97,6 +185,9 @@ class BatchedSend(object):
                 else:
                     self.recent_message_log.append("large-message")
                 self.byte_count += nbytes
+                # Messages sent in the meantime gather until the peer caught up
+                yield self.comm.drain()
+                self._record_batch(payload, nbytes, oldest)
             except CommClosedError as e:
                 logger.info("Batched Comm Closed: %s", e)
                 break
@@ -106,6 +197,7 @@ class BatchedSend(object):
             finally:
                 payload = None  # lose ref
 
+        self.below_limit.set()
         self.stopped.set()
 
     def send(self, msg):
@@ -118,9 +210,49 @@ class BatchedSend(object):
 
         self.message_count += 1
         self.buffer.append(msg)
-        # Avoid spurious wakeups if possible
-        if self.next_deadline is None:
+        if self.bytes_per_message is None and self._sampled_count < 100:
+            self._sampled_bytes += sizeof(msg)
+            self._sampled_count += 1
+        if len(self.buffer) == 1:
+            self.oldest = self.loop.time()
             self.waker.set()
+        if len(self.buffer) > self.max_queue_depth:
+            self.max_queue_depth = len(self.buffer)
+        if self.buffer_bytes > self.max_buffer_bytes and self.below_limit.is_set():
+            self.below_limit.clear()
+            self.backpressure_count += 1
+
+    async def wait_for_buffer(self):
+        """ Wait while the buffer holds more than ``max_buffer_bytes``
+
+        Senders that produce many messages await this to slow down to the
+        pace of the comm.
+        """
+        if not self.below_limit.is_set():
+            await self.below_limit.wait()
+
+    def get_metrics(self):
+        """ Queue depth, histograms of batch sizes and flush latency
+
+        Histograms count batches by their number of messages and bytes,
+        rounded down to a power of two.  Latency is the time from when the
+        oldest message of a batch is sent until the comm has written it.
+        """
+        return {
+            "queue-depth": len(self.buffer),
+            "max-queue-depth": self.max_queue_depth,
+            "buffer-bytes": self.buffer_bytes,
+            "batches": self.batch_count,
+            "messages": self.message_count,
+            "bytes": self.byte_count,
+            "batch-sizes": dict(self.batch_sizes),
+            "batch-bytes": dict(self.batch_nbytes),
+            "latency-mean": self.latency_total / self.batch_count
+            if self.batch_count
+            else 0,
+            "latency-max": self.latency_max,
+            "backpressure": self.backpressure_count,
+        }
 
     @gen.coroutine
     def close(self):
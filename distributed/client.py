@@ -65,6 +65,7 @@ from .pubsub import PubSubClientExtension
 from .security import Security
 from .sizeof import sizeof
 from .threadpoolexecutor import rejoin
+from .task_cache import extract_payloads
 from .worker import dumps_task, get_client, get_worker, secede
 from .diagnostics.plugin import WorkerPlugin
 from .utils import (
@@ -2482,10 +2483,14 @@ class Client(Node):
             if isinstance(retries, Number) and retries > 0:
                 retries = {k: retries for k in dsk3}
 
+            tasks = valmap(dumps_task, dsk3)
+            payloads = extract_payloads(tasks)
+
             self._send_to_scheduler(
                 {
                     "op": "update-graph",
-                    "tasks": valmap(dumps_task, dsk3),
+                    "tasks": tasks,
+                    "payloads": payloads,
                     "dependencies": dependencies,
                     "keys": list(flatkeys),
                     "restrictions": restrictions or {},
@@ -9,6 +9,8 @@ from .addressing import (
     get_address_host,
     get_local_address_for,
 )
+import sys
+
 from .core import connect, listen, Comm, CommClosedError
 
 
@@ -16,6 +18,9 @@ def _register_transports():
     from . import inproc
     from . import tcp
 
+    if sys.version_info >= (3, 7):  # asyncio.BufferedProtocol
+        from . import asyncio_tcp
+
     try:
         from . import ucx
     except ImportError:
@@ -0,0 +1,563 @@
+import asyncio
+import collections
+import errno
+import inspect
+import logging
+import socket
+import struct
+import sys
+import weakref
+
+try:
+    import ssl
+except ImportError:
+    ssl = None
+
+import dask
+
+from ..protocol.compression import CompressionPolicy
+from ..protocol.core import MessageTemplates
+from ..utils import nbytes, shutting_down
+
+from .registry import backends
+from .addressing import parse_host_port, unparse_host_port
+from .buffers import receive_buffer
+from .core import Comm, Connector, Listener, CommClosedError, FatalCommClosedError
+from .tcp import (
+    BaseTCPBackend,
+    RequireEncryptionMixin,
+    _coalesce_frames,
+    _expect_tls_context,
+    set_socket_timeout,
+)
+from .utils import to_frames, from_frames, ensure_concrete_host
+
+
+logger = logging.getLogger(__name__)
+
+
+# Frames at least this large are received directly into their own buffer,
+# smaller ones are received through a shared buffer of this size
+READ_BUFFER_SIZE = 2 ** 16
+
+# Before Python 3.12, selector transports join the buffers of writelines(),
+# and copy what they can't send at once into a buffer that they shift after
+# each send.  There we write large frames in chunks of this size, waiting
+# for the transport to drain in between.
+VECTORED_WRITELINES = sys.version_info >= (3, 12)
+WRITE_CHUNK_SIZE = 2 ** 18
+
+
+def _closed_error(exc, obj=None):
+    """
+    The CommClosedError for a connection lost because of *exc*.
+    """
+    prefix = "" if obj is None else "in %s: " % (obj,)
+    if exc is None:
+        return CommClosedError(prefix + "Connection closed")
+    msg = "%s%s: %s" % (prefix, exc.__class__.__name__, exc)
+    if ssl and isinstance(exc, ssl.SSLError):
+        if "UNKNOWN_CA" in (exc.reason or ""):
+            return FatalCommClosedError(msg)
+    return CommClosedError(msg)
+
+
+def _as_buffer(frame):
+    """ A frame as a type that asyncio transports write byte by byte """
+    if type(frame) in (bytes, bytearray):
+        return frame
+    return memoryview(frame).cast("B")
+
+
+class DaskCommProtocol(asyncio.BufferedProtocol):
+    """ Messages of frames over an asyncio transport
+
+    Messages use the same framing as the Tornado TCP comm: the number of
+    frames and the length of each frame as 8-byte integers, then the frames.
+    The transport asks ``get_buffer`` where to put received data: while a
+    frame has at least ``READ_BUFFER_SIZE`` bytes left to receive we return
+    the rest of that frame's own buffer, so large frames go straight into
+    their final place, a buffer of the pool of ``distributed.comm.buffers``.
+    Anything smaller is received into a shared buffer and copied out, which
+    takes fewer system calls for small messages.
+
+    Parameters
+    ----------
+    on_connection: callable, optional
+        Called with the protocol once the connection is made
+    """
+
+    def __init__(self, on_connection=None):
+        self.on_connection = on_connection
+        self.transport = None
+        self._loop = asyncio.get_event_loop()
+        self._exception = None
+        self._messages = collections.deque()
+        self._read_waiter = None
+        self._drain_waiter = None
+        self._paused = False
+        self._write_lock = asyncio.Lock()
+        self._closed = self._loop.create_future()
+
+        self._buffer = memoryview(bytearray(READ_BUFFER_SIZE))
+        self._use_buffer = True
+        # The message being received
+        self._nframes = None
+        self._lengths = None
+        self._frames = None
+        # The segment being received: frame count, frame lengths or a frame
+        self._start_segment(8)
+
+    def connection_made(self, transport):
+        self.transport = transport
+        if self.on_connection is not None:
+            self.on_connection(self)
+
+    def connection_lost(self, exc):
+        self._exception = _closed_error(exc)
+        for waiter in [self._read_waiter, self._drain_waiter]:
+            if waiter is not None and not waiter.done():
+                waiter.set_exception(self._exception)
+        self._read_waiter = self._drain_waiter = None
+        if not self._closed.done():
+            self._closed.set_result(None)
+
+    def pause_writing(self):
+        self._paused = True
+
+    def resume_writing(self):
+        self._paused = False
+        waiter, self._drain_waiter = self._drain_waiter, None
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    # Reading
+
+    def get_buffer(self, sizehint):
+        if len(self._segment) - self._offset >= READ_BUFFER_SIZE:
+            self._use_buffer = False
+            return self._segment_view[self._offset :]
+        self._use_buffer = True
+        return self._buffer
+
+    def buffer_updated(self, nbytes):
+        if not self._use_buffer:
+            self._offset += nbytes
+            if self._offset == len(self._segment):
+                self._segment_done()
+            return
+
+        data = self._buffer[:nbytes]
+        while data:
+            n = min(len(data), len(self._segment) - self._offset)
+            self._segment_view[self._offset : self._offset + n] = data[:n]
+            self._offset += n
+            data = data[n:]
+            if self._offset == len(self._segment):
+                self._segment_done()
+
+    def _start_segment(self, length):
+        self._segment = receive_buffer(length)
+        self._segment_view = memoryview(self._segment)
+        self._offset = 0
+
+    def _segment_done(self):
+        """ Handle a complete segment and start the next non-empty one """
+        while True:
+            if self._nframes is None:
+                self._nframes = struct.unpack("Q", self._segment)[0]
+                length = 8 * self._nframes
+            else:
+                if self._lengths is None:
+                    self._lengths = struct.unpack("%dQ" % self._nframes, self._segment)
+                    self._frames = []
+                else:
+                    self._frames.append(self._segment)
+                i = len(self._frames)
+                while i < self._nframes and not self._lengths[i]:
+                    self._frames.append(b"")
+                    i += 1
+                if i == self._nframes:
+                    self._message_done()
+                    length = 8
+                else:
+                    length = self._lengths[i]
+            self._start_segment(length)
+            if length:
+                return
+
+    def _message_done(self):
+        frames = self._frames
+        self._nframes = self._lengths = self._frames = None
+        waiter, self._read_waiter = self._read_waiter, None
+        if waiter is not None and not waiter.done():
+            waiter.set_result(frames)
+        else:
+            self._messages.append(frames)
+
+    async def read(self):
+        """ The frames of the next message """
+        if self._messages:
+            return self._messages.popleft()
+        if self._exception is not None:
+            raise self._exception
+        self._read_waiter = self._loop.create_future()
+        return await self._read_waiter
+
+    # Writing
+
+    async def write(self, frames):
+        """ Write the frames of a message
+
+        Writes of concurrent messages go one after the other, so that their
+        chunks don't interleave while we wait for the transport to drain.
+        """
+        async with self._write_lock:
+            if self._exception is not None:
+                raise self._exception
+            if self.transport.is_closing():
+                raise CommClosedError("Connection closing")
+            frames = [_as_buffer(frame) for frame in frames]
+            lengths = [nbytes(frame) for frame in frames]
+            header = struct.pack("%dQ" % (len(frames) + 1), len(frames), *lengths)
+            buffers = _coalesce_frames(header, frames, lengths)
+            if VECTORED_WRITELINES:
+                self.transport.writelines(buffers)
+            else:
+                for buffer in buffers:
+                    if len(buffer) <= WRITE_CHUNK_SIZE:
+                        self.transport.write(buffer)
+                        continue
+                    buffer = memoryview(buffer)
+                    for i in range(0, len(buffer), WRITE_CHUNK_SIZE):
+                        if self._paused:
+                            await self._drain()
+                        self.transport.write(buffer[i : i + WRITE_CHUNK_SIZE])
+            if self._paused:
+                await self._drain()
+
+    async def _drain(self):
+        if self._exception is not None:
+            raise self._exception  # the connection is lost, nothing drains
+        if self._drain_waiter is None:
+            self._drain_waiter = self._loop.create_future()
+        await self._drain_waiter
+
+    # Closing
+
+    @property
+    def is_closed(self):
+        return self._exception is not None or self.transport.is_closing()
+
+    async def close(self):
+        """ Flush the outgoing data and close the connection """
+        if not self.transport.is_closing():
+            self.transport.close()
+        await self._closed
+
+    def abort(self):
+        self.transport.abort()
+
+
+class AsyncioTCP(Comm):
+    """
+    An established communication based on an asyncio transport.
+    """
+
+    def __init__(self, protocol, local_addr, peer_addr, deserialize=True):
+        Comm.__init__(self)
+        self._protocol = protocol
+        self._local_addr = local_addr
+        self._peer_addr = peer_addr
+        self.deserialize = deserialize
+        self.compression_policy = CompressionPolicy()
+        if dask.config.get("distributed.comm.templates"):
+            self.templates = MessageTemplates()
+        else:
+            self.templates = None
+        self._closed = False
+        self._finalizer = weakref.finalize(self, self._get_finalizer())
+        self._finalizer.atexit = False
+        self._extra = {}
+
+        sock = protocol.transport.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            set_socket_timeout(sock)
+        self._read_extra()
+
+    def _read_extra(self):
+        pass
+
+    def _get_finalizer(self):
+        def finalize(transport=self._protocol.transport, r=repr(self)):
+            if not transport.is_closing():
+                logger.warning("Closing dangling stream in %s" % (r,))
+                transport.close()
+
+        return finalize
+
+    @property
+    def local_address(self):
+        return self._local_addr
+
+    @property
+    def peer_address(self):
+        return self._peer_addr
+
+    async def read(self, deserializers=None):
+        if self._closed:
+            raise CommClosedError
+
+        try:
+            frames = await self._protocol.read()
+        except CommClosedError as e:
+            msg = "in %s: %s" % (self, e)
+            self._closed = True
+            self._finalizer.detach()
+            if not shutting_down():
+                raise e.__class__(msg) from None
+        else:
+            try:
+                msg = await from_frames(
+                    frames,
+                    deserialize=self.deserialize,
+                    deserializers=deserializers,
+                    templates=self.templates,
+                )
+            except EOFError:
+                # Frames possibly garbled or truncated by communication error
+                self.abort()
+                raise CommClosedError("aborted stream on truncated data")
+            return msg
+
+    async def write(self, msg, serializers=None, on_error="message"):
+        if self._closed:
+            raise CommClosedError
+
+        frames = await to_frames(
+            msg,
+            serializers=serializers,
+            on_error=on_error,
+            context={"sender": self._local_addr, "recipient": self._peer_addr},
+            compression_policy=self.compression_policy,
+            templates=self.templates,
+        )
+        try:
+            await self._protocol.write(frames)
+        except CommClosedError as e:
+            msg = "in %s: %s" % (self, e)
+            self._closed = True
+            self._finalizer.detach()
+            raise e.__class__(msg) from None
+
+        return sum(map(nbytes, frames))
+
+    async def close(self):
+        if not self._closed:
+            self._closed = True
+            self._finalizer.detach()
+            await self._protocol.close()
+
+    def abort(self):
+        if not self._closed:
+            self._closed = True
+            self._finalizer.detach()
+            self._protocol.abort()
+
+    def closed(self):
+        return self._closed or self._protocol.is_closed
+
+    @property
+    def extra_info(self):
+        return self._extra
+
+
+class AsyncioTLS(AsyncioTCP):
+    """
+    A TLS-specific version of AsyncioTCP.
+    """
+
+    def _read_extra(self):
+        AsyncioTCP._read_extra(self)
+        transport = self._protocol.transport
+        cipher = transport.get_extra_info("cipher")
+        if cipher is not None:
+            self._extra.update(
+                peercert=transport.get_extra_info("peercert"), cipher=cipher
+            )
+            cipher, proto, bits = cipher
+            logger.debug(
+                "TLS connection with %r: protocol=%s, cipher=%s, bits=%d",
+                self._peer_addr,
+                proto,
+                cipher,
+                bits,
+            )
+
+
+def _get_transport_address(transport, name):
+    address = transport.get_extra_info(name)
+    if address is None:
+        return "<closed>"
+    return unparse_host_port(*address[:2])
+
+
+class BaseAsyncioTCPConnector(Connector, RequireEncryptionMixin):
+    async def connect(self, address, deserialize=True, **connection_args):
+        self._check_encryption(address, connection_args)
+        ip, port = parse_host_port(address)
+        kwargs = self._get_connect_args(**connection_args)
+        loop = asyncio.get_event_loop()
+
+        try:
+            transport, protocol = await loop.create_connection(
+                DaskCommProtocol, ip, port, **kwargs
+            )
+        except EnvironmentError as e:
+            # The socket connect() call or the TLS handshake failed
+            raise _closed_error(e, self) from None
+
+        local_address = self.prefix + _get_transport_address(transport, "sockname")
+        return self.comm_class(
+            protocol, local_address, self.prefix + address, deserialize
+        )
+
+
+class AsyncioTCPConnector(BaseAsyncioTCPConnector):
+    prefix = "asyncio-tcp://"
+    comm_class = AsyncioTCP
+    encrypted = False
+
+    def _get_connect_args(self, **connection_args):
+        return {}
+
+
+class AsyncioTLSConnector(BaseAsyncioTCPConnector):
+    prefix = "asyncio-tls://"
+    comm_class = AsyncioTLS
+    encrypted = True
+
+    def _get_connect_args(self, **connection_args):
+        ctx = _expect_tls_context(connection_args)
+        return {"ssl": ctx}
+
+
+class BaseAsyncioTCPListener(Listener, RequireEncryptionMixin):
+    def __init__(
+        self, address, comm_handler, deserialize=True, default_port=0, **connection_args
+    ):
+        self._check_encryption(address, connection_args)
+        self.ip, self.port = parse_host_port(address, default_port)
+        self.comm_handler = comm_handler
+        self.deserialize = deserialize
+        self.server_args = self._get_server_args(**connection_args)
+        self.server = None
+        self.bound_address = None
+
+    async def start(self):
+        loop = asyncio.get_event_loop()
+        backlog = int(dask.config.get("distributed.comm.socket-backlog"))
+        for i in range(5):
+            try:
+                # When shuffling data between workers, there can
+                # really be O(cluster size) connection requests
+                # on a single worker socket, make sure the backlog
+                # is large enough not to lose any.
+                self.server = await loop.create_server(
+                    lambda: DaskCommProtocol(self._on_connection),
+                    host=self.ip or None,
+                    port=self.port,
+                    backlog=backlog,
+                    **self.server_args
+                )
+            except EnvironmentError as e:
+                # EADDRINUSE can happen sporadically when trying to bind
+                # to an ephemeral port
+                if self.port != 0 or e.errno != errno.EADDRINUSE:
+                    raise
+                exc = e
+            else:
+                break
+        else:
+            raise exc
+        self.get_host_port()  # trigger assignment to self.bound_address
+
+    def stop(self):
+        server, self.server = self.server, None
+        if server is not None:
+            server.close()
+
+    def _check_started(self):
+        if self.server is None:
+            raise ValueError("invalid operation on non-started AsyncioTCPListener")
+
+    def _on_connection(self, protocol):
+        transport = protocol.transport
+        address = self.prefix + _get_transport_address(transport, "peername")
+        logger.debug("Incoming connection from %r to %r", address, self.contact_address)
+        local_address = self.prefix + _get_transport_address(transport, "sockname")
+        comm = self.comm_class(protocol, local_address, address, self.deserialize)
+        result = self.comm_handler(comm)
+        if inspect.isawaitable(result):
+            asyncio.ensure_future(result)
+
+    def get_host_port(self):
+        """
+        The listening address as a (host, port) tuple.
+        """
+        self._check_started()
+
+        if self.bound_address is None:
+            self.bound_address = self.server.sockets[0].getsockname()
+        # IPv6 getsockname() can return more a 4-len tuple
+        return self.bound_address[:2]
+
+    @property
+    def listen_address(self):
+        """
+        The listening address as a string.
+        """
+        return self.prefix + unparse_host_port(*self.get_host_port())
+
+    @property
+    def contact_address(self):
+        """
+        The contact address as a string.
+        """
+        host, port = self.get_host_port()
+        host = ensure_concrete_host(host)
+        return self.prefix + unparse_host_port(host, port)
+
+
+class AsyncioTCPListener(BaseAsyncioTCPListener):
+    prefix = "asyncio-tcp://"
+    comm_class = AsyncioTCP
+    encrypted = False
+
+    def _get_server_args(self, **connection_args):
+        return {}
+
+
+class AsyncioTLSListener(BaseAsyncioTCPListener):
+    prefix = "asyncio-tls://"
+    comm_class = AsyncioTLS
+    encrypted = True
+
+    def _get_server_args(self, **connection_args):
+        ctx = _expect_tls_context(connection_args)
+        return {"ssl": ctx}
+
+
+class AsyncioTCPBackend(BaseTCPBackend):
+    _connector_class = AsyncioTCPConnector
+    _listener_class = AsyncioTCPListener
+
+
+class AsyncioTLSBackend(BaseTCPBackend):
+    _connector_class = AsyncioTLSConnector
+    _listener_class = AsyncioTLSListener
+
+
+backends["asyncio-tcp"] = AsyncioTCPBackend()
+backends["asyncio-tls"] = AsyncioTLSBackend()
@@ -0,0 +1,211 @@
+"""
+Latency and throughput benchmarks of the comm backends
+
+Compare backends by running, for example::
+
+    python -m distributed.comm.benchmark tcp:// asyncio-tcp://
+
+TLS addresses like ``asyncio-tls://`` use the TLS configuration of
+``distributed.comm.tls``.
+"""
+import asyncio
+import os
+import sys
+
+from ..metrics import time
+from ..protocol import to_serialize
+from ..security import Security
+from ..utils import format_bytes, format_time
+from . import connect, listen, parse_address, CommClosedError
+
+
+async def _serve(comm):
+    """ Read messages and send back those that ask for a reply """
+    try:
+        while True:
+            msg = await comm.read()
+            if isinstance(msg, dict) and msg["reply"]:
+                await comm.write(msg)
+    except CommClosedError:
+        pass
+
+
+def _connection_args(addr, security=None):
+    if "tls" not in parse_address(addr)[0]:
+        return {}, {}
+    security = security or Security()
+    return (
+        security.get_listen_args("scheduler"),
+        security.get_connection_args("client"),
+    )
+
+
+async def _run(addr, func, security=None):
+    """ Call ``func`` with a comm connected to a server on ``addr`` """
+    listen_args, connect_args = _connection_args(addr, security)
+    # The server passes data through without deserializing it
+    async with listen(
+        addr, _serve, deserialize=False, connection_args=listen_args
+    ) as listener:
+        comm = await connect(listener.contact_address, connection_args=connect_args)
+        try:
+            return await func(comm)
+        finally:
+            await comm.close()
+
+
+async def latency(addr, n=1000, nbytes=0, security=None):
+    """ Round-trip times of messages between two comms
+
+    Parameters
+    ----------
+    addr: str
+        Address to listen on, like ``"tcp://127.0.0.1"``
+    n: int
+        Number of messages
+    nbytes: int
+        Size of the data in each message
+    security: Security, optional
+        TLS configuration for TLS addresses
+
+    Returns
+    -------
+    The sorted round-trip times in seconds
+    """
+    msg = {"reply": True, "data": to_serialize(os.urandom(nbytes))}
+
+    async def roundtrips(comm):
+        durations = []
+        for i in range(n):
+            start = time()
+            await comm.write(msg)
+            await comm.read()
+            durations.append(time() - start)
+        return sorted(durations)
+
+    return await _run(addr, roundtrips, security=security)
+
+
+async def throughput(addr, nbytes=2 ** 20, n=100, security=None):
+    """ Bytes per second sent from one comm to another
+
+    Sends ``n`` messages of ``nbytes`` bytes each, then waits for the peer to
+    acknowledge them.  Parameters are as for ``latency``.
+    """
+    msg = {"reply": False, "data": to_serialize(os.urandom(nbytes))}
+
+    async def send(comm):
+        start = time()
+        for i in range(n):
+            await comm.write(msg)
+            await asyncio.sleep(0)  # let the peer read in the same event loop
+        await comm.write({"reply": True})
+        await comm.read()
+        return nbytes * n / (time() - start)
+
+    return await _run(addr, send, security=security)
+
+
+async def message_rate(addr, n=100000, batch_size=100, security=None):
+    """ Messages per second sent in batches, like those of a BatchedSend
+
+    Sends ``n`` small messages, shaped like the ``"task-finished"`` messages
+    of workers, in lists of ``batch_size``.  Parameters are as for
+    ``latency``.
+    """
+    batch = [
+        {
+            "op": "task-finished",
+            "status": "OK",
+            "key": "inc-%032x" % i,
+            "nbytes": 28,
+            "thread": 140000000000 + i,
+            "typename": "int",
+            "startstops": [{"action": "compute", "start": 1e9 + i, "stop": 1e9 + i}],
+        }
+        for i in range(batch_size)
+    ]
+
+    async def send(comm):
+        # Both ends send a message first, like a worker and the scheduler
+        await comm.write({"reply": True})
+        await comm.read()
+        start = time()
+        for i in range(max(1, n // batch_size)):
+            await comm.write(batch)
+            await asyncio.sleep(0)
+        await comm.write({"reply": True})
+        await comm.read()
+        return max(1, n // batch_size) * batch_size / (time() - start)
+
+    return await _run(addr, send, security=security)
+
+
+async def run(
+    addresses, sizes=(2 ** 10, 2 ** 20, 2 ** 26), n=1000, total=2 ** 27, security=None
+):
+    """ Benchmark each address
+
+    Measures the latency of ``n`` empty messages, the rate of ``100 * n``
+    small messages sent in batches, and throughput with messages of each of
+    ``sizes``, sending about ``total`` bytes of each size.
+
+    Returns
+    -------
+    A list with one dict of results per address
+    """
+    results = []
+    for addr in addresses:
+        durations = await latency(addr, n=n, security=security)
+        result = {
+            "address": addr,
+            "latency-median": durations[len(durations) // 2],
+            "latency-99%": durations[int(len(durations) * 0.99)],
+            "messages/s": await message_rate(addr, n=100 * n, security=security),
+        }
+        for size in sizes:
+            count = max(1, total // size)
+            result["throughput-%d" % size] = await throughput(
+                addr, nbytes=size, n=count, security=security
+            )
+        results.append(result)
+    return results
+
+
+def format_results(results):
+    """ The results of ``run`` as a table """
+    columns = list(results[0])
+    header = [
+        "throughput " + format_bytes(int(column.split("-")[1]))
+        if column.startswith("throughput")
+        else column
+        for column in columns
+    ]
+    rows = [header]
+    for result in results:
+        row = []
+        for column in columns:
+            value = result[column]
+            if column.startswith("latency"):
+                value = format_time(value)
+            elif column == "messages/s":
+                value = int(value)
+            elif column.startswith("throughput"):
+                value = format_bytes(value) + "/s"
+            row.append(value)
+        rows.append(row)
+    widths = [max(len(str(row[i])) for row in rows) for i in range(len(columns))]
+    return "\n".join(
+        "  ".join(str(value).ljust(width) for value, width in zip(row, widths))
+        for row in rows
+    )
+
+
+def main(addresses=None):
+    addresses = addresses or ["tcp://127.0.0.1", "asyncio-tcp://127.0.0.1"]
+    results = asyncio.get_event_loop().run_until_complete(run(addresses))
+    print(format_results(results))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
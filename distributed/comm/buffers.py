@@ -0,0 +1,188 @@
+"""
+A pool of reusable, page-aligned buffers to receive large frames into
+"""
+from collections import defaultdict, deque
+import ctypes
+import mmap
+import threading
+import weakref
+
+import dask
+
+from ..utils import parse_bytes
+
+PAGE_SIZE = mmap.PAGESIZE
+
+
+def size_class(length):
+    """ The capacity of the pooled buffer that holds ``length`` bytes
+
+    Capacities are multiples of the page size, in four steps between
+    consecutive powers of two, so a buffer exceeds its contents by less than a
+    quarter.
+
+    >>> size_class(100000)
+    114688
+    """
+    step = max(1 << max(length.bit_length() - 3, 0), PAGE_SIZE)
+    return -(-length // step) * step
+
+
+class BufferPool(object):
+    """ Reusable buffers to receive frames into
+
+    Comms that receive a large frame ask the pool for a buffer of the frame's
+    length.  The memory comes from an anonymous memory map, so it is page
+    aligned and goes back to the operating system, rather than to the heap of
+    the allocator, when the pool lets go of it.  This avoids fragmenting the
+    heap with many large, short-lived frames, as when workers shuffle data.
+
+    The pool lends a writable memoryview of exactly the requested length.
+    Objects deserialized from the frame without copying, like NumPy arrays,
+    keep it alive.  Once the last of them is gone the memory map returns to
+    the pool, to be lent again for a frame of the same size class (see
+    ``size_class``).  The pool keeps up to ``max_idle`` bytes of unused
+    buffers and unmaps the rest.
+
+    Parameters
+    ----------
+    min_size: int
+        Smaller frames are better served by the allocator
+    max_idle: int
+        Bytes of unused buffers to keep
+
+    Examples
+    --------
+    >>> pool = BufferPool()
+    >>> buffer = pool.get(100000)
+    >>> len(buffer)
+    100000
+    >>> pool.get_metrics()["in-use-bytes"]
+    114688
+    >>> del buffer
+    >>> pool.get_metrics()["idle-bytes"]
+    114688
+    """
+
+    def __init__(self, min_size=2 ** 16, max_idle=2 ** 26):
+        self.min_size = min_size
+        self.max_idle = max_idle
+        self._free = defaultdict(list)  # capacity -> unused memory maps
+        # Buffers given back while another caller held the lock
+        self._returned = deque()
+        self._lock = threading.Lock()
+        self.allocations = 0
+        self.reuses = 0
+        self.discards = 0
+        self.in_use_bytes = 0
+        self.requested_bytes = 0
+        self.idle_bytes = 0
+
+    def get(self, length):
+        """ A writable memoryview of ``length`` bytes """
+        capacity = size_class(length)
+        with self._lock:
+            self._process_returned()
+            free = self._free.get(capacity)
+            if free:
+                mm = free.pop()
+                self.idle_bytes -= capacity
+                self.reuses += 1
+            else:
+                mm = None
+                self.allocations += 1
+            self.in_use_bytes += capacity
+            self.requested_bytes += length
+        if mm is None:
+            mm = mmap.mmap(-1, capacity)
+        # Views of the ctypes array, unlike those of the memory map, let us
+        # know when they are all gone
+        buffer = (ctypes.c_char * length).from_buffer(mm)
+        finalizer = weakref.finalize(buffer, self._release, mm, capacity, length)
+        finalizer.atexit = False
+        return memoryview(buffer).cast("B")
+
+    def _release(self, mm, capacity, length):
+        # The garbage collector may call this while the current thread holds
+        # the lock, so we queue the buffer and only process it if we can
+        self._returned.append((mm, capacity, length))
+        if self._lock.acquire(blocking=False):
+            try:
+                self._process_returned()
+            finally:
+                self._lock.release()
+
+    def _process_returned(self):
+        while self._returned:
+            mm, capacity, length = self._returned.popleft()
+            self.in_use_bytes -= capacity
+            self.requested_bytes -= length
+            if self.idle_bytes + capacity <= self.max_idle:
+                self._free[capacity].append(mm)
+                self.idle_bytes += capacity
+            else:
+                # Unmapped once the last reference to it is gone
+                self.discards += 1
+
+    def clear(self):
+        """ Unmap all unused buffers """
+        with self._lock:
+            self._process_returned()
+            self.discards += sum(map(len, self._free.values()))
+            self._free.clear()
+            self.idle_bytes = 0
+
+    def get_metrics(self):
+        """ Counts of allocated and reused buffers, and bytes held
+
+        Fragmentation is the fraction of held bytes, lent or idle, that don't
+        hold a frame.
+        """
+        with self._lock:
+            self._process_returned()
+            held = self.in_use_bytes + self.idle_bytes
+            return {
+                "allocations": self.allocations,
+                "reuses": self.reuses,
+                "discards": self.discards,
+                "in-use-bytes": self.in_use_bytes,
+                "requested-bytes": self.requested_bytes,
+                "idle-bytes": self.idle_bytes,
+                "fragmentation": 1 - self.requested_bytes / held if held else 0,
+            }
+
+    def __repr__(self):
+        return "<BufferPool: %d bytes in use, %d idle>" % (
+            self.in_use_bytes,
+            self.idle_bytes,
+        )
+
+
+_pool = None
+
+
+def get_buffer_pool():
+    """ The buffer pool of this process
+
+    Configured by ``distributed.comm.buffer-pool`` when first used.  None if
+    the pool is disabled.
+    """
+    global _pool
+    if _pool is None:
+        config = dask.config.get("distributed.comm.buffer-pool")
+        if not config["enabled"]:
+            _pool = False
+        else:
+            _pool = BufferPool(
+                min_size=parse_bytes(config["min-size"]),
+                max_idle=parse_bytes(config["max-idle"]),
+            )
+    return _pool or None
+
+
+def receive_buffer(length):
+    """ A writable buffer to receive a frame of ``length`` bytes into """
+    pool = get_buffer_pool()
+    if pool is not None and length >= pool.min_size:
+        return pool.get(length)
+    return bytearray(length)
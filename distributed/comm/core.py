@@ -73,6 +73,15 @@ class Comm(ABC):
             ``distributed.protocol.core.dumps`` for valid values.
         """
 
+    async def drain(self):
+        """
+        Wait until the transport has sent the messages written so far, for
+        comms whose ``write`` returns before that.  Senders that batch their
+        messages use this to know when the peer falls behind.
+
+        This method is a coroutine.
+        """
+
     @abstractmethod
     def close(self):
         """
@@ -0,0 +1,255 @@
+"""
+Several logical comms over one comm
+"""
+import asyncio
+from collections import deque
+import logging
+
+import dask
+from tornado.ioloop import IOLoop
+
+from ..utils import ignoring
+from .core import Comm, CommClosedError
+
+logger = logging.getLogger(__name__)
+
+
+class Multiplexer(object):
+    """ Logical comms over one comm
+
+    Each logical comm, a ``Channel``, is a stream of messages with its own id.
+    The multiplexer writes the messages of a channel to the shared comm as
+    ``{"stream": id, "msg": msg}``, and a single task reads the shared comm
+    and routes messages to the channels they belong to.
+
+    The side that connected opens channels.  A channel gets the next id when
+    it writes its first message, so that the peer sees ids in increasing
+    order.  The peer learns of the channel from this message and passes it to
+    ``handler``, which serves it like a comm of its own.  Closing a channel
+    tells the peer with ``{"stream": id, "close": True}``, and closing the
+    shared comm closes all channels.
+
+    Channels are flow controlled, so that a reader that falls behind on one
+    channel doesn't hold up the others: a writer has up to ``window``
+    messages in flight and then waits for the reader to grant more, with
+    ``{"stream": id, "credit": n}``, as it consumes them.  Both sides must use
+    the same window.  Messages are not split, so a large message still holds
+    the shared comm while it is written.
+
+    Parameters
+    ----------
+    comm: Comm
+        The shared comm
+    handler: coroutine function, optional
+        Called with each channel opened by the peer
+    window: int
+        Messages in flight on each channel
+    deserializers: dict, optional
+        Used to read the messages of all channels
+
+    Examples
+    --------
+    >>> mux = Multiplexer(comm)  # doctest: +SKIP
+    >>> mux.start()  # doctest: +SKIP
+    >>> channel = mux.open()  # doctest: +SKIP
+    >>> await channel.write({"op": "ping"})  # doctest: +SKIP
+    """
+
+    def __init__(self, comm, handler=None, window=None, deserializers=None):
+        if window is None:
+            window = dask.config.get("distributed.comm.multiplex.window")
+        self.comm = comm
+        self.handler = handler
+        self.window = window
+        self.deserializers = deserializers
+        self.channels = {}
+        self._unnumbered = set()  # opened channels yet to write
+        self._last_id = 0
+        self._write_lock = asyncio.Lock()
+        self._handlers = set()
+        self._reader = None
+
+    def __repr__(self):
+        return "<Multiplexer %s: %d channels>" % (self.comm, len(self.channels))
+
+    def start(self):
+        """ Route messages to channels in the background """
+        if self._reader is None:
+            self._reader = asyncio.ensure_future(self.run())
+
+    def open(self):
+        """ Open a channel to the peer """
+        if self.closed():
+            raise CommClosedError(
+                "Multiplexed comm to %s closed" % (self.comm.peer_address,)
+            )
+        channel = Channel(self)
+        self._unnumbered.add(channel)
+        return channel
+
+    def closed(self):
+        return self.comm.closed()
+
+    async def close(self):
+        """ Close the shared comm, and with it all channels """
+        await self.comm.close()
+
+    def abort(self):
+        self.comm.abort()
+
+    async def run(self):
+        """ Route the messages of the shared comm until it closes """
+        try:
+            while True:
+                msg = await self.comm.read(deserializers=self.deserializers)
+                id = msg["stream"]
+                channel = self.channels.get(id)
+                if (
+                    channel is None
+                    and "msg" in msg
+                    and self.handler is not None
+                    and id > self._last_id
+                ):
+                    self._last_id = id
+                    channel = self.channels[id] = Channel(self, id)
+                    task = asyncio.ensure_future(self.handler(channel))
+                    self._handlers.add(task)
+                    task.add_done_callback(self._handlers.discard)
+                if channel is None:  # closed on this side
+                    continue
+                if "msg" in msg:
+                    channel._receive(msg["msg"])
+                elif "credit" in msg:
+                    channel._grant(msg["credit"])
+                elif msg.get("close"):
+                    channel._receive_close()
+        except CommClosedError:
+            pass
+        except Exception as e:
+            logger.exception(e)
+        finally:
+            self.comm.abort()
+            for channel in list(self.channels.values()) + list(self._unnumbered):
+                channel._receive_close()
+
+    def _number(self, channel):
+        self._unnumbered.discard(channel)
+        self._last_id += 1
+        channel.id = self._last_id
+        self.channels[channel.id] = channel
+
+    async def _write(self, msg, serializers=None, on_error="message"):
+        # Writes of large messages yield before they are complete
+        async with self._write_lock:
+            return await self.comm.write(
+                msg, serializers=serializers, on_error=on_error
+            )
+
+    def _write_later(self, msg):
+        """ Write a control message without waiting for it """
+
+        async def write():
+            with ignoring(EnvironmentError):
+                await self._write(msg)
+
+        if not self.closed():
+            IOLoop.current().add_callback(write)
+
+
+class Channel(Comm):
+    """ A logical comm over the shared comm of a ``Multiplexer``
+
+    Messages arrive in a queue filled by the multiplexer, so ``read`` ignores
+    its ``deserializers``: those of the multiplexer apply.
+    """
+
+    def __init__(self, mux, id=None):
+        Comm.__init__(self)
+        self.mux = mux
+        self.id = id
+        self.deserialize = getattr(mux.comm, "deserialize", True)
+        self._queue = deque()
+        self._readable = asyncio.Event()
+        self._writable = asyncio.Event()
+        self._credit = mux.window  # messages we may write
+        self._consumed = 0  # messages read since we last granted credit
+        self._closed = False
+        self._eof = False  # closed by the peer
+
+    async def read(self, deserializers=None):
+        while not self._queue or self._closed:
+            if self._closed or self._eof:
+                raise CommClosedError(
+                    "Channel %s to %s closed" % (self.id, self.peer_address)
+                )
+            self._readable.clear()
+            await self._readable.wait()
+        msg = self._queue.popleft()
+        self._consumed += 1
+        if 2 * self._consumed >= self.mux.window and not self._eof:
+            self.mux._write_later({"stream": self.id, "credit": self._consumed})
+            self._consumed = 0
+        return msg
+
+    async def write(self, msg, serializers=None, on_error="message"):
+        while self._credit <= 0 and not self.closed():
+            self._writable.clear()
+            await self._writable.wait()
+        if self.closed():
+            raise CommClosedError(
+                "Channel %s to %s closed" % (self.id, self.peer_address)
+            )
+        if self.id is None:
+            self.mux._number(self)
+        self._credit -= 1
+        return await self.mux._write(
+            {"stream": self.id, "msg": msg}, serializers=serializers, on_error=on_error
+        )
+
+    def _receive(self, msg):
+        self._queue.append(msg)
+        self._readable.set()
+
+    def _grant(self, credit):
+        self._credit += credit
+        self._writable.set()
+
+    def _receive_close(self):
+        self._eof = True
+        self.mux.channels.pop(self.id, None)
+        self.mux._unnumbered.discard(self)
+        self._readable.set()
+        self._writable.set()
+
+    def _close(self):
+        """ Close locally, and return whether we should tell the peer """
+        self._closed = True
+        self._queue.clear()
+        self._readable.set()
+        self._writable.set()
+        self.mux._unnumbered.discard(self)
+        return self.mux.channels.pop(self.id, None) is not None
+
+    async def close(self):
+        if not self._closed and self._close():
+            with ignoring(EnvironmentError):
+                await self.mux._write({"stream": self.id, "close": True})
+
+    def abort(self):
+        if not self._closed and self._close():
+            self.mux._write_later({"stream": self.id, "close": True})
+
+    def closed(self):
+        return self._closed or self._eof
+
+    @property
+    def local_address(self):
+        return self.mux.comm.local_address
+
+    @property
+    def peer_address(self):
+        return self.mux.comm.peer_address
+
+    @property
+    def extra_info(self):
+        return self.mux.comm.extra_info
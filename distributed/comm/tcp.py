@@ -18,6 +18,8 @@ from tornado.iostream import StreamClosedError, IOStream
 from tornado.tcpclient import TCPClient
 from tornado.tcpserver import TCPServer
 
+from ..protocol.compression import CompressionPolicy
+from ..protocol.core import MessageTemplates
 from ..system import MEMORY_LIMIT
 from ..threadpoolexecutor import ThreadPoolExecutor
 from ..utils import (
@@ -32,6 +34,7 @@ from ..utils import (
 
 from .registry import Backend, backends
 from .addressing import parse_host_port, unparse_host_port
+from .buffers import receive_buffer
 from .core import Comm, Connector, Listener, CommClosedError, FatalCommClosedError
 from .utils import to_frames, from_frames, get_tcp_server_address, ensure_concrete_host
 
@@ -41,6 +44,11 @@ logger = logging.getLogger(__name__)
 
 MAX_BUFFER_SIZE = MEMORY_LIMIT / 2
 
+# Frames smaller than this are coalesced into larger writes and reads
+SMALL_FRAME_SIZE = 2 ** 16
+# Up to this many bytes of small frames go through one buffer
+COALESCE_SIZE = 2 ** 17
+
 
 def set_tcp_timeout(stream):
     """
@@ -49,11 +57,16 @@ def set_tcp_timeout(stream):
     if stream.closed():
         return
 
+    set_socket_timeout(stream.socket)
+
+
+def set_socket_timeout(sock):
+    """
+    Set kernel-level TCP timeout on the socket.
+    """
     timeout = dask.config.get("distributed.comm.timeouts.tcp")
     timeout = int(parse_timedelta(timeout, default="seconds"))
 
-    sock = stream.socket
-
     # Default (unsettable) value on Windows
     # https://msdn.microsoft.com/en-us/library/windows/desktop/dd877220(v=vs.85).aspx
     nprobes = 10
@@ -132,6 +145,59 @@ def convert_stream_closed_error(obj, exc):
         raise CommClosedError("in %s: %s" % (obj, exc))
 
 
+def _group_lengths(lengths):
+    """ Group the lengths of frames to read them with few reads
+
+    Runs of small frames form groups of up to about ``COALESCE_SIZE`` bytes,
+    large frames are on their own.
+
+    >>> list(_group_lengths([10, 20, 2 ** 20, 30]))
+    [[10, 20], [1048576], [30]]
+    """
+    group, size = [], 0
+    for length in lengths:
+        if length >= SMALL_FRAME_SIZE:
+            if group:
+                yield group
+                group, size = [], 0
+            yield [length]
+            continue
+        group.append(length)
+        size += length
+        if size >= COALESCE_SIZE:
+            yield group
+            group, size = [], 0
+    if group:
+        yield group
+
+
+def _coalesce_frames(header, frames, lengths):
+    """ The buffers to write for a message
+
+    Small frames are joined with the header into buffers of up to about
+    ``COALESCE_SIZE`` bytes, large frames are written as they are to avoid
+    copying them.
+    """
+    if sum(lengths) < COALESCE_SIZE:
+        return [b"".join([header] + frames)]  # small enough, send in one go
+    buffers = []
+    small, small_size = [header], 0
+    for frame, length in zip(frames, lengths):
+        if length < SMALL_FRAME_SIZE:
+            small.append(frame)
+            small_size += length
+            if small_size < COALESCE_SIZE:
+                continue
+        if small:
+            buffers.append(b"".join(small))
+            small, small_size = [], 0
+        if length >= SMALL_FRAME_SIZE:
+            buffers.append(frame)
+    if small:
+        buffers.append(b"".join(small))
+    return buffers
+
+
 class TCP(Comm):
     """
     An established communication based on an underlying Tornado IOStream.
@@ -148,6 +214,11 @@ class TCP(Comm):
         self._peer_addr = peer_addr
         self.stream = stream
         self.deserialize = deserialize
+        self.compression_policy = CompressionPolicy()
+        if dask.config.get("distributed.comm.templates"):
+            self.templates = MessageTemplates()
+        else:
+            self.templates = None
         self._finalizer = weakref.finalize(self, self._get_finalizer())
         self._finalizer.atexit = False
         self._extra = {}
@@ -184,20 +255,22 @@ class TCP(Comm):
             n_frames = await stream.read_bytes(8)
             n_frames = struct.unpack("Q", n_frames)[0]
             lengths = await stream.read_bytes(8 * n_frames)
-            lengths = struct.unpack("Q" * n_frames, lengths)
+            lengths = struct.unpack("%dQ" % n_frames, lengths)
 
             frames = []
-            for length in lengths:
-                if length:
-                    if self._iostream_has_read_into:
-                        frame = bytearray(length)
-                        n = await stream.read_into(frame)
-                        assert n == length, (n, length)
-                    else:
-                        frame = await stream.read_bytes(length)
-                else:
-                    frame = b""
-                frames.append(frame)
+            for group in _group_lengths(lengths):
+                buffer = await self._read_buffer(sum(group))
+                if len(group) == 1:
+                    frames.append(buffer)
+                    continue
+                # Small frames share one buffer.  Copy them out, lest a small
+                # frame that is kept pins all of it, into bytearrays to keep
+                # them writable.
+                view = memoryview(buffer)
+                start = 0
+                for length in group:
+                    frames.append(bytearray(view[start : start + length]))
+                    start += length
         except StreamClosedError as e:
             self.stream = None
             if not shutting_down():
@@ -205,7 +278,10 @@ class TCP(Comm):
         else:
             try:
                 msg = await from_frames(
-                    frames, deserialize=self.deserialize, deserializers=deserializers
+                    frames,
+                    deserialize=self.deserialize,
+                    deserializers=deserializers,
+                    templates=self.templates,
                 )
             except EOFError:
                 # Frames possibly garbled or truncated by communication error
@@ -213,6 +289,17 @@ class TCP(Comm):
                 raise CommClosedError("aborted stream on truncated data")
             return msg
 
+    async def _read_buffer(self, length):
+        if not length:
+            return b""
+        if self._iostream_has_read_into:
+            buffer = receive_buffer(length)
+            n = await self.stream.read_into(buffer)
+            assert n == length, (n, length)
+            return buffer
+        else:
+            return await self.stream.read_bytes(length)
+
     async def write(self, msg, serializers=None, on_error="message"):
         stream = self.stream
         bytes_since_last_yield = 0
@@ -224,30 +311,24 @@ class TCP(Comm):
             serializers=serializers,
             on_error=on_error,
             context={"sender": self._local_addr, "recipient": self._peer_addr},
+            compression_policy=self.compression_policy,
+            templates=self.templates,
         )
 
         try:
             lengths = [nbytes(frame) for frame in frames]
-            length_bytes = [struct.pack("Q", len(frames))] + [
-                struct.pack("Q", x) for x in lengths
-            ]
-            if sum(lengths) < 2 ** 17:  # 128kiB
-                b = b"".join(length_bytes + frames)  # small enough, send in one go
-                stream.write(b)
-            else:
-                stream.write(b"".join(length_bytes))  # avoid large memcpy, send in many
-
-                for frame in frames:
-                    # Can't wait for the write() Future as it may be lost
-                    # ("If write is called again before that Future has resolved,
-                    #   the previous future will be orphaned and will never resolve")
-                    if not self._iostream_allows_memoryview:
-                        frame = ensure_bytes(frame)
-                    future = stream.write(frame)
-                    bytes_since_last_yield += nbytes(frame)
-                    if bytes_since_last_yield > 32e6:
-                        await future
-                        bytes_since_last_yield = 0
+            header = struct.pack("%dQ" % (len(frames) + 1), len(frames), *lengths)
+            for buffer in _coalesce_frames(header, frames, lengths):
+                # Can't wait for the write() Future as it may be lost
+                # ("If write is called again before that Future has resolved,
+                #   the previous future will be orphaned and will never resolve")
+                if not self._iostream_allows_memoryview:
+                    buffer = ensure_bytes(buffer)
+                future = stream.write(buffer)
+                bytes_since_last_yield += nbytes(buffer)
+                if bytes_since_last_yield > 32e6:
+                    await future
+                    bytes_since_last_yield = 0
         except StreamClosedError as e:
             stream = None
             convert_stream_closed_error(self, e)
@@ -259,6 +340,17 @@ class TCP(Comm):
 
         return sum(map(nbytes, frames))
 
+    async def drain(self):
+        stream = self.stream
+        if stream is None or not stream.writing():
+            return
+        try:
+            # Resolves once the stream's write buffer is empty
+            await stream.write(b"")
+        except StreamClosedError as e:
+            self.stream = None
+            convert_stream_closed_error(self, e)
+
     @gen.coroutine
     def close(self):
         # We use gen.coroutine here rather than async def to avoid errors like
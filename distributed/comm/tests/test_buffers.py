@@ -0,0 +1,119 @@
+import ctypes
+import threading
+
+import pytest
+
+from distributed.comm.buffers import (
+    BufferPool,
+    PAGE_SIZE,
+    get_buffer_pool,
+    receive_buffer,
+    size_class,
+)
+from distributed.utils_test import gen_cluster
+
+
+@pytest.mark.parametrize(
+    "length", [1, PAGE_SIZE, 2 ** 16, 2 ** 16 + 1, 100000, 2 ** 20 - 1, 10 ** 9]
+)
+def test_size_class(length):
+    capacity = size_class(length)
+    assert capacity % PAGE_SIZE == 0
+    assert length <= capacity
+    assert capacity - length < max(length / 4, PAGE_SIZE)
+
+
+def test_reuse():
+    pool = BufferPool()
+    buffer = pool.get(100000)
+    assert len(buffer) == 100000
+    assert not buffer.readonly
+    buffer[:3] = b"abc"
+    assert pool.get_metrics()["allocations"] == 1
+    assert pool.get_metrics()["requested-bytes"] == 100000
+
+    view = buffer[:3]
+    del buffer
+    assert pool.get_metrics()["in-use-bytes"] == size_class(100000)
+    del view
+    metrics = pool.get_metrics()
+    assert metrics["in-use-bytes"] == 0
+    assert metrics["idle-bytes"] == size_class(100000)
+
+    # Lengths of the same size class share buffers
+    buffer = pool.get(110000)
+    metrics = pool.get_metrics()
+    assert metrics["allocations"] == 1
+    assert metrics["reuses"] == 1
+    assert metrics["idle-bytes"] == 0
+    assert 0 < metrics["fragmentation"] < 0.25
+
+    buffer2 = pool.get(100000)
+    assert pool.get_metrics()["allocations"] == 2
+    del buffer, buffer2
+    assert pool.get_metrics()["idle-bytes"] == 2 * size_class(100000)
+    pool.clear()
+    assert pool.get_metrics()["idle-bytes"] == 0
+    assert pool.get_metrics()["discards"] == 2
+
+
+def test_max_idle():
+    pool = BufferPool(max_idle=2 ** 18)
+    buffers = [pool.get(2 ** 17) for i in range(3)]
+    del buffers
+    metrics = pool.get_metrics()
+    assert metrics["idle-bytes"] == 2 ** 18
+    assert metrics["discards"] == 1
+    assert metrics["fragmentation"] == 1
+
+
+def test_numpy():
+    np = pytest.importorskip("numpy")
+    pool = BufferPool()
+    x = np.frombuffer(pool.get(8 * 100000), dtype="f8")
+    assert x.flags.writeable
+    x[:] = 1
+    assert pool.get_metrics()["in-use-bytes"]
+    y = x[::2]
+    del x
+    assert pool.get_metrics()["in-use-bytes"]
+    del y
+    assert not pool.get_metrics()["in-use-bytes"]
+
+
+def test_release_from_threads():
+    pool = BufferPool()
+
+    def f():
+        for i in range(100):
+            buffer = pool.get(2 ** 16 + i)
+            del buffer
+
+    threads = [threading.Thread(target=f) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    metrics = pool.get_metrics()
+    assert metrics["in-use-bytes"] == metrics["requested-bytes"] == 0
+    assert metrics["allocations"] + metrics["reuses"] == 400
+    assert metrics["allocations"] <= 4 * 2
+
+
+def test_receive_buffer():
+    assert type(receive_buffer(10)) is bytearray
+    buffer = receive_buffer(2 ** 20)
+    assert len(buffer) == 2 ** 20
+    assert isinstance(buffer.obj, ctypes.Array)
+
+
+@gen_cluster(client=True)
+async def test_worker_metrics(c, s, a, b):
+    np = pytest.importorskip("numpy")
+    x = c.submit(np.ones, 2 ** 20, workers=[a.address])
+    y = c.submit(lambda x: x.sum(), x, workers=[b.address])
+    assert await y == 2 ** 20
+    metrics = await b.get_metrics()
+    assert metrics["receive-buffers"] == get_buffer_pool().get_metrics()
+    assert metrics["receive-buffers"]["allocations"] >= 1
+    assert "buffer_allocations" in metrics
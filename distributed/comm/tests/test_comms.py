@@ -4,7 +4,9 @@ import os
 import sys
 import threading
 import warnings
+import weakref
 
+import dask
 import pytest
 
 from tornado import ioloop, locks, queues
@@ -20,11 +22,13 @@ from distributed.utils_test import (
     get_client_ssl_context,
 )
 from distributed.utils_test import loop  # noqa: F401
+from distributed.utils_test import gen_cluster, inc
 
 from distributed.protocol import to_serialize, Serialized, serialize, deserialize
 
 from distributed.comm.registry import backends
 from distributed.comm import (
+    asyncio_tcp,
     tcp,
     inproc,
     connect,
@@ -297,6 +301,41 @@ async def test_tls_specific():
     assert set(l) == {1234} | set(range(N))
 
 
+@pytest.mark.asyncio
+async def test_asyncio_tls_specific():
+    """
+    Test concrete asyncio TLS API.
+    """
+
+    async def handle_comm(comm):
+        assert comm.peer_address.startswith("asyncio-tls://" + host)
+        check_tls_extra(comm.extra_info)
+        msg = await comm.read()
+        msg["op"] = "pong"
+        await comm.write(msg)
+        await comm.close()
+
+    listener = asyncio_tcp.AsyncioTLSListener(
+        "localhost", handle_comm, ssl_context=get_server_ssl_context()
+    )
+    await listener.start()
+    host, port = listener.get_host_port()
+    assert host in ("localhost", "127.0.0.1", "::1")
+    assert port > 0
+
+    addr = "%s:%d" % (host, port)
+    comm = await asyncio_tcp.AsyncioTLSConnector().connect(
+        addr, ssl_context=get_client_ssl_context()
+    )
+    assert comm.peer_address == "asyncio-tls://" + addr
+    check_tls_extra(comm.extra_info)
+    await comm.write({"op": "ping", "data": 1234})
+    msg = await comm.read()
+    assert msg == {"op": "pong", "data": 1234}
+    await comm.close()
+    listener.stop()
+
+
 @pytest.mark.asyncio
 async def test_comm_failure_threading():
     """
@@ -617,6 +656,23 @@ async def test_tls_client_server_ipv6():
     await check_client_server("tls://[::1]", tls_eq("::1"), **tls_kwargs)
 
 
+@pytest.mark.asyncio
+async def test_asyncio_tcp_client_server():
+    await check_client_server("asyncio-tcp://127.0.0.1", tcp_eq("127.0.0.1"))
+    await check_client_server(
+        "asyncio-tcp://0.0.0.0:3224",
+        tcp_eq("0.0.0.0", 3224),
+        tcp_eq(EXTERNAL_IP4, 3224),
+    )
+
+
+@pytest.mark.asyncio
+async def test_asyncio_tls_client_server():
+    await check_client_server(
+        "asyncio-tls://127.0.0.1", tls_eq("127.0.0.1"), **tls_kwargs
+    )
+
+
 @pytest.mark.asyncio
 async def test_inproc_client_server():
     await check_client_server("inproc://", inproc_check())
@@ -691,6 +747,45 @@ async def test_tls_reject_certificate():
         assert "certificate verify failed" in str(excinfo.value)
 
 
+@pytest.mark.asyncio
+async def test_asyncio_tls_reject_certificate():
+    bad_cert_key = ("tls-self-signed-cert.pem", "tls-self-signed-key.pem")
+
+    async def handle_comm(comm):
+        await comm.close()
+
+    # Listener refuses a connector not signed by the CA.  With TLS 1.3 the
+    # client only learns about it after the handshake.
+    listener = listen(
+        "asyncio-tls://",
+        handle_comm,
+        connection_args={"ssl_context": get_server_ssl_context()},
+    )
+    await listener.start()
+    with pytest.raises(EnvironmentError):
+        comm = await connect(
+            listener.contact_address,
+            timeout=0.5,
+            connection_args={"ssl_context": get_client_ssl_context(*bad_cert_key)},
+        )
+        await comm.read()
+
+    # Connector refuses a listener not signed by the CA
+    listener = listen(
+        "asyncio-tls://",
+        handle_comm,
+        connection_args={"ssl_context": get_server_ssl_context(*bad_cert_key)},
+    )
+    await listener.start()
+    with pytest.raises(EnvironmentError) as excinfo:
+        await connect(
+            listener.contact_address,
+            timeout=2,
+            connection_args={"ssl_context": get_client_ssl_context()},
+        )
+    assert "certificate verify failed" in str(excinfo.value)
+
+
 #
 # Test communication closing
 #
@@ -707,6 +802,9 @@ async def check_comm_closed_implicit(
     contact_addr = listener.contact_address
 
     comm = await connect(contact_addr, connection_args=connect_args)
+    if delay:
+        # Let the peer's close arrive before writing
+        await asyncio.sleep(delay)
     with pytest.raises(CommClosedError):
         await comm.write({})
 
@@ -725,6 +823,13 @@ async def test_tls_comm_closed_implicit():
     await check_comm_closed_implicit("tls://127.0.0.1", **tls_kwargs)
 
 
+@pytest.mark.asyncio
+async def test_asyncio_tcp_comm_closed_implicit():
+    # asyncio transports notice the peer's close once they read from it
+    await check_comm_closed_implicit("asyncio-tcp://127.0.0.1", delay=0.1)
+    await check_comm_closed_implicit("asyncio-tls://127.0.0.1", delay=0.1, **tls_kwargs)
+
+
 @pytest.mark.asyncio
 async def test_inproc_comm_closed_implicit():
     await check_comm_closed_implicit(inproc.new_address())
@@ -763,6 +868,12 @@ async def test_tls_comm_closed_explicit():
     await check_comm_closed_explicit("tls://127.0.0.1", **tls_kwargs)
 
 
+@pytest.mark.asyncio
+async def test_asyncio_tcp_comm_closed_explicit():
+    await check_comm_closed_explicit("asyncio-tcp://127.0.0.1")
+    await check_comm_closed_explicit("asyncio-tls://127.0.0.1", **tls_kwargs)
+
+
 @pytest.mark.asyncio
 async def test_inproc_comm_closed_explicit():
     await check_comm_closed_explicit(inproc.new_address())
@@ -838,6 +949,11 @@ async def test_tcp_connect_timeout():
     await check_connect_timeout("tcp://127.0.0.1:44444")
 
 
+@pytest.mark.asyncio
+async def test_asyncio_tcp_connect_timeout():
+    await check_connect_timeout("asyncio-tcp://127.0.0.1:44444")
+
+
 @pytest.mark.asyncio
 async def test_inproc_connect_timeout():
     await check_connect_timeout(inproc.new_address())
@@ -869,6 +985,12 @@ async def test_tcp_many_listeners():
     await check_many_listeners("tcp://")
 
 
+@pytest.mark.asyncio
+async def test_asyncio_tcp_many_listeners():
+    await check_many_listeners("asyncio-tcp://127.0.0.1")
+    await check_many_listeners("asyncio-tcp://")
+
+
 @pytest.mark.asyncio
 async def test_inproc_many_listeners():
     await check_many_listeners("inproc://")
@@ -1015,6 +1137,11 @@ async def test_tcp_deserialize():
     await check_deserialize("tcp://")
 
 
+@pytest.mark.asyncio
+async def test_asyncio_tcp_deserialize():
+    await check_deserialize("asyncio-tcp://")
+
+
 @pytest.mark.asyncio
 async def test_inproc_deserialize():
     await check_deserialize("inproc://")
@@ -1063,6 +1190,62 @@ async def test_tcp_deserialize_roundtrip():
     await check_deserialize_roundtrip("tcp://")
 
 
+@pytest.mark.asyncio
+async def test_asyncio_tcp_deserialize_roundtrip():
+    await check_deserialize_roundtrip("asyncio-tcp://")
+
+
+async def check_many_frames(addr, listen_args=None, connect_args=None):
+    """
+    Round-trip messages with frames of all sizes, including runs of small
+    frames that are larger than one read together.
+    """
+    small = [os.urandom(5000) for i in range(40)]
+    large = os.urandom(2 ** 20)
+    msg = {
+        "op": "update",
+        "small": [to_serialize(x) for x in small],
+        "large": to_serialize(large),
+        "empty": to_serialize(b""),
+        "more": [to_serialize(x) for x in small[:3]],
+    }
+    a, b = await get_comm_pair(addr, listen_args=listen_args, connect_args=connect_args)
+    for i in range(2):
+        await a.write(msg)
+        got = await b.read()
+        assert [bytes(x) for x in got["small"]] == small
+        assert got["large"] == large
+        assert got["empty"] == b""
+        assert [bytes(x) for x in got["more"]] == small[:3]
+    await a.close()
+    await b.close()
+
+
+@pytest.mark.asyncio
+async def test_tcp_many_frames():
+    await check_many_frames("tcp://")
+
+
+@pytest.mark.asyncio
+async def test_asyncio_tcp_many_frames():
+    await check_many_frames("asyncio-tcp://")
+    await check_many_frames("asyncio-tls://", **tls_kwargs)
+
+
+@pytest.mark.asyncio
+async def test_asyncio_tcp_concurrent_writes():
+    a, b = await get_comm_pair("asyncio-tcp://127.0.0.1")
+    try:
+        # Large enough to pause writing before the reader catches up
+        messages = [{"i": i, "x": os.urandom(2 ** 23)} for i in range(4)]
+        await asyncio.gather(*[a.write(msg) for msg in messages])
+        for msg in messages:
+            assert await b.read() == msg
+    finally:
+        await a.close()
+        await b.close()
+
+
 def _raise_eoferror():
     raise EOFError
 
@@ -1093,6 +1276,11 @@ async def test_tcp_deserialize_eoferror():
     await check_deserialize_eoferror("tcp://")
 
 
+@pytest.mark.asyncio
+async def test_asyncio_tcp_deserialize_eoferror():
+    await check_deserialize_eoferror("asyncio-tcp://")
+
+
 #
 # Test various properties
 #
@@ -1123,6 +1311,14 @@ async def test_tls_repr():
     await check_repr(a, b)
 
 
+@pytest.mark.asyncio
+async def test_asyncio_tcp_repr():
+    a, b = await get_comm_pair("asyncio-tcp://")
+    assert a.local_address in repr(b)
+    assert b.local_address in repr(a)
+    await check_repr(a, b)
+
+
 @pytest.mark.asyncio
 async def test_inproc_repr():
     a, b = await get_inproc_comm_pair()
@@ -1150,7 +1346,128 @@ async def test_tls_adresses():
     await check_addresses(a, b)
 
 
+@pytest.mark.asyncio
+async def test_asyncio_tcp_adresses():
+    a, b = await get_comm_pair("asyncio-tcp://")
+    await check_addresses(a, b)
+
+
 @pytest.mark.asyncio
 async def test_inproc_adresses():
     a, b = await get_inproc_comm_pair()
     await check_addresses(a, b)
+
+
+#
+# Test the asyncio backend in a cluster
+#
+
+
+@gen_cluster(
+    client=True,
+    scheduler="asyncio-tcp://127.0.0.1",
+    nthreads=[("asyncio-tcp://127.0.0.1", 1), ("asyncio-tcp://127.0.0.1", 2)],
+)
+async def test_asyncio_tcp_cluster(c, s, a, b):
+    assert s.address.startswith("asyncio-tcp://")
+    assert a.address.startswith("asyncio-tcp://")
+    x = c.submit(inc, 1, workers=[a.address])
+    y = c.submit(inc, x, workers=[b.address])
+    assert await y == 3
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("addr", ["tcp://127.0.0.1", "asyncio-tcp://127.0.0.1"])
+async def test_message_templates(addr):
+    with dask.config.set({"distributed.comm.templates": True}):
+        a, b = await get_comm_pair(addr)
+    batch = [{"op": "task-finished", "key": "x-%d" % i} for i in range(10)]
+    try:
+        await a.write(batch)
+        assert await b.read() == tuple(batch)
+        await b.write({"op": "ok"})
+        assert await a.read() == {"op": "ok"}
+        for i in range(3):
+            await a.write(batch)
+            assert await b.read() == batch
+        assert list(a.templates._sent) == [("op", "key")]
+        assert b.templates._received == [("op", "key")]
+    finally:
+        await a.close()
+        await b.close()
+
+
+@gen_cluster(client=True, config={"distributed.comm.templates": True})
+async def test_message_templates_cluster(c, s, a, b):
+    futures = c.map(inc, range(20))
+    assert await c.gather(futures) == list(range(1, 21))
+    comm = s.stream_comms[a.address].comm
+    assert comm.templates._sent
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("addr", ["tcp://127.0.0.1", "asyncio-tcp://127.0.0.1"])
+async def test_receive_into_buffer_pool(addr):
+    np = pytest.importorskip("numpy")
+    from distributed.comm.buffers import get_buffer_pool
+
+    pool = get_buffer_pool()
+    a, b = await get_comm_pair(addr)
+    try:
+        x = np.random.random(2 ** 17)  # incompressible
+        await a.write({"x": to_serialize(x)})
+        msg = await b.read()
+        y = msg["x"]
+        np.testing.assert_array_equal(x, y)
+        assert y.flags.writeable
+        assert pool.get_metrics()["in-use-bytes"] >= x.nbytes
+        # Other comms in this process may use the pool meanwhile, so we follow
+        # this buffer rather than the bytes in use
+        buffer = weakref.ref(y.base)
+        del msg, y
+        await asyncio.sleep(0)  # the loop holds the result of the read until then
+        assert buffer() is None
+    finally:
+        await a.close()
+        await b.close()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("addr", ["tcp://127.0.0.1", "asyncio-tcp://127.0.0.1"])
+async def test_small_frames_dont_pin_buffers(addr):
+    np = pytest.importorskip("numpy")
+
+    a, b = await get_comm_pair(addr)
+    try:
+        xs = [np.random.random(5000) for i in range(4)]  # small, incompressible
+        await a.write({"xs": [to_serialize(x) for x in xs]})
+        msg = await b.read()
+        for x, y in zip(xs, msg["xs"]):
+            np.testing.assert_array_equal(x, y)
+            assert y.flags.writeable
+            assert isinstance(y.base, bytearray)  # not a view of a shared buffer
+    finally:
+        await a.close()
+        await b.close()
+
+
+@pytest.mark.asyncio
+async def test_benchmark():
+    from distributed.comm import benchmark
+
+    results = await benchmark.run(
+        ["tcp://127.0.0.1", "asyncio-tcp://127.0.0.1"],
+        sizes=[2 ** 10, 2 ** 20],
+        n=10,
+        total=2 ** 21,
+    )
+    assert [r["address"] for r in results] == [
+        "tcp://127.0.0.1",
+        "asyncio-tcp://127.0.0.1",
+    ]
+    for r in results:
+        assert 0 < r["latency-median"] <= r["latency-99%"]
+        assert r["messages/s"] > 0
+        assert r["throughput-1024"] > 0
+        assert r["throughput-1048576"] > 0
+    assert "asyncio-tcp://127.0.0.1" in benchmark.format_results(results)
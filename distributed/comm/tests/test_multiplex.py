@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+
+from distributed.comm import connect, listen, CommClosedError
+from distributed.comm.multiplex import Multiplexer
+
+
+async def get_multiplexers(window=4):
+    """ Both ends of a multiplexed comm, and a queue of the channels opened """
+    channels = asyncio.Queue()
+    comms = asyncio.Queue()
+    listener = listen("tcp://", comms.put)
+    await listener.start()
+    client = Multiplexer(await connect(listener.contact_address), window=window)
+    client.start()
+    server = Multiplexer(await comms.get(), handler=channels.put, window=window)
+    server.start()
+    listener.stop()
+    return client, server, channels
+
+
+@pytest.mark.asyncio
+async def test_channels():
+    client, server, channels = await get_multiplexers()
+    a = client.open()
+    b = client.open()
+    await b.write("b")
+    await a.write({"x": 1})
+    await a.write("a")
+    b2 = await channels.get()
+    a2 = await channels.get()
+    assert await b2.read() == "b"
+    assert await a2.read() == {"x": 1}
+    assert await a2.read() == "a"
+    await a2.write("reply")
+    assert await a.read() == "reply"
+    assert a.peer_address == client.comm.peer_address
+    assert a2.local_address == server.comm.local_address
+
+    await a.close()
+    assert a.closed()
+    with pytest.raises(CommClosedError):
+        await a2.read()
+    assert a2.closed()
+    with pytest.raises(CommClosedError):
+        await a2.write("x")
+    assert set(client.channels) == set(server.channels) == {b.id}
+
+    await client.close()
+    with pytest.raises(CommClosedError):
+        await b2.read()
+    with pytest.raises(CommClosedError):
+        client.open()
+
+
+@pytest.mark.asyncio
+async def test_flow_control():
+    client, server, channels = await get_multiplexers(window=4)
+    a = client.open()
+    b = client.open()
+    for i in range(4):
+        await a.write(i)
+    a2 = await channels.get()
+
+    # The reader of a is behind, so a waits, but b doesn't
+    write = asyncio.ensure_future(a.write(4))
+    await b.write("b")
+    b2 = await channels.get()
+    assert await b2.read() == "b"
+    assert not write.done()
+
+    assert await a2.read() == 0
+    await asyncio.sleep(0.05)
+    assert not write.done()
+    assert await a2.read() == 1
+    await asyncio.wait_for(write, 5)
+    assert [await a2.read() for i in range(3)] == [2, 3, 4]
+
+    # The peer closes while we wait for credit
+    for i in range(3):
+        await a.write(i)
+    write = asyncio.ensure_future(a.write(4))
+    await asyncio.sleep(0.01)
+    await a2.close()
+    with pytest.raises(CommClosedError):
+        await asyncio.wait_for(write, 5)
+
+    await client.close()
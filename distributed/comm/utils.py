@@ -20,16 +20,51 @@ if isinstance(FRAME_OFFLOAD_THRESHOLD, str):
     FRAME_OFFLOAD_THRESHOLD = parse_bytes(FRAME_OFFLOAD_THRESHOLD)
 
 
-async def to_frames(msg, serializers=None, on_error="message", context=None):
+_scalar_types = (int, float, bool, type(None))
+
+
+def _message_sizeof(msg):
+    """
+    Estimate the size of a message, to decide whether to offload it.
+
+    Messages are mostly small dicts and lists of strings and numbers, for
+    which dask's sizeof dispatch costs as much as serializing them.  Large
+    collections and any other objects, like data to serialize, go to sizeof.
+    """
+    typ = type(msg)
+    if typ is str or typ is bytes:
+        return len(msg)
+    if typ in _scalar_types:
+        return 8
+    if typ is dict and len(msg) <= 16:
+        return sum(_message_sizeof(k) + _message_sizeof(v) for k, v in msg.items())
+    if (typ is list or typ is tuple) and len(msg) <= 16:
+        return sum(map(_message_sizeof, msg))
+    return sizeof(msg)
+
+
+async def to_frames(
+    msg,
+    serializers=None,
+    on_error="message",
+    context=None,
+    compression_policy=None,
+    templates=None,
+):
     """
     Serialize a message into a list of Distributed protocol frames.
     """
 
-    def _to_frames():
+    def _to_frames(templates):
         try:
             return list(
                 protocol.dumps(
-                    msg, serializers=serializers, on_error=on_error, context=context
+                    msg,
+                    serializers=serializers,
+                    on_error=on_error,
+                    context=context,
+                    compression_policy=compression_policy,
+                    templates=templates,
                 )
             )
         except Exception as e:
@@ -37,13 +72,15 @@ async def to_frames(msg, serializers=None, on_error="message", context=None):
             logger.exception(e)
             raise
 
-    if FRAME_OFFLOAD_THRESHOLD and sizeof(msg) > FRAME_OFFLOAD_THRESHOLD:
-        return await offload(_to_frames)
+    if FRAME_OFFLOAD_THRESHOLD and _message_sizeof(msg) > FRAME_OFFLOAD_THRESHOLD:
+        # Messages serialized in another thread may be sent out of order, so
+        # they can't define or use templates
+        return await offload(_to_frames, None)
     else:
-        return _to_frames()
+        return _to_frames(templates)
 
 
-async def from_frames(frames, deserialize=True, deserializers=None):
+async def from_frames(frames, deserialize=True, deserializers=None, templates=None):
     """
     Unserialize a list of Distributed protocol frames.
     """
@@ -52,7 +89,10 @@ async def from_frames(frames, deserialize=True, deserializers=None):
     def _from_frames():
         try:
             return protocol.loads(
-                frames, deserialize=deserialize, deserializers=deserializers
+                frames,
+                deserialize=deserialize,
+                deserializers=deserializers,
+                templates=templates,
             )
         except EOFError:
             if size > 1000:
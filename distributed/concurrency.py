@@ -0,0 +1,126 @@
+from .metrics import time
+
+
+class AdaptiveLimit(object):
+    """ A limit on concurrent transfers that adapts like TCP congestion control
+
+    Completed transfers are grouped in rounds of ``limit`` transfers.  After a
+    round in which all allowed transfers were in use and that moved data at
+    least about as fast as the round before, the limit grows by one (additive
+    increase).  If the transfers of a round took much longer per byte than
+    usual, if one failed, or if memory runs short, the limit halves
+    (multiplicative decrease).
+
+    Parameters
+    ----------
+    limit: int
+        Initial limit
+    minimum: int
+    maximum: int
+    adaptive: bool
+        Keep the limit fixed if False
+    tolerance: float
+        Decrease the limit once transfers take this many times longer per
+        byte than the best recent round
+
+    Examples
+    --------
+    >>> limit = AdaptiveLimit(10, maximum=40)
+    >>> limit.observe(nbytes=2 ** 20, duration=0.01, in_use=10)  # doctest: +SKIP
+    >>> limit.failure()
+    >>> limit.limit
+    5
+    """
+
+    def __init__(self, limit, minimum=1, maximum=None, adaptive=True, tolerance=2.0):
+        self.limit = limit
+        self.minimum = minimum
+        self.maximum = maximum or limit
+        self.adaptive = adaptive
+        self.tolerance = tolerance
+
+        self.throughput = 0  # bytes per second in the last round
+        self.latency = None  # seconds per byte of the best recent round
+        self.increases = 0
+        self.decreases = 0
+        self._reset()
+
+    def _reset(self):
+        self._start = time()
+        self._count = 0
+        self._nbytes = 0
+        self._weight = 0
+        self._duration = 0
+        self._in_use = 0
+        self._pressure = False
+
+    def observe(self, nbytes, duration, in_use=0, pressure=False):
+        """ Record a completed transfer
+
+        Parameters
+        ----------
+        nbytes: int
+            Size of the transfer
+        duration: float
+            Time the transfer took, in seconds
+        in_use: int
+            Number of concurrent transfers, including this one
+        pressure: bool
+            Whether memory runs short
+        """
+        if not self.adaptive:
+            return
+        self._count += 1
+        self._nbytes += nbytes
+        self._weight += max(nbytes, 2 ** 16)  # small transfers cost a fixed time
+        self._duration += duration
+        self._in_use = max(self._in_use, in_use)
+        self._pressure = self._pressure or pressure
+        if self._count >= self.limit:
+            self._end_round()
+
+    def failure(self):
+        """ Record a failed transfer """
+        if not self.adaptive:
+            return
+        self._decrease()
+        self._reset()
+
+    def _end_round(self):
+        throughput = self._nbytes / max(time() - self._start, 0.001)
+        latency = self._duration / self._weight
+        if self.latency is None:
+            self.latency = latency
+
+        if self._pressure or latency > self.tolerance * self.latency:
+            self._decrease()
+        elif self._in_use >= self.limit and throughput >= 0.9 * self.throughput:
+            if self.limit < self.maximum:
+                self.limit += 1
+                self.increases += 1
+
+        self.throughput = throughput
+        # Slowly forget good rounds, in case the network or peers changed
+        self.latency = min(latency, self.latency * 1.1)
+        self._reset()
+
+    def _decrease(self):
+        limit = max(self.minimum, self.limit // 2)
+        if limit < self.limit:
+            self.limit = limit
+            self.decreases += 1
+
+    def get_metrics(self):
+        return {
+            "limit": self.limit,
+            "throughput": self.throughput,
+            "increases": self.increases,
+            "decreases": self.decreases,
+        }
+
+    def __repr__(self):
+        return "<AdaptiveLimit: %d in [%d, %d]>" % (
+            self.limit,
+            self.minimum,
+            self.maximum,
+        )
@@ -23,6 +23,7 @@ from .comm import (
     unparse_host_port,
     get_address_host_port,
 )
+from .comm.multiplex import Multiplexer
 from .metrics import time
 from . import profile
 from .system_monitor import SystemMonitor
@@ -112,6 +113,7 @@ class Server(object):
         self.handlers = {
             "identity": self.identity,
             "connection_stream": self.handle_stream,
+            "multiplex": self.handle_multiplex,
         }
         self.handlers.update(handlers)
         if blocked_handlers is None:
@@ -437,6 +439,17 @@ class Server(object):
                         "Failed while closing connection to %r: %s", address, e
                     )
 
+    async def handle_multiplex(self, comm, window=None):
+        """ Handle each logical comm of a multiplexed comm like a comm of its own
+
+        See Also
+        --------
+        distributed.comm.multiplex.Multiplexer
+        """
+        await comm.write("OK")
+        await Multiplexer(comm, handler=self.handle_comm, window=window).run()
+        return "dont-reply"
+
     async def handle_stream(self, comm, extra=None, every_cycle=[]):
         extra = extra or {}
         logger.info("Starting established connection")
@@ -795,12 +808,21 @@ class ConnectionPool(object):
     If that doesn't do the trick then we wait until one of the occupied comms
     closes.
 
+    With ``multiplex`` the comms are logical channels over a single comm to
+    each address, opened without a new connection (see
+    ``distributed.comm.multiplex``).  The limit then counts channels.  Peers
+    that refuse to multiplex get plain comms.  Channels read messages with
+    the deserializers of the pool rather than of each call.
+
     Parameters
     ----------
     limit: int
         The number of open comms to maintain at once
     deserialize: bool
         Whether or not to deserialize data by default or pass it through
+    multiplex: bool
+        Whether to share one comm per address, defaults to the
+        ``distributed.comm.multiplex.enabled`` configuration value
     """
 
     _instances = weakref.WeakSet()
@@ -814,6 +836,7 @@ class ConnectionPool(object):
         connection_args=None,
         timeout=None,
         server=None,
+        multiplex=None,
     ):
         self.limit = limit  # Max number of open comms
         # Invariant: len(available) == open - active
@@ -830,6 +853,14 @@ class ConnectionPool(object):
         self.semaphore = asyncio.Semaphore(self.limit)
         self.server = weakref.ref(server) if server else None
         self._created = weakref.WeakSet()
+        if multiplex is None:
+            multiplex = dask.config.get("distributed.comm.multiplex.enabled")
+        self.multiplex = multiplex
+        self._multiplexers = {}
+        # Futures of multiplexed comms being connected
+        self._connecting_multiplexers = {}
+        # Addresses of peers that refused to multiplex
+        self._plain = set()
         self._instances.add(self)
 
     @property
@@ -873,12 +904,16 @@ class ConnectionPool(object):
         await self.semaphore.acquire()
 
         try:
-            comm = await connect(
-                addr,
-                timeout=timeout or self.timeout,
-                deserialize=self.deserialize,
-                connection_args=self.connection_args,
-            )
+            comm = None
+            if self.multiplex:
+                comm = await self._open_channel(addr, timeout=timeout)
+            if comm is None:
+                comm = await connect(
+                    addr,
+                    timeout=timeout or self.timeout,
+                    deserialize=self.deserialize,
+                    connection_args=self.connection_args,
+                )
             comm.name = "ConnectionPool"
             comm._pool = weakref.ref(self)
             self._created.add(comm)
@@ -892,6 +927,51 @@ class ConnectionPool(object):
 
         return comm
 
+    async def _open_channel(self, addr, timeout=None):
+        """
+        Open a channel of the multiplexed comm to the given address, connecting
+        first if needed.  If the peer refuses to multiplex, return the plain
+        comm of that attempt, and None afterwards.
+        """
+        while True:
+            if addr in self._plain:
+                return None
+            mux = self._multiplexers.get(addr)
+            if mux is not None and not mux.closed():
+                return mux.open()
+            if addr not in self._connecting_multiplexers:
+                break
+            await self._connecting_multiplexers[addr]
+
+        future = asyncio.get_event_loop().create_future()
+        self._connecting_multiplexers[addr] = future
+        try:
+            comm = await connect(
+                addr,
+                timeout=timeout or self.timeout,
+                deserialize=self.deserialize,
+                connection_args=self.connection_args,
+            )
+            comm.name = "ConnectionPool.multiplex"
+            mux = Multiplexer(comm, deserializers=self.deserializers)
+            try:
+                await comm.write({"op": "multiplex", "window": mux.window})
+                response = await comm.read()
+            except Exception:
+                comm.abort()
+                raise
+            if response != "OK":
+                # An error, or None from servers without the handler
+                logger.info("%s doesn't multiplex comms, using plain comms", addr)
+                self._plain.add(addr)
+                return comm
+            self._multiplexers[addr] = mux
+            mux.start()
+            return mux.open()
+        finally:
+            del self._connecting_multiplexers[addr]
+            future.set_result(None)
+
     def reuse(self, addr, comm):
         """
         Reuse an open communication to the given address.  For internal use.
@@ -940,6 +1020,10 @@ class ConnectionPool(object):
             for comm in comms:
                 IOLoop.current().add_callback(comm.close)
                 self.semaphore.release()
+        mux = self._multiplexers.pop(addr, None)
+        if mux is not None:
+            IOLoop.current().add_callback(mux.close)
+        self._plain.discard(addr)
 
     def close(self):
         """
@@ -956,6 +1040,8 @@ class ConnectionPool(object):
 
         for comm in self._created:
             IOLoop.current().add_callback(comm.abort)
+        for mux in self._multiplexers.values():
+            mux.abort()
 
 
 def coerce_to_address(o):
@@ -74,7 +74,7 @@ class StateTable(DashboardComponent):
             d = {
                 "Stored": [len(w.data)],
                 "Executing": ["%d / %d" % (len(w.executing), w.nthreads)],
-                "Ready": [len(w.ready)],
+                "Ready": [len(w.ready) + len(w._deferred)],
                 "Waiting": [len(w.waiting_for_data)],
                 "Connections": [len(w.in_flight_workers)],
                 "Serving": [len(w._comms)],
@@ -203,14 +203,16 @@ class CommunicatingStream(DashboardComponent):
 class CommunicatingTimeSeries(DashboardComponent):
     def __init__(self, worker, **kwargs):
         self.worker = worker
-        self.source = ColumnDataSource({"x": [], "in": [], "out": []})
+        self.source = ColumnDataSource(
+            {"x": [], "in": [], "out": [], "in-limit": [], "out-limit": []}
+        )
 
         x_range = DataRange1d(follow="end", follow_interval=20000, range_padding=0)
 
         fig = figure(
             title="Communication History",
             x_axis_type="datetime",
-            y_range=[-0.1, worker.total_out_connections + 0.5],
+            y_range=DataRange1d(start=-0.1),
             height=150,
             tools="",
             x_range=x_range,
@@ -218,6 +220,13 @@ class CommunicatingTimeSeries(DashboardComponent):
         )
         fig.line(source=self.source, x="x", y="in", color="red")
         fig.line(source=self.source, x="x", y="out", color="blue")
+        # Adaptive limits on concurrent transfers
+        fig.line(
+            source=self.source, x="x", y="in-limit", color="red", line_dash="dashed"
+        )
+        fig.line(
+            source=self.source, x="x", y="out-limit", color="blue", line_dash="dashed"
+        )
 
         fig.add_tools(
             ResetTool(), PanTool(dimensions="width"), WheelZoomTool(dimensions="width")
@@ -233,6 +242,8 @@ class CommunicatingTimeSeries(DashboardComponent):
                     "x": [time() * 1000],
                     "out": [len(self.worker._comms)],
                     "in": [len(self.worker.in_flight_workers)],
+                    "out-limit": [self.worker.total_in_connections],
+                    "in-limit": [self.worker.total_out_connections],
                 },
                 10000,
             )
@@ -241,7 +252,7 @@ class CommunicatingTimeSeries(DashboardComponent):
 class ExecutingTimeSeries(DashboardComponent):
     def __init__(self, worker, **kwargs):
         self.worker = worker
-        self.source = ColumnDataSource({"x": [], "y": []})
+        self.source = ColumnDataSource({"x": [], "y": [], "idle": []})
 
         x_range = DataRange1d(follow="end", follow_interval=20000, range_padding=0)
 
@@ -255,6 +266,8 @@ class ExecutingTimeSeries(DashboardComponent):
             **kwargs
         )
         fig.line(source=self.source, x="x", y="y")
+        # Threads waiting for data to arrive
+        fig.line(source=self.source, x="x", y="idle", color="red", line_dash="dashed")
 
         fig.add_tools(
             ResetTool(), PanTool(dimensions="width"), WheelZoomTool(dimensions="width")
@@ -265,8 +278,18 @@ class ExecutingTimeSeries(DashboardComponent):
     @without_property_validation
     def update(self):
         with log_errors():
+            worker = self.worker
+            executing = len(worker.executing)
+            if (
+                worker.waiting_for_data
+                and not worker.ready
+                and not worker._deferred
+            ):
+                idle = max(worker.nthreads - executing, 0)
+            else:
+                idle = 0
             self.source.stream(
-                {"x": [time() * 1000], "y": [len(self.worker.executing)]}, 1000
+                {"x": [time() * 1000], "y": [executing], "idle": [idle]}, 1000
             )
 
 
@@ -56,7 +56,9 @@ class _PrometheusCollector(object):
         )
         tasks.add_metric(["stored"], len(self.worker.data))
         tasks.add_metric(["executing"], len(self.worker.executing))
-        tasks.add_metric(["ready"], len(self.worker.ready))
+        tasks.add_metric(
+            ["ready"], len(self.worker.ready) + len(self.worker._deferred)
+        )
         tasks.add_metric(["waiting"], len(self.worker.waiting_for_data))
         tasks.add_metric(["serving"], len(self.worker._comms))
         yield tasks
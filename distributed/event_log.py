@@ -0,0 +1,154 @@
+from array import array
+import sys
+
+LEVELS = {"debug": 10, "info": 20}
+
+
+def _intern(key):
+    """ Share one string object for equal keys across records """
+    return sys.intern(key) if type(key) is str else key
+
+
+class EventLog(object):
+    """ A bounded log of events, indexed by key
+
+    Events are tuples, like ``(key, "waiting", "ready")``.  We keep the
+    latest ``maxlen`` events in a preallocated ring buffer.  Each event lists
+    the keys it concerns.  We map each key to the position of its latest event
+    and link every event to the previous event of the same key, so ``story``
+    follows these links instead of scanning the log.  Keys are interned to
+    share one string among the events of a key.
+
+    Events logged with ``debug`` instead of ``append`` are only kept if the
+    log is at the ``"debug"`` level.  These are frequent events, like each
+    pass of the worker's communication loop, that help to debug the worker but
+    are too costly to record in production.
+
+    Parameters
+    ----------
+    maxlen: int
+        Number of events to keep
+    level: str
+        ``"debug"`` to keep all events or ``"info"`` to skip debug events
+
+    Examples
+    --------
+    >>> log = EventLog(maxlen=1000)
+    >>> log.append(("x", "waiting", "ready"))
+    >>> log.append(("gather-dependencies", "worker-1", ["x", "y"]), keys=["x", "y"])
+    >>> log.story("y")
+    [('gather-dependencies', 'worker-1', ['x', 'y'])]
+    """
+
+    def __init__(self, maxlen=100000, level="debug"):
+        if maxlen < 1:
+            raise ValueError("Event log length must be positive, got %r" % (maxlen,))
+        if level not in LEVELS:
+            raise ValueError(
+                "Unknown event log level %r, expected one of %s"
+                % (level, sorted(LEVELS))
+            )
+        self.maxlen = maxlen
+        self.level = level
+        self.verbose = LEVELS[level] <= LEVELS["debug"]
+        self._count = 0  # number of events ever appended
+        self._events = [None] * maxlen
+        # Keys of each event, or None if that is just the first item
+        self._keys = [None] * maxlen
+        # Position of the previous event of the same key, or of each key
+        self._previous = array("q", [-1]) * maxlen
+        self._previous_multi = dict()
+        self._index = dict()  # key -> position of its latest event
+
+    def append(self, event, keys=None):
+        """ Record an event
+
+        Parameters
+        ----------
+        event: tuple
+        keys: iterable, optional
+            Keys that the event concerns, by default the first item of the
+            event.  Events that mention further keys, like the dependents of
+            a key, must list all of them to appear in their stories.
+        """
+        count = self._count
+        i = count % self.maxlen
+        if count >= self.maxlen:
+            self._evict(i, count - self.maxlen)
+        index = self._index
+        if keys is None:
+            key = _intern(event[0])
+            if key is not event[0]:
+                event = (key,) + event[1:]
+            try:
+                self._previous[i] = index.get(key, -1)
+                index[key] = count
+            except TypeError:  # unhashable
+                self._previous[i] = -1
+        else:
+            keys = tuple(map(_intern, keys))
+            previous = []
+            for key in keys:
+                try:
+                    p = index.get(key, -1)
+                    if p != count:  # not a duplicate
+                        index[key] = count
+                except TypeError:  # unhashable
+                    p = -1
+                previous.append(p)
+            self._previous_multi[i] = previous
+        self._keys[i] = keys
+        self._events[i] = event
+        self._count = count + 1
+
+    def debug(self, event, keys=None):
+        """ Record an event if the log is at the debug level """
+        if self.verbose:
+            self.append(event, keys=keys)
+
+    def _evict(self, i, position):
+        index = self._index
+        keys = self._keys[i]
+        if keys is None:
+            try:
+                if index.get(self._events[i][0]) == position:
+                    del index[self._events[i][0]]
+            except TypeError:  # unhashable
+                pass
+            return
+        del self._previous_multi[i]
+        for key in keys:
+            try:
+                if index.get(key) == position:  # the latest event of this key
+                    del index[key]
+            except TypeError:  # unhashable
+                pass
+
+    def story(self, *keys):
+        """ All retained events that concern any of the given keys, in order """
+        oldest = self._count - len(self)
+        positions = set()
+        for key in keys:
+            try:
+                p = self._index.get(key, -1)
+            except TypeError:  # unhashable
+                continue
+            while p >= oldest:
+                positions.add(p)
+                i = p % self.maxlen
+                if self._keys[i] is None:
+                    p = self._previous[i]
+                else:
+                    p = self._previous_multi[i][self._keys[i].index(key)]
+        return [self._events[p % self.maxlen] for p in sorted(positions)]
+
+    def __len__(self):
+        return min(self._count, self.maxlen)
+
+    def __iter__(self):
+        start = max(0, self._count - self.maxlen)
+        for p in range(start, self._count):
+            yield self._events[p % self.maxlen]
+
+    def __repr__(self):
+        return "<EventLog: %d events, level=%s>" % (len(self), self.level)
@@ -0,0 +1,398 @@
+""" Run the tasks of one worker in a pool of subprocesses
+
+Tasks that hold the GIL, like pure Python code, don't run in parallel in the
+threads of a worker.  With ``distributed.worker.executor: processes`` a worker
+instead sends its tasks to a pool of ``nthreads`` subprocesses.  The scheduler
+still sees a single worker with ``nthreads`` cores.
+
+Results stay in the subprocess that computed them.  The worker keeps a small
+``ChildValue`` handle in its ``.data`` and fetches the actual value only when
+another worker or a client asks for it.  Tasks preferably run in the
+subprocess that holds most of their inputs.  Values that move between
+processes are pickled with protocol 5, and their buffers (NumPy arrays for
+example) are copied once into shared memory, from which the receiving process
+uses them without another copy.
+
+A subprocess that dies, for example when the operating system kills it for
+using too much memory, is restarted.  The task that it was computing fails,
+and the worker releases the results that it held, so that the scheduler
+computes them again.
+"""
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import multiprocessing
+import pickle
+import threading
+
+import cloudpickle
+import dask
+
+from .shared_memory import dumps_value, loads_value, min_shared_size
+from .sizeof import safe_sizeof as sizeof
+from .utils import ignoring
+
+
+logger = logging.getLogger(__name__)
+
+
+class LostValue(Exception):
+    """ The subprocess holding a value died """
+
+    def __init__(self, value):
+        Exception.__init__(
+            self, "Subprocess %d holding %s died" % (value.child, value.key)
+        )
+        self.key = value.key
+
+
+class ChildValue(object):
+    """ Handle on a value that lives in a subprocess of a ProcessPool """
+
+    __slots__ = ("key", "child", "nbytes", "type")
+
+    def __init__(self, key, child, nbytes, type):
+        self.key = key
+        self.child = child
+        self.nbytes = nbytes
+        self.type = type
+
+    def __reduce__(self):
+        return (ChildValue, (self.key, self.child, self.nbytes, self.type))
+
+    def __sizeof__(self):
+        return self.nbytes
+
+    def __repr__(self):
+        return "<ChildValue: %s in subprocess %d, %d bytes>" % (
+            self.key,
+            self.child,
+            self.nbytes,
+        )
+
+
+def _serve_data(conn, store):
+    """ Serve values to the parent process, in a thread of a subprocess """
+    while True:
+        try:
+            op, key = conn.recv()
+        except EOFError:
+            return
+        if op == "export":
+            try:
+                msg = dumps_value(store[key])
+            except Exception as e:
+                msg = ("error", e)
+            conn.send(msg)
+        elif op == "delete":
+            store.pop(key, None)
+
+
+def _child_main(task_conn, data_conn):
+    """ Main loop of a subprocess of a ProcessPool """
+    from .core import error_message
+    from .utils_comm import pack_data
+    from .worker import Reschedule
+    from time import time
+
+    store = dict()
+    thread = threading.Thread(
+        target=_serve_data, args=(data_conn, store), name="Dask-Process-Pool-Data"
+    )
+    thread.daemon = True
+    thread.start()
+
+    while True:
+        try:
+            msg = pickle.loads(task_conn.recv_bytes())
+        except EOFError:
+            return
+        if msg[0] == "close":
+            return
+        _, key, function, args, kwargs, deps = msg
+
+        start = time()
+        try:
+            data = {}
+            for dep, value in deps.items():
+                if value is None:  # we hold a copy already
+                    data[dep] = store[dep]
+                else:
+                    data[dep] = store[dep] = loads_value(value)
+            args2 = pack_data(args, data, key_types=(bytes, str))
+            kwargs2 = pack_data(kwargs, data, key_types=(bytes, str))
+            result = function(*args2, **kwargs2)
+        except Exception as e:
+            response = error_message(e)
+            response["op"] = "task-erred"
+            response["actual-exception"] = e if isinstance(e, Reschedule) else None
+        else:
+            store[key] = result
+            try:
+                typ = cloudpickle.dumps(type(result))
+            except Exception:
+                typ = None
+            response = {
+                "op": "task-finished",
+                "status": "OK",
+                "nbytes": sizeof(result),
+                "type": typ,
+            }
+        response["start"] = start
+        response["stop"] = time()
+        task_conn.send_bytes(pickle.dumps(response))
+
+
+class _Child(object):
+    def __init__(self, ctx):
+        task_conn, child_task_conn = ctx.Pipe()
+        data_conn, child_data_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_child_main,
+            args=(child_task_conn, child_data_conn),
+            name="Dask-Process-Pool",
+        )
+        self.process.daemon = True
+        self.process.start()
+        child_task_conn.close()
+        child_data_conn.close()
+        self.task_conn = task_conn
+        self.data_conn = data_conn
+        self.data_lock = threading.Lock()
+
+    def close(self, timeout=0):
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.task_conn.close()
+        with self.data_lock:
+            self.data_conn.close()
+
+
+class ProcessPool(object):
+    """ A pool of subprocesses that compute tasks and hold their results
+
+    ``compute`` is blocking and meant to be called from the threads of the
+    worker's ThreadPoolExecutor, one task per thread at a time.
+
+    Parameters
+    ----------
+    n: int
+        Number of subprocesses
+    method: str, optional
+        Multiprocessing start method, defaults to
+        ``distributed.worker.multiprocessing-method``
+    on_lost: callable, optional
+        Called from any thread with the index of a subprocess that died and
+        the keys whose only copy it held
+    """
+
+    def __init__(self, n, method=None, on_lost=None):
+        if multiprocessing.current_process().daemon:
+            raise ValueError(
+                "A worker with a process pool executor can't run in a daemonic "
+                "process.  Set the distributed.worker.daemon configuration "
+                "value to False."
+            )
+        self.ctx = multiprocessing.get_context(
+            method or dask.config.get("distributed.worker.multiprocessing-method")
+        )
+        self.children = [_Child(self.ctx) for _ in range(n)]
+        self.on_lost = on_lost
+        self.holders = defaultdict(set)  # key: indices of children with a copy
+        self.lock = threading.Lock()
+        self.idle = set(range(n))
+        self.condition = threading.Condition(self.lock)
+        self.min_shared_size = min_shared_size()
+        self._restart_lock = threading.Lock()
+        # Deletes wait for exports in flight, so they don't run on the caller
+        self._deletes = ThreadPoolExecutor(1, thread_name_prefix="Dask-Process-Pool")
+
+    def _acquire(self, data):
+        """ Reserve an idle child, preferably the one holding most of data """
+        with self.condition:
+            while not self.idle:
+                self.condition.wait()
+            weights = defaultdict(int)
+            for dep, value in data.items():
+                nbytes = value.nbytes if isinstance(value, ChildValue) else 1
+                for i in self.holders.get(dep, ()):
+                    weights[i] += nbytes
+            i = max(self.idle, key=lambda i: weights[i])
+            self.idle.remove(i)
+            return i
+
+    def _release(self, i):
+        with self.condition:
+            self.idle.add(i)
+            self.condition.notify()
+
+    def _restart(self, i, child):
+        """ Replace a child that died, and report the keys that it held """
+        with self._restart_lock:
+            if self.children[i] is not child:  # restarted already
+                return
+            child.close(timeout=1)
+            logger.error(
+                "Subprocess %d of the process pool died with exit code %s, "
+                "restarting it",
+                i,
+                child.process.exitcode,
+            )
+            new = _Child(self.ctx)
+            with self.lock:
+                self.children[i] = new
+                lost = []
+                for key, holders in list(self.holders.items()):
+                    if i in holders:
+                        holders.remove(i)
+                        if not holders:
+                            del self.holders[key]
+                        lost.append(key)
+        if lost and self.on_lost is not None:
+            self.on_lost(i, lost)
+
+    def check(self):
+        """ Restart the idle children that died """
+        with self.condition:
+            dead = [i for i in self.idle if not self.children[i].process.is_alive()]
+            self.idle.difference_update(dead)
+        for i in dead:
+            try:
+                self._restart(i, self.children[i])
+            finally:
+                self._release(i)
+
+    def compute(self, key, function, args, kwargs, data):
+        """ Compute a task in a subprocess
+
+        Parameters
+        ----------
+        key: str
+        function, args, kwargs:
+            The task, with dependencies referred to by their keys
+        data: dict
+            Dependencies of the task, either values or ``ChildValue`` handles
+
+        Returns
+        -------
+        A message like that of ``apply_function``, with a ``ChildValue`` as
+        the result
+        """
+        from threading import get_ident
+        from time import time
+
+        from .core import error_message
+        from .worker import Reschedule
+
+        start = time()
+
+        def erred(e, actual_exception=None):
+            msg = error_message(e)
+            msg["op"] = "task-erred"
+            msg["actual-exception"] = actual_exception
+            msg["start"] = start
+            msg["stop"] = time()
+            return msg
+
+        i = self._acquire(data)
+        child = self.children[i]
+        try:
+            if not child.process.is_alive():
+                self._restart(i, child)
+                child = self.children[i]
+            try:
+                deps = {}
+                for dep, value in data.items():
+                    with self.lock:
+                        held = i in self.holders.get(dep, ())
+                    if held:
+                        deps[dep] = None
+                    else:
+                        deps[dep] = self.export(value)
+                        with self.lock:
+                            self.holders[dep].add(i)
+            except LostValue as e:
+                # Compute the task again once its input is back
+                msg = erred(e, Reschedule())
+            except Exception as e:
+                msg = erred(e)
+            else:
+                try:
+                    child.task_conn.send_bytes(
+                        cloudpickle.dumps(
+                            ("compute", key, function, args, kwargs, deps)
+                        )
+                    )
+                    msg = pickle.loads(child.task_conn.recv_bytes())
+                except (EOFError, EnvironmentError):
+                    self._restart(i, child)
+                    msg = erred(
+                        RuntimeError(
+                            "Subprocess %d died with exit code %s while computing %s"
+                            % (i, child.process.exitcode, key)
+                        )
+                    )
+        finally:
+            self._release(i)
+
+        if msg["op"] == "task-finished":
+            with self.lock:
+                self.holders[key].add(i)
+            typ = object
+            if msg["type"] is not None:
+                with ignoring(Exception):
+                    typ = pickle.loads(msg["type"])
+            msg["type"] = typ
+            msg["result"] = ChildValue(key, i, msg["nbytes"], typ)
+        msg["thread"] = get_ident()
+        return msg
+
+    def export(self, value):
+        """ Prepare a value or a handle for sending to a subprocess """
+        if not isinstance(value, ChildValue):
+            return dumps_value(value, self.min_shared_size)
+        child = self.children[value.child]
+        try:
+            with child.data_lock:
+                child.data_conn.send(("export", value.key))
+                msg = child.data_conn.recv()
+        except (EOFError, EnvironmentError):
+            self._restart(value.child, child)
+            raise LostValue(value)
+        if msg[0] == "error":
+            raise msg[1]
+        return msg
+
+    def materialize(self, value):
+        """ The value behind a handle, copied into this process """
+        if not isinstance(value, ChildValue):
+            return value
+        return loads_value(self.export(value))
+
+    def forget(self, key):
+        """ Remove all copies of key from the subprocesses, without blocking """
+        with self.lock:
+            holders = self.holders.pop(key, ())
+        for i in holders:
+            self._deletes.submit(self._delete, self.children[i], key)
+
+    def _delete(self, child, key):
+        with child.data_lock:
+            with ignoring(EnvironmentError):
+                child.data_conn.send(("delete", key))
+
+    def close(self, timeout=2):
+        self._deletes.shutdown()
+        for child in self.children:
+            with ignoring(EnvironmentError):
+                child.task_conn.send_bytes(pickle.dumps(("close",)))
+        for child in self.children:
+            child.close(timeout)
+        self.holders.clear()
+
+    def __repr__(self):
+        return "<ProcessPool: %d processes, %d keys>" % (
+            len(self.children),
+            len(self.holders),
+        )
@@ -1,8 +1,13 @@
 from functools import partial
 from distutils.version import LooseVersion
 
-from .compression import compressions, default_compression
-from .core import dumps, loads, maybe_compress, decompress, msgpack
+from .compression import (
+    CompressionPolicy,
+    compressions,
+    default_compression,
+    select_compression,
+)
+from .core import MessageTemplates, dumps, loads, maybe_compress, decompress, msgpack
 from .cuda import cuda_serialize, cuda_deserialize
 from .serialize import (
     serialize,
@@ -17,6 +22,7 @@ from .serialize import (
     serialize_bytes,
     deserialize_bytes,
     serialize_bytelist,
+    frames_to_bytelist,
     register_serialization_family,
     register_generic,
 )
@@ -1,3 +1,4 @@
+from . import pickle
 from .serialize import dask_serialize, dask_deserialize
 
 import pyarrow
@@ -45,3 +46,216 @@ def deserialize_table(header, frames):
     blob = frames[0]
     reader = pyarrow.RecordBatchStreamReader(pyarrow.BufferReader(blob))
     return reader.read_all()
+
+
+def _dump_array(arr, frames):
+    """ Header of an Arrow array, whose buffers we append to frames """
+    typ = arr.type
+    header = {"length": len(arr), "null-count": arr.null_count, "offset": arr.offset}
+    if pyarrow.types.is_dictionary(typ):
+        header["indices"] = _dump_array(arr.indices, frames)
+        header["dictionary"] = _dump_array(arr.dictionary, frames)
+        return header
+    if typ.num_fields:
+        raise NotImplementedError("Arrow type with children: %s" % typ)
+    buffers = arr.buffers()
+    header["buffers"] = [buffer is not None for buffer in buffers]
+    frames.extend(memoryview(buffer) for buffer in buffers if buffer is not None)
+    return header
+
+
+def _load_array(typ, header, frames):
+    """ Arrow array from its header and an iterator over its frames """
+    if pyarrow.types.is_dictionary(typ):
+        indices = _load_array(typ.index_type, header["indices"], frames)
+        dictionary = _load_array(typ.value_type, header["dictionary"], frames)
+        return pyarrow.DictionaryArray.from_arrays(
+            indices, dictionary, ordered=typ.ordered, safe=False
+        )
+    buffers = [
+        pyarrow.py_buffer(next(frames)) if present else None
+        for present in header["buffers"]
+    ]
+    return pyarrow.Array.from_buffers(
+        typ, header["length"], buffers, header["null-count"], header["offset"]
+    )
+
+
+def dump_table(tbl):
+    """ Serialize a Table or RecordBatch with one frame per column buffer
+
+    The first frame is the schema as an Arrow IPC message.  The others are
+    the buffers of each chunk of each column, which we send without copying
+    them into an IPC stream.
+
+    See Also
+    --------
+    load_table
+    """
+    frames = [memoryview(tbl.schema.serialize())]
+    if isinstance(tbl, pyarrow.Table):
+        columns = [
+            [_dump_array(chunk, frames) for chunk in column.chunks]
+            for column in tbl.columns
+        ]
+    else:
+        columns = [[_dump_array(column, frames)] for column in tbl.columns]
+    header = {"columns": columns}
+    return header, frames
+
+
+def load_table(header, frames, batch=False):
+    """ Table, or RecordBatch if ``batch``, that wraps the frames without copies
+
+    See Also
+    --------
+    dump_table
+    """
+    schema = pyarrow.ipc.read_schema(pyarrow.py_buffer(frames[0]))
+    buffers = iter(frames[1:])
+    columns = [
+        [_load_array(field.type, chunk, buffers) for chunk in chunks]
+        for field, chunks in zip(schema, header["columns"])
+    ]
+    if batch:
+        return pyarrow.RecordBatch.from_arrays(
+            [chunks[0] for chunks in columns], schema=schema
+        )
+    columns = [
+        pyarrow.chunked_array(chunks, type=field.type)
+        for field, chunks in zip(schema, columns)
+    ]
+    return pyarrow.Table.from_arrays(columns, schema=schema)
+
+
+def _numpy_view(typ, header, frame):
+    """ A NumPy array of the values of a primitive Arrow array, or None """
+    import numpy as np
+
+    if header["null-count"] or memoryview(frame).readonly:
+        return None
+    if pyarrow.types.is_timestamp(typ):
+        dtype = np.dtype("M8[%s]" % typ.unit)
+    elif pyarrow.types.is_duration(typ):
+        dtype = np.dtype("m8[%s]" % typ.unit)
+    elif pyarrow.types.is_integer(typ) or pyarrow.types.is_floating(typ):
+        dtype = np.dtype(typ.to_pandas_dtype())
+    else:
+        return None
+    return np.frombuffer(
+        frame,
+        dtype=dtype,
+        count=header["length"],
+        offset=header["offset"] * dtype.itemsize,
+    )
+
+
+def dump_dataframe(df):
+    """ Serialize a pandas DataFrame as an Arrow table
+
+    Arrow only names columns with strings, so we pickle the column labels.
+
+    See Also
+    --------
+    dump_table
+    load_dataframe
+    """
+    labels = df.columns
+    df = df.copy(deep=False)
+    df.columns = ["column-%d" % i for i in range(len(labels))]
+    try:
+        tbl = pyarrow.Table.from_pandas(df)
+    except pyarrow.ArrowException as e:
+        # Like columns of mixed Python objects
+        raise NotImplementedError(str(e))
+    if not tbl.num_columns and len(df):
+        raise NotImplementedError("Arrow tables without columns have no rows")
+    header, frames = dump_table(tbl)
+    header["labels"] = pickle.dumps(labels)
+    return header, frames
+
+
+def load_dataframe(header, frames):
+    """ Deserialize a pandas DataFrame from ``dump_dataframe``
+
+    Arrow converts numeric columns without nulls to NumPy without copies,
+    but marks them read-only.  We build the DataFrame from views of the same
+    frames instead, which are writable if the frames are, as with pickle.
+    Columns of other types are converted by Arrow.  With ``copy=False``
+    pandas keeps each column in a block of its own rather than copying them
+    into one.
+    """
+    import pandas as pd
+
+    tbl = load_table(header, frames)
+    df = tbl.to_pandas(split_blocks=True)
+
+    # Values of each column, if one chunk of just a data buffer
+    views = {}
+    position = 1
+    for field, chunks in zip(tbl.schema, header["columns"]):
+        if len(chunks) == 1 and list(chunks[0].get("buffers", ())) == [False, True]:
+            view = _numpy_view(field.type, chunks[0], frames[position])
+            if view is not None:
+                views[field.name] = view
+        position += sum(_count_frames(chunk) for chunk in chunks)
+
+    index_columns = tbl.schema.pandas_metadata["index_columns"]
+    names = [name for name in tbl.schema.names if name not in index_columns]
+    columns = {}
+    for i, name in enumerate(names):
+        columns[i] = df.iloc[:, i].array
+        view = views.get(name)
+        if view is None:
+            continue
+        dtype = df.dtypes.iloc[i]
+        if isinstance(dtype, pd.DatetimeTZDtype) and view.dtype == "M8[ns]":
+            columns[i] = pd.arrays.DatetimeArray(view, dtype=dtype)
+        elif dtype == view.dtype:
+            columns[i] = view
+    df = pd.DataFrame(columns, index=df.index, columns=range(len(names)), copy=False)
+    df.columns = pickle.loads(header["labels"])
+    return df
+
+
+def serialize_columns(x):
+    """ Serialize a DataFrame, Table or RecordBatch by its column buffers
+
+    This is the ``"arrow"`` serialization family.  Unlike the per-type
+    serializers above, it sends each buffer of each column as a frame and
+    deserializes without copies where the types allow.
+
+    Arrow saves most on columns of Python strings, which pickle one object at
+    a time.  Pickle already sends the NumPy blocks of other DataFrames without
+    copies, and faster, so these, like other objects, raise
+    ``NotImplementedError`` to let the next family serialize them.
+    """
+    if type(x) is pyarrow.Table:
+        header, frames = dump_table(x)
+        header["kind"] = "table"
+    elif type(x) is pyarrow.RecordBatch:
+        header, frames = dump_table(x)
+        header["kind"] = "batch"
+    else:
+        import pandas as pd
+
+        if type(x) is not pd.DataFrame:
+            raise NotImplementedError(type(x).__name__)
+        dtypes = list(x.dtypes) + [x.index.dtype]
+        if not any(dtype == object or str(dtype) == "string" for dtype in dtypes):
+            raise NotImplementedError("DataFrame without object columns")
+        header, frames = dump_dataframe(x)
+        header["kind"] = "dataframe"
+    return header, frames
+
+
+def deserialize_columns(header, frames):
+    if header["kind"] == "dataframe":
+        return load_dataframe(header, frames)
+    return load_table(header, frames, batch=header["kind"] == "batch")
+
+
+def _count_frames(header):
+    if "buffers" in header:
+        return sum(header["buffers"])
+    return _count_frames(header["indices"]) + _count_frames(header["dictionary"])
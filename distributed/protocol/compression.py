@@ -3,8 +3,10 @@ Record known compressors
 
 Includes utilities for determining whether or not to compress
 """
+from concurrent.futures import ThreadPoolExecutor
 import logging
 import random
+import threading
 
 import dask
 from toolz import identity, partial
@@ -12,13 +14,14 @@ from toolz import identity, partial
 try:
     import blosc
 
-    n = blosc.set_nthreads(2)
-    if hasattr("blosc", "releasegil"):
+    n = blosc.set_nthreads(dask.config.get("distributed.comm.blosc.threads"))
+    if hasattr(blosc, "set_releasegil"):
         blosc.set_releasegil(True)
 except ImportError:
     blosc = False
 
-from ..utils import ignoring, ensure_bytes
+from ..metrics import time
+from ..utils import ignoring, ensure_bytes, nbytes
 
 
 compressions = {None: {"compress": identity, "decompress": identity}}
@@ -97,18 +100,26 @@ with ignoring(ImportError):
 with ignoring(ImportError):
     import zstandard
 
-    zstd_compressor = zstandard.ZstdCompressor(
-        level=dask.config.get("distributed.comm.zstd.level"),
-        threads=dask.config.get("distributed.comm.zstd.threads"),
-    )
-
-    zstd_decompressor = zstandard.ZstdDecompressor()
+    # (De)compressor objects must not be used by several threads at once, and
+    # we compress from the event loop, offload threads and spill threads
+    _zstd_local = threading.local()
 
     def zstd_compress(data):
-        return zstd_compressor.compress(data)
+        try:
+            compressor = _zstd_local.compressor
+        except AttributeError:
+            compressor = _zstd_local.compressor = zstandard.ZstdCompressor(
+                level=dask.config.get("distributed.comm.zstd.level"),
+                threads=dask.config.get("distributed.comm.zstd.threads"),
+            )
+        return compressor.compress(data)
 
     def zstd_decompress(data):
-        return zstd_decompressor.decompress(data)
+        try:
+            decompressor = _zstd_local.decompressor
+        except AttributeError:
+            decompressor = _zstd_local.decompressor = zstandard.ZstdDecompressor()
+        return decompressor.decompress(data)
 
     compressions["zstd"] = {"compress": zstd_compress, "decompress": zstd_decompress}
 
@@ -145,7 +156,8 @@ def byte_sample(b, size, n):
     n: int
         number of samples to collect
     """
-    starts = [random.randint(0, len(b) - size) for j in range(n)]
+    # Sorted, so that truncated samples don't overlap (and compress well)
+    starts = sorted(random.randint(0, len(b) - size) for j in range(n))
     ends = []
     for i, start in enumerate(starts[:-1]):
         ends.append(min(start + size, starts[i + 1]))
@@ -155,7 +167,9 @@ def byte_sample(b, size, n):
     return b"".join(map(ensure_bytes, parts))
 
 
-def maybe_compress(payload, min_size=1e4, sample_size=1e4, nsamples=5):
+def maybe_compress(
+    payload, min_size=1e4, sample_size=1e4, nsamples=5, compression=None
+):
     """
     Maybe compress payload
 
@@ -165,34 +179,52 @@ def maybe_compress(payload, min_size=1e4, sample_size=1e4, nsamples=5):
     3.  We then compress the full original, it it doesn't compress well then we
         return the original
     4.  We return the compressed result
+
+    By default we use the ``distributed.comm.compression`` configuration value.
+    Pass ``compression=`` to choose a specific compressor instead, or
+    ``compression=False`` to disable compression.
     """
-    compression = dask.config.get("distributed.comm.compression")
+    if len(payload) < min_size:
+        return None, payload
+    if len(payload) > 2 ** 31:  # Too large, compression libraries often fail
+        return None, payload
+
+    explicit = compression is not None
+    if not explicit:
+        compression = dask.config.get("distributed.comm.compression")
     if compression == "auto":
         compression = default_compression
 
     if not compression:
         return None, payload
-    if len(payload) < min_size:
-        return None, payload
-    if len(payload) > 2 ** 31:  # Too large, compression libraries often fail
+
+    # Compress a sample, return original if not very compressed
+    if not _sample_compresses(payload, compression, sample_size, nsamples):
         return None, payload
 
-    min_size = int(min_size)
-    sample_size = int(sample_size)
+    return _compress(payload, compression, explicit)
 
+
+def _sample_compresses(payload, compression, sample_size, nsamples):
+    """ Whether a sample of payload compresses by at least 10% """
     compress = compressions[compression]["compress"]
+    sample = byte_sample(payload, int(sample_size), nsamples)
+    return len(compress(sample)) <= 0.9 * len(sample)
 
-    # Compress a sample, return original if not very compressed
-    sample = byte_sample(payload, sample_size, nsamples)
-    if len(compress(sample)) > 0.9 * len(sample):  # sample not very compressible
-        return None, payload
 
+def _compress(payload, compression, explicit):
+    """ Compress all of payload, unless that doesn't save at least 10% """
+    compress = compressions[compression]["compress"]
     if type(payload) is memoryview:
         nbytes = payload.itemsize * len(payload)
     else:
         nbytes = len(payload)
 
-    if default_compression and blosc and type(payload) is memoryview:
+    if (
+        blosc
+        and type(payload) is memoryview
+        and (compression == "blosc" or (default_compression and not explicit))
+    ):
         # Blosc does itemsize-aware shuffling, resulting in better compression
         compressed = blosc.compress(
             payload, typesize=payload.itemsize, cname="lz4", clevel=5
@@ -207,9 +239,179 @@ def maybe_compress(payload, min_size=1e4, sample_size=1e4, nsamples=5):
         return compression, compressed
 
 
+class CompressionPolicy(object):
+    """ The compression decisions of one comm
+
+    ``maybe_compress`` looks up the ``distributed.comm.compression``
+    configuration and test-compresses a sample of every large frame.  For a
+    comm that streams many similar frames we instead resolve the configuration
+    once, and remember which kinds of frames, like arrays of some dtype from
+    one serializer, did not compress.  After ``patience`` incompressible
+    samples in a row, we send frames of that kind without sampling them,
+    except that every ``recheck``-th frame is sampled again in case its data
+    changed.
+
+    Parameters
+    ----------
+    compression: str or False, optional
+        Compressor to use, by default from the configuration
+    patience: int
+    recheck: int
+
+    Examples
+    --------
+    >>> policy = CompressionPolicy(compression="zlib")
+    >>> policy.maybe_compress(b"0" * 100000, kind="pickle")[0]
+    'zlib'
+
+    See Also
+    --------
+    maybe_compress
+    """
+
+    def __init__(self, compression=None, patience=3, recheck=100):
+        self.explicit = compression is not None
+        if not self.explicit:
+            compression = dask.config.get("distributed.comm.compression")
+        if compression == "auto":
+            compression = default_compression
+        self.compression = compression
+        self.patience = patience
+        self.recheck = recheck
+        self._incompressible = dict()  # kind -> samples since it compressed
+        self.sampled = 0
+        self.skipped = 0
+        self.sample_time = 0.0
+
+    def maybe_compress(
+        self, payload, kind=None, min_size=1e4, sample_size=1e4, nsamples=5
+    ):
+        """ Maybe compress payload, like ``maybe_compress``
+
+        Parameters
+        ----------
+        payload: bytes or memoryview
+        kind: hashable, optional
+            What the payload is, for example the serializer and dtype.
+            Frames without a kind are always sampled.
+        """
+        if not self.compression or len(payload) < min_size:
+            return None, payload
+        if len(payload) > 2 ** 31:  # Too large, compression libraries often fail
+            return None, payload
+
+        if kind is not None:
+            count = self._incompressible.get(kind, 0)
+            if count >= self.patience:
+                self._incompressible[kind] = count + 1
+                if (count + 1 - self.patience) % self.recheck:
+                    self.skipped += 1
+                    return None, payload
+
+        start = time()
+        compresses = _sample_compresses(
+            payload, self.compression, sample_size, nsamples
+        )
+        self.sample_time += time() - start
+        self.sampled += 1
+
+        if kind is not None:
+            if compresses:
+                self._incompressible.pop(kind, None)
+            elif count < self.patience:
+                self._incompressible[kind] = count + 1
+        if not compresses:
+            return None, payload
+        return _compress(payload, self.compression, self.explicit)
+
+    @property
+    def time_saved(self):
+        """ Estimated seconds saved by skipping samples """
+        if not self.sampled:
+            return 0.0
+        return self.skipped * self.sample_time / self.sampled
+
+    def get_metrics(self):
+        return {
+            "sampled": self.sampled,
+            "skipped": self.skipped,
+            "time-saved": self.time_saved,
+        }
+
+
+def select_compression(payload, candidates=None, sample_size=1e4, nsamples=5):
+    """
+    Choose the compressor that works best on a sample of payload
+
+    Candidates are tried in order, so faster compressors should come first.
+    A later candidate is only chosen if it shrinks the sample by a further 10%.
+    Returns ``None`` if the payload is small or no candidate compresses the
+    sample well.
+
+    Parameters
+    ----------
+    payload: bytes or memoryview
+    candidates: list of str, optional
+        Names of compressors to try.  Defaults to lz4, blosc and zstd, where
+        installed.
+    """
+    if candidates is None:
+        candidates = [c for c in ("lz4", "blosc", "zstd") if c in compressions]
+    if not candidates or len(payload) < sample_size:
+        return None
+    if len(payload) > 2 ** 31:
+        return None
+
+    sample = byte_sample(payload, int(sample_size), nsamples)
+    best, best_size = None, 0.9 * len(sample)
+    for name in candidates:
+        size = len(compressions[name]["compress"](sample))
+        if size < (0.9 * best_size if best else best_size):
+            best, best_size = name, size
+    return best
+
+
+# Frames that together have fewer bytes are (de)compressed serially
+PARALLEL_MIN_SIZE = 2 ** 22
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    """ The thread pool that (de)compresses large frames, or None """
+    global _executor
+    threads = dask.config.get("distributed.comm.compression-threads")
+    if threads <= 1:
+        return None
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                threads, thread_name_prefix="Compression-Executor"
+            )
+    return _executor
+
+
+def map_frames(func, frames, *args):
+    """ Apply func to each frame, in parallel if the frames are large
+
+    Like ``map``, further iterables give further arguments to func.
+    Compressors release the GIL, so we (de)compress several large frames, like
+    the shards of a large array, at once on
+    ``distributed.comm.compression-threads`` threads.  The pool is sized on
+    first use.
+    """
+    if len(frames) > 1 and sum(map(nbytes, frames)) >= PARALLEL_MIN_SIZE:
+        executor = _get_executor()
+        if executor is not None:
+            return list(executor.map(func, frames, *args))
+    return list(map(func, frames, *args))
+
+
+def _decompress(frame, compression):
+    return compressions[compression]["decompress"](frame)
+
+
 def decompress(header, frames):
     """ Decompress frames according to information in the header """
-    return [
-        compressions[c]["decompress"](frame)
-        for c, frame in zip(header["compression"], frames)
-    ]
+    return map_frames(_decompress, frames, header["compression"])
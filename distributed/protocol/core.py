@@ -1,3 +1,4 @@
+from functools import partial
 import logging
 import operator
 
@@ -8,7 +9,7 @@ try:
 except ImportError:
     from toolz import reduce
 
-from .compression import compressions, maybe_compress, decompress
+from .compression import compressions, maybe_compress, decompress, map_frames
 from .serialize import serialize, deserialize, Serialize, Serialized, extract_serialize
 from .utils import frame_split_size, merge_frames, msgpack_opts
 from ..utils import nbytes
@@ -19,17 +20,30 @@ _deserialize = deserialize
 logger = logging.getLogger(__name__)
 
 
-def dumps(msg, serializers=None, on_error="message", context=None):
-    """ Transform Python message to bytestream suitable for communication """
+def dumps(
+    msg,
+    serializers=None,
+    on_error="message",
+    context=None,
+    compression_policy=None,
+    templates=None,
+):
+    """ Transform Python message to bytestream suitable for communication
+
+    Frames are compressed with ``maybe_compress``, or with the
+    ``maybe_compress`` method of ``compression_policy`` if given.  Batches of
+    dicts are sent as ``templates`` if given, see ``MessageTemplates``.
+    """
     try:
         data = {}
         # Only lists and dicts can contain serialized values
         if isinstance(msg, (list, dict)):
             msg, data, bytestrings = extract_serialize(msg)
-        small_header, small_payload = dumps_msgpack(msg)
 
         if not data:  # fast path without serialized data
-            return small_header, small_payload
+            return dumps_msgpack(
+                msg, compression_policy=compression_policy, templates=templates
+            )
 
         pre = {
             key: (value.header, value.frames)
@@ -54,8 +68,12 @@ def dumps(msg, serializers=None, on_error="message", context=None):
                 head["lengths"] = tuple(map(nbytes, frames))
             if "compression" not in head:
                 frames = frame_split_size(frames)
-                if frames:
-                    compression, frames = zip(*map(maybe_compress, frames))
+                if frames and compression_policy is not None:
+                    kind = _compression_kind(head)
+                    compress = partial(compression_policy.maybe_compress, kind=kind)
+                    compression, frames = zip(*map_frames(compress, frames))
+                elif frames:
+                    compression, frames = zip(*map_frames(maybe_compress, frames))
                 else:
                     compression = []
                 head["compression"] = compression
@@ -80,17 +98,18 @@ def dumps(msg, serializers=None, on_error="message", context=None):
                     frame = frame.tobytes()
                 out_frames[i] = frame
 
-        return [
-            small_header,
-            small_payload,
-            msgpack.dumps(header, use_bin_type=True),
-        ] + out_frames
+        header = msgpack.dumps(header, use_bin_type=True)
+        # Last, so that templates only record messages that we send
+        small_header, small_payload = dumps_msgpack(
+            msg, compression_policy=compression_policy, templates=templates
+        )
+        return [small_header, small_payload, header] + out_frames
     except Exception:
         logger.critical("Failed to Serialize", exc_info=True)
         raise
 
 
-def loads(frames, deserialize=True, deserializers=None):
+def loads(frames, deserialize=True, deserializers=None, templates=None):
     """ Transform bytestream back into Python value """
     frames = frames[::-1]  # reverse order to improve pop efficiency
     if not isinstance(frames, list):
@@ -98,7 +117,7 @@ def loads(frames, deserialize=True, deserializers=None):
     try:
         small_header = frames.pop()
         small_payload = frames.pop()
-        msg = loads_msgpack(small_header, small_payload)
+        msg = loads_msgpack(small_header, small_payload, templates=templates)
         if not frames:
             return msg
 
@@ -145,7 +164,109 @@ def loads(frames, deserialize=True, deserializers=None):
         raise
 
 
-def dumps_msgpack(msg):
+def _compression_kind(header):
+    """ What the frames of a serialized value are, for a CompressionPolicy """
+    return (header.get("serializer"), header.get("type"), str(header.get("dtype")))
+
+
+class MessageTemplates(object):
+    """ The shapes of the batches of messages sent and received on one comm
+
+    Batched streams, like those between the scheduler and its workers, send
+    lists of small dicts that repeat a few sets of keys, like the
+    ``"task-finished"`` messages of a worker.  Once both ends of a comm use
+    templates, the sender defines each set of keys once, in the header of the
+    first message that uses it.  Then it sends each dict of a batch as its
+    values followed by the number of its template.
+
+    Each end announces that it reads templates in the header of its first
+    message.  We only send templates to peers that announced it, so peers
+    that don't know templates, or don't enable them, read plain msgpack.
+
+    Parameters
+    ----------
+    max_templates: int
+        Number of sets of keys to define in each direction.  We send dicts
+        with other keys as they are.
+
+    Examples
+    --------
+    >>> sender, receiver = MessageTemplates(), MessageTemplates()
+    >>> receiver.decode({"accept-templates": True}, [])
+    []
+    >>> sender.decode({"accept-templates": True}, [])
+    []
+    >>> header = {}
+    >>> rows = sender.encode([{"op": "x", "key": 1}, {"op": "x", "key": 2}], header)
+    >>> rows, header
+    ([['x', 1, 0], ['x', 2, 0]], {'accept-templates': True, 'templates': [('op', 'key')]})
+    >>> sender.commit(header)
+    >>> receiver.decode(header, rows)
+    [{'op': 'x', 'key': 1}, {'op': 'x', 'key': 2}]
+    """
+
+    def __init__(self, max_templates=256):
+        self.max_templates = max_templates
+        self.peer_accepts = False
+        self._announced = False
+        self._sent = {}  # keys -> template number
+        self._received = []  # template number -> keys
+
+    def encode(self, msg, header):
+        """ Replace the dicts of a batch with templated rows
+
+        Adds the announcement and new templates to ``header``.  These only
+        take effect once the message is packed and we ``commit`` the header.
+        """
+        if not self._announced:
+            header["accept-templates"] = True
+        if not self.peer_accepts or type(msg) is not list or not msg:
+            return msg
+
+        sent = self._sent
+        new = {}
+        rows = []
+        for d in msg:
+            if type(d) is not dict:
+                return msg
+            keys = tuple(d)
+            i = sent.get(keys)
+            if i is None:
+                i = new.get(keys)
+                if i is None:
+                    if len(sent) + len(new) >= self.max_templates:
+                        rows.append(d)
+                        continue
+                    i = new[keys] = len(sent) + len(new)
+            row = list(d.values())
+            row.append(i)
+            rows.append(row)
+        header["templates"] = list(new)
+        return rows
+
+    def commit(self, header):
+        """ Record the templates of an encoded header, once it is sent """
+        if header.get("accept-templates"):
+            self._announced = True
+        for keys in header.get("templates", ()):
+            self._sent[keys] = len(self._sent)
+
+    def decode(self, header, msg):
+        """ Rebuild the dicts of a batch from templated rows """
+        if header.get("accept-templates"):
+            self.peer_accepts = True
+        if "templates" not in header:
+            return msg
+        received = self._received
+        received.extend(map(tuple, header["templates"]))
+        # Rows end with their template number, which zip leaves out
+        return [
+            row if type(row) is dict else dict(zip(received[row[-1]], row))
+            for row in msg
+        ]
+
+
+def dumps_msgpack(msg, compression_policy=None, templates=None):
     """ Dump msg into header and payload, both bytestrings
 
     All of the message must be msgpack encodable
@@ -154,9 +275,16 @@ def dumps_msgpack(msg):
         loads_msgpack
     """
     header = {}
+    if templates is not None:
+        msg = templates.encode(msg, header)
     payload = msgpack.dumps(msg, use_bin_type=True)
+    if templates is not None:
+        templates.commit(header)
 
-    fmt, payload = maybe_compress(payload)
+    if compression_policy is None:
+        fmt, payload = maybe_compress(payload)
+    else:
+        fmt, payload = compression_policy.maybe_compress(payload, kind="msgpack")
     if fmt:
         header["compression"] = fmt
 
@@ -168,7 +296,7 @@ def dumps_msgpack(msg):
     return [header_bytes, payload]
 
 
-def loads_msgpack(header, payload):
+def loads_msgpack(header, payload, templates=None):
     """ Read msgpack header and payload back to Python object
 
     See Also:
@@ -190,4 +318,9 @@ def loads_msgpack(header, payload):
                 " installed" % str(header["compression"])
             )
 
-    return msgpack.loads(payload, use_list=False, **msgpack_opts)
+    msg = msgpack.loads(payload, use_list=False, **msgpack_opts)
+    if templates is not None:
+        msg = templates.decode(header, msg)
+    elif "templates" in header:
+        raise ValueError("Message uses templates, but we don't read them")
+    return msg
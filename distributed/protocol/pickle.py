@@ -10,6 +10,9 @@ else:
 
 logger = logging.getLogger(__name__)
 
+# Buffers smaller than this stay in the pickle rather than in separate frames
+OUT_OF_BAND_MIN_SIZE = 2 ** 16
+
 
 def _always_use_pickle_for(x):
     mod, _, _ = x.__class__.__module__.partition(".")
@@ -27,36 +30,55 @@ def _always_use_pickle_for(x):
         return False
 
 
-def dumps(x):
+def dumps(x, *, buffer_callback=None, protocol=pickle.HIGHEST_PROTOCOL):
     """ Manage between cloudpickle and pickle
 
     1.  Try pickle
     2.  If it is short then check if it contains __main__
     3.  If it is long, then first check type, then check __main__
+
+    With ``buffer_callback`` and pickle protocol 5, large buffers, like the
+    memory of NumPy arrays, are passed to ``buffer_callback`` instead of being
+    copied into the pickle.  Give these to ``loads`` to reconstruct ``x``.
     """
+    buffers = []
+    dump_kwargs = {"protocol": protocol}
+    if buffer_callback is not None and protocol >= 5:
+
+        def callback(buffer):
+            if buffer.raw().nbytes < OUT_OF_BAND_MIN_SIZE:
+                return True  # keep small buffers in the pickle
+            buffers.append(buffer)
+
+        dump_kwargs["buffer_callback"] = callback
+
     try:
-        result = pickle.dumps(x, protocol=pickle.HIGHEST_PROTOCOL)
+        result = pickle.dumps(x, **dump_kwargs)
         if len(result) < 1000:
             if b"__main__" in result:
-                return cloudpickle.dumps(x, protocol=pickle.HIGHEST_PROTOCOL)
-            else:
-                return result
-        else:
-            if _always_use_pickle_for(x) or b"__main__" not in result:
-                return result
-            else:
-                return cloudpickle.dumps(x, protocol=pickle.HIGHEST_PROTOCOL)
+                del buffers[:]
+                result = cloudpickle.dumps(x, **dump_kwargs)
+        elif not _always_use_pickle_for(x) and b"__main__" in result:
+            del buffers[:]
+            result = cloudpickle.dumps(x, **dump_kwargs)
     except Exception:
         try:
-            return cloudpickle.dumps(x, protocol=pickle.HIGHEST_PROTOCOL)
+            del buffers[:]
+            result = cloudpickle.dumps(x, **dump_kwargs)
         except Exception as e:
             logger.info("Failed to serialize %s. Exception: %s", x, e)
             raise
+    for buffer in buffers:
+        buffer_callback(buffer)
+    return result
 
 
-def loads(x):
+def loads(x, *, buffers=()):
     try:
-        return pickle.loads(x)
+        if buffers:
+            return pickle.loads(x, buffers=buffers)
+        else:
+            return pickle.loads(x)
     except Exception:
         logger.info("Failed to deserialize %s", x[:10000], exc_info=True)
         raise
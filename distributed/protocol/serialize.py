@@ -12,12 +12,14 @@ except ImportError:
 import msgpack
 
 from . import pickle
+from ..sizeof import safe_sizeof
 from ..utils import has_keyword, typename
-from .compression import maybe_compress, decompress
+from .compression import maybe_compress, decompress, map_frames
 from .utils import (
     unpack_frames,
     pack_frames_prelude,
     frame_split_size,
+    merge_frames,
     ensure_bytes,
     msgpack_opts,
 )
@@ -55,11 +57,18 @@ def dask_loads(header, frames):
 
 
 def pickle_dumps(x):
-    return {"serializer": "pickle"}, [pickle.dumps(x)]
+    frames = [None]
+    frames[0] = pickle.dumps(x, buffer_callback=lambda b: frames.append(b.raw()))
+    return {"serializer": "pickle"}, frames
 
 
 def pickle_loads(header, frames):
-    return pickle.loads(b"".join(frames))
+    if len(frames) > 1 and "lengths" in header:
+        frames = merge_frames(header, frames)  # large frames may be split
+    # The pickle, followed by its out-of-band buffers, if any.  Read-only
+    # frames, like decompressed bytes, would make read-only arrays.
+    buffers = [bytearray(b) if memoryview(b).readonly else b for b in frames[1:]]
+    return pickle.loads(frames[0], buffers=buffers)
 
 
 def msgpack_dumps(x):
@@ -75,6 +84,23 @@ def msgpack_loads(header, frames):
     return msgpack.loads(b"".join(frames), use_list=False, **msgpack_opts)
 
 
+def arrow_dumps(x):
+    """ Serialize pandas DataFrames and Arrow tables by their column buffers """
+    if type(x).__module__.partition(".")[0] not in ("pandas", "pyarrow"):
+        raise NotImplementedError(typename(type(x)))
+    try:
+        from . import arrow
+    except ImportError:
+        raise NotImplementedError("pyarrow is not installed")
+    return arrow.serialize_columns(x)
+
+
+def arrow_loads(header, frames):
+    from . import arrow
+
+    return arrow.deserialize_columns(header, frames)
+
+
 def serialization_error_loads(header, frames):
     msg = "\n".join([ensure_bytes(frame).decode("utf8") for frame in frames])
     raise TypeError(msg)
@@ -90,6 +116,7 @@ def register_serialization_family(name, dumps, loads):
 register_serialization_family("dask", dask_dumps, dask_loads)
 register_serialization_family("pickle", pickle_dumps, pickle_loads)
 register_serialization_family("msgpack", msgpack_dumps, msgpack_loads)
+register_serialization_family("arrow", arrow_dumps, arrow_loads)
 register_serialization_family("error", None, serialization_error_loads)
 
 
@@ -297,6 +324,9 @@ class Serialize(object):
     def __hash__(self):
         return hash(self.data)
 
+    def __sizeof__(self):
+        return safe_sizeof(self.data)
+
 
 to_serialize = Serialize
 
@@ -439,9 +469,23 @@ def nested_deserialize(x):
 
 def serialize_bytelist(x, **kwargs):
     header, frames = serialize(x, **kwargs)
+    return frames_to_bytelist(header, frames)
+
+
+def frames_to_bytelist(header, frames, compression=None):
+    """ Compress and pack the result of ``serialize`` into a list of bytes
+
+    ``compression`` is passed through to ``maybe_compress`` for every frame.
+
+    See Also
+    --------
+    serialize_bytelist
+    deserialize_bytes
+    """
     frames = frame_split_size(frames)
     if frames:
-        compression, frames = zip(*map(maybe_compress, frames))
+        compress = partial(maybe_compress, compression=compression)
+        compression, frames = zip(*map_frames(compress, frames))
     else:
         compression = []
     header["compression"] = compression
@@ -44,3 +44,62 @@ def test_dumps_compression():
     msg = {"op": "update", "data": to_serialize(t)}
     result = distributed.protocol.loads(distributed.protocol.dumps(msg))
     assert result["data"].equals(t)
+
+
+def test_arrow_family():
+    np = pytest.importorskip("numpy")
+    df = pd.DataFrame(
+        {
+            "s": ["a", "b", None, "d"],
+            "i": np.arange(4),
+            "j": np.arange(4) * 2,
+            "f": [1.0, np.nan, 3.0, 4.0],
+            "c": pd.Categorical(list("xyxy")),
+            "t": pd.date_range("2000", periods=4, tz="US/Eastern"),
+            1: np.arange(4, dtype="u1"),
+        },
+        index=pd.Index(list("wxyz"), name="idx"),
+    )
+    for obj in [df, df.iloc[1:3], df.iloc[:0], df.reset_index()]:
+        header, frames = serialize(obj, serializers=["arrow"])
+        assert header["serializer"] == "arrow"
+        assert len(frames) > obj.shape[1]  # a frame per column buffer
+        frames = [bytearray(frame) for frame in frames]
+        result = deserialize(header, frames)
+        pd.testing.assert_frame_equal(result, obj)
+
+    # Numeric columns view the frames, and can be written to
+    buffers = [np.frombuffer(frame, dtype="u1") for frame in frames]
+    for column in ["i", "j", 1]:
+        assert any(np.shares_memory(result[column].values, b) for b in buffers)
+    result["i"] += 1
+    assert result["i"].tolist() == [1, 2, 3, 4]
+
+    header, frames = serialize(tbl, serializers=["arrow"])
+    assert deserialize(header, frames).equals(tbl)
+    header, frames = serialize(batch, serializers=["arrow"])
+    assert deserialize(header, frames).equals(batch)
+
+
+@pytest.mark.parametrize(
+    "obj",
+    [
+        pd.DataFrame({"x": [1.0, 2.0]}),
+        pd.DataFrame({"x": [1, "a"]}),
+        pd.DataFrame(index=range(3)),
+        pd.Series(["a", "b"]),
+        "abc",
+    ],
+)
+def test_arrow_family_falls_back(obj):
+    header, frames = serialize(obj, serializers=["arrow", "pickle"])
+    assert header["serializer"] == "pickle"
+
+
+@gen_cluster(client=True, worker_kwargs={"serializers": ["arrow", "dask", "pickle"]})
+async def test_arrow_family_between_workers(c, s, a, b):
+    df = pd.DataFrame({"x": ["a", "b", "c"] * 1000, "y": range(3000)})
+    x = c.submit(lambda: df, workers=[a.address])
+    y = c.submit(lambda df: df, x, workers=[b.address])
+    result = await y
+    pd.testing.assert_frame_equal(result, df)
@@ -1,6 +1,7 @@
 from functools import partial
 import gc
 from operator import add
+import pickle
 import weakref
 
 import pytest
@@ -23,6 +24,27 @@ def test_pickle_numpy():
     assert (loads(dumps(x)) == x).all()
 
 
+@pytest.mark.skipif(
+    pickle.HIGHEST_PROTOCOL < 5, reason="Out-of-band buffers need pickle protocol 5"
+)
+def test_pickle_out_of_band():
+    np = pytest.importorskip("numpy")
+    x = {"small": np.ones(10), "large": np.arange(100000), "text": "abc"}
+
+    buffers = []
+    header = dumps(x, buffer_callback=buffers.append)
+    assert len(buffers) == 1  # small buffers stay in band
+    assert len(header) < 10000
+    y = loads(header, buffers=buffers)
+    assert (y["large"] == x["large"]).all()
+    assert (y["small"] == x["small"]).all()
+    assert y["text"] == "abc"
+    assert np.shares_memory(y["large"], x["large"])
+
+    # Without a callback everything is in band
+    assert (loads(dumps(x))["large"] == x["large"]).all()
+
+
 def test_pickle_functions():
     def make_closure():
         value = 1
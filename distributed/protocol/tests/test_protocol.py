@@ -1,10 +1,18 @@
+import os
 import sys
 
 import dask
 import pytest
 
-from distributed.protocol import loads, dumps, msgpack, maybe_compress, to_serialize
-from distributed.protocol.compression import compressions
+from distributed.protocol import (
+    MessageTemplates,
+    loads,
+    dumps,
+    msgpack,
+    maybe_compress,
+    to_serialize,
+)
+from distributed.protocol.compression import compressions, CompressionPolicy
 from distributed.protocol.serialize import Serialize, Serialized, serialize, deserialize
 from distributed.system import MEMORY_LIMIT
 from distributed.utils import nbytes
@@ -221,3 +229,160 @@ def test_maybe_compress_memoryviews():
     else:
         assert compression == "blosc"
         assert len(payload) < x.nbytes / 10
+
+
+def test_select_compression():
+    from distributed.protocol.compression import select_compression
+
+    assert select_compression(b"0" * 10) is None  # too small
+    assert select_compression(os.urandom(100000)) is None  # incompressible
+    assert select_compression(b"0" * 100000) in compressions
+
+    pytest.importorskip("lz4")
+    assert select_compression(b"0" * 100000, candidates=["lz4"]) == "lz4"
+
+
+def test_compression_policy():
+    pytest.importorskip("zlib")
+    policy = CompressionPolicy(compression="zlib", patience=2, recheck=5)
+    payload = os.urandom(100000)
+
+    for i in range(2):
+        assert policy.maybe_compress(payload, kind="random") == (None, payload)
+    assert policy.sampled == 2
+
+    # Known to be incompressible, until we check again
+    for i in range(4):
+        assert policy.maybe_compress(payload, kind="random") == (None, payload)
+    assert policy.skipped == 4
+    assert policy.sampled == 2
+    assert policy.time_saved > 0
+    assert policy.get_metrics()["skipped"] == 4
+
+    policy.maybe_compress(payload, kind="random")
+    assert policy.sampled == 3
+
+    # Other kinds and frames without a kind are sampled
+    assert policy.maybe_compress(b"0" * 100000, kind="zeros")[0] == "zlib"
+    assert policy.maybe_compress(b"0" * 100000)[0] == "zlib"
+    assert policy.maybe_compress(b"0" * 100)[0] is None  # too small
+
+    # Compressible data of the same kind, once sampled, resets it
+    for i in range(4):
+        policy.maybe_compress(payload, kind="random")
+    assert policy.maybe_compress(b"0" * 100000, kind="random")[0] == "zlib"
+    assert policy.maybe_compress(payload, kind="random") == (None, payload)
+    assert policy.skipped == 8
+    assert policy.sampled == 7
+
+
+def test_compression_policy_config():
+    with dask.config.set({"distributed.comm.compression": None}):
+        policy = CompressionPolicy()
+    # The configuration is resolved once
+    with dask.config.set({"distributed.comm.compression": "zlib"}):
+        assert policy.maybe_compress(b"0" * 100000) == (None, b"0" * 100000)
+
+
+def test_dumps_compression_policy():
+    pytest.importorskip("zlib")
+    policy = CompressionPolicy(compression="zlib", patience=1)
+    msg = {"x": to_serialize(os.urandom(100000))}
+    for i in range(3):
+        assert loads(dumps(msg, compression_policy=policy)) == {"x": msg["x"].data}
+    assert policy.sampled == 1
+    assert policy.skipped == 2
+
+    policy = CompressionPolicy(compression="zlib", patience=1)
+    msg = {"x": to_serialize(b"0" * 100000), "y": b"0" * 100000}
+    frames = dumps(msg, compression_policy=policy)
+    assert sum(map(nbytes, frames)) < 10000
+    assert loads(frames) == {"x": b"0" * 100000, "y": b"0" * 100000}
+
+
+def test_parallel_compression(monkeypatch):
+    pytest.importorskip("zlib")
+    import threading
+    from distributed.protocol import compression
+
+    monkeypatch.setattr(compression, "PARALLEL_MIN_SIZE", 100000)
+    threads = set()
+
+    def compress(frame):
+        threads.add(threading.current_thread().name)
+        return compression.maybe_compress(frame, compression="zlib")
+
+    frames = [b"0" * 100000, b"1" * 100000, b"2" * 10]
+    with dask.config.set({"distributed.comm.compression-threads": 2}):
+        header, compressed = zip(*compression.map_frames(compress, frames))
+        assert header == ("zlib", "zlib", None)
+        assert all(t.startswith("Compression-Executor") for t in threads)
+        assert compression.decompress({"compression": header}, compressed) == frames
+
+    threads.clear()
+    with dask.config.set({"distributed.comm.compression-threads": 1}):
+        compression.map_frames(compress, frames)
+        assert threads == {threading.current_thread().name}
+
+    # Shards of a large frame round trip
+    with dask.config.set({"distributed.comm.compression-threads": 2}):
+        x = b"0123456789" * 30000
+        frames = dumps({"x": to_serialize(x)})
+        assert sum(map(nbytes, frames)) < len(x)
+        assert loads(frames) == {"x": x}
+
+
+def test_message_templates():
+    sender, receiver = MessageTemplates(), MessageTemplates()
+    batch = [{"op": "a", "x": i} for i in range(3)] + [{"op": "b"}]
+
+    # Plain msgpack until the peer announces that it reads templates
+    assert loads(dumps(batch, templates=sender), templates=receiver) == tuple(batch)
+    assert receiver.peer_accepts and not sender.peer_accepts
+    loads(dumps({"op": "ok"}, templates=receiver), templates=sender)
+    assert sender.peer_accepts
+
+    frames = dumps(batch, templates=sender)
+    assert len(frames[1]) < len(dumps(batch)[1])
+    assert loads(frames, templates=receiver) == batch
+    assert sender._sent == {("op", "x"): 0, ("op",): 1}
+    with pytest.raises(ValueError, match="templates"):
+        loads(frames)
+
+    # Known templates are not sent again
+    frames2 = dumps(batch, templates=sender)
+    assert len(frames2[0]) < len(frames[0])
+    assert loads(frames2, templates=receiver) == batch
+
+    # Serialized values, and batches of other types
+    msg = [{"op": "a", "x": to_serialize(123)}, {"op": "c", "y": b"123"}]
+    assert loads(dumps(msg, templates=sender), templates=receiver) == [
+        {"op": "a", "x": 123},
+        {"op": "c", "y": b"123"},
+    ]
+    msg = [{"op": "a", "x": 1}, "b"]
+    assert loads(dumps(msg, templates=sender), templates=receiver) == tuple(msg)
+
+    # We only record templates of messages that we send
+    with pytest.raises(TypeError):
+        dumps(
+            [{"op": "d", "x": to_serialize(object())}],
+            templates=sender,
+            serializers=["msgpack"],
+            on_error="raise",
+        )
+    assert ("op",) in sender._sent and ("op", "x") in sender._sent
+    assert len(sender._sent) == 3
+
+    # Other shapes go as they are once all templates are used
+    sender.max_templates = 3
+    msg = [{"op": "e", "z": 1}, {"op": "a", "x": 1}]
+    assert loads(dumps(msg, templates=sender), templates=receiver) == msg
+    assert len(sender._sent) == len(receiver._received) == 3
+
+
+def test_maybe_compress_explicit_compression():
+    pytest.importorskip("zlib")
+    payload = b"0" * 100000
+    assert maybe_compress(payload, compression="zlib")[0] == "zlib"
+    assert maybe_compress(payload, compression=False) == (None, payload)
@@ -21,6 +21,7 @@ from distributed.protocol import (
     register_serialization_family,
     dask_serialize,
 )
+from distributed.protocol.utils import frame_split_size
 from distributed.utils import nbytes
 from distributed.utils_test import inc, gen_test
 from distributed.comm.utils import to_frames, from_frames
@@ -359,3 +360,42 @@ def test_serialize_raises():
         deserialize(*serialize(Foo()))
 
     assert "Hello-123" in str(info.value)
+
+
+class Holder:
+    def __init__(self, arrays):
+        self.arrays = arrays
+
+
+@pytest.mark.skipif(
+    pickle.HIGHEST_PROTOCOL < 5, reason="Out-of-band buffers need pickle protocol 5"
+)
+def test_pickle_out_of_band_frames():
+    x = Holder({"a": np.arange(100000), "b": {"c": np.ones(200000)}})
+    header, frames = serialize(x, serializers=["pickle"])
+    assert header["serializer"] == "pickle"
+    assert len(frames) == 3  # the pickle and two buffers, without copies
+    y = deserialize(header, frames)
+    assert (y.arrays["a"] == x.arrays["a"]).all()
+    assert np.shares_memory(y.arrays["b"]["c"], frames[2])
+
+    # With large frames split
+    header["lengths"] = [nbytes(f) for f in frames]
+    split = frames[:2] + frame_split_size(frames[2:], n=100000)
+    header["compression"] = [None] * len(split)
+    y = Serialized(header, split).deserialize()
+    assert (y.arrays["b"]["c"] == 1).all()
+
+
+@pytest.mark.skipif(
+    pickle.HIGHEST_PROTOCOL < 5, reason="Out-of-band buffers need pickle protocol 5"
+)
+def test_pickle_out_of_band_frames_writable():
+    x = Holder({"a": np.arange(100000), "b": {"c": np.ones(200000)}})
+    header, frames = serialize(x, serializers=["pickle"])
+    frames = [bytes(f) for f in frames]  # read-only, like decompressed frames
+    y = deserialize(header, frames)
+    y.arrays["a"][0] = -1
+    y.arrays["b"]["c"] += 1
+    assert y.arrays["a"][0] == -1
+    assert (y.arrays["b"]["c"] == 2).all()
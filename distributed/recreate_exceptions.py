@@ -46,7 +46,7 @@ class ReplayExceptionScheduler(object):
                 return {
                     "deps": [dts.key for dts in cause.dependencies],
                     "cause": cause.key,
-                    "task": cause.run_spec,
+                    "task": self.scheduler.resolve_payloads(cause.run_spec),
                 }
 
 
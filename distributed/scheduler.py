@@ -45,6 +45,7 @@ from .node import ServerNode
 from .preloading import preload_modules
 from .proctitle import setproctitle
 from .security import Security
+from .task_cache import ref_digest, task_payload_digests
 from .utils import (
     All,
     ignoring,
@@ -198,6 +199,12 @@ class WorkerState(object):
        The last time we received a heartbeat from this worker, in local
        scheduler time.
 
+    .. attribute:: memory_pressure: int
+
+       How short of memory the worker is, as reported in its heartbeats:
+       0 normally, 1 while it spills data to disk and 2 while it is paused.
+       We send fewer tasks to spilling workers and avoid paused ones.
+
     .. attribute:: actors: {TaskState}
 
        A set of all TaskStates on this worker that are actors.  This only
@@ -217,6 +224,7 @@ class WorkerState(object):
         "last_seen",
         "local_directory",
         "memory_limit",
+        "memory_pressure",
         "metrics",
         "name",
         "nanny",
@@ -257,6 +265,7 @@ class WorkerState(object):
         self.nbytes = 0
         self.occupancy = 0
         self.metrics = {}
+        self.memory_pressure = 0
         self.last_seen = 0
         self.time_delay = 0
         self.bandwidth = parse_bytes(dask.config.get("distributed.scheduler.bandwidth"))
@@ -967,6 +976,11 @@ class Scheduler(ServerNode):
 
         self.n_tasks = 0
         self.task_metadata = dict()
+
+        # Pickled functions and arguments that tasks refer to by digest
+        self.task_payloads = dict()
+        self.task_payload_refs = dict()
+        self.task_payload_holders = dict()  # digest: {worker addresses}
         self.datasets = dict()
 
         # Prefix-keyed containers
@@ -1091,6 +1105,7 @@ class Scheduler(ServerNode):
             "set_metadata": self.set_metadata,
             "heartbeat_worker": self.heartbeat_worker,
             "get_task_status": self.get_task_status,
+            "get_payloads": self.get_payloads,
             "get_task_stream": self.get_task_stream,
             "register_worker_plugin": self.register_worker_plugin,
             "adaptive_target": self.adaptive_target,
@@ -1384,6 +1399,10 @@ class Scheduler(ServerNode):
 
         if metrics:
             ws.metrics = metrics
+            pressure = metrics.get("memory_pressure", 0)
+            if pressure != ws.memory_pressure:
+                ws.memory_pressure = pressure
+                self.check_idle_saturated(ws)
 
         if host_info:
             self.host_info[host].update(host_info)
@@ -1542,11 +1561,14 @@ class Scheduler(ServerNode):
         user_priority=0,
         actors=None,
         fifo_timeout=0,
+        payloads=None,
     ):
         """
         Add new computations to the internal dask graph
 
         This happens whenever the Client calls submit, map, get, or compute.
+        Tasks may refer to large pickled functions and arguments in
+        ``payloads`` by their digests, see ``distributed.task_cache``.
         """
         start = time()
         fifo_timeout = parse_timedelta(fifo_timeout)
@@ -1561,6 +1583,10 @@ class Scheduler(ServerNode):
             if tasks[k] is k:
                 del tasks[k]
 
+        if payloads:
+            for digest, payload in payloads.items():
+                self.task_payloads.setdefault(digest, payload)
+
         dependencies = dependencies or {}
 
         n = 0
@@ -1629,13 +1655,20 @@ class Scheduler(ServerNode):
             if ts is None:
                 ts = self.tasks[k] = TaskState(k, tasks.get(k))
                 ts.state = "released"
+                self._acquire_payloads(ts.run_spec)
             elif not ts.run_spec:
                 ts.run_spec = tasks.get(k)
+                self._acquire_payloads(ts.run_spec)
 
             touched_keys.add(k)
             touched_tasks.append(ts)
             stack.extend(dependencies.get(k, ()))
 
+        if payloads:
+            for digest in payloads:
+                if digest not in self.task_payload_refs:  # no task kept it
+                    self._forget_payload(digest)
+
         self.client_desires_keys(keys=keys, client=client)
 
         # Add dependencies
@@ -1936,6 +1969,8 @@ class Scheduler(ServerNode):
             self.idle.discard(ws)
             self.saturated.discard(ws)
             del self.workers[address]
+            for holders in self.task_payload_holders.values():
+                holders.discard(address)
             ws.status = "closed"
             self.total_occupancy -= ws.occupancy
 
@@ -2325,6 +2360,12 @@ class Scheduler(ServerNode):
             task = ts.run_spec
             if type(task) is dict:
                 msg.update(task)
+                for digest in task_payload_digests(task):
+                    holders = self.task_payload_holders.setdefault(digest, set())
+                    if worker not in holders:
+                        holders.add(worker)
+                        payloads = msg.setdefault("payloads", {})
+                        payloads[digest] = self.task_payloads[digest]
             else:
                 msg["task"] = task
 
@@ -2382,7 +2423,7 @@ class Scheduler(ServerNode):
 
     def release_worker_data(self, stream=None, keys=None, worker=None):
         ws = self.workers[worker]
-        tasks = {self.tasks[k] for k in keys}
+        tasks = {self.tasks[k] for k in keys if k in self.tasks}
         removed_tasks = tasks & ws.has_what
         ws.has_what -= removed_tasks
 
@@ -3665,7 +3706,9 @@ class Scheduler(ServerNode):
             )
         elif self.idle:
             if len(self.idle) < 20:  # smart but linear in small case
-                worker = min(self.idle, key=operator.attrgetter("occupancy"))
+                worker = min(
+                    self.idle, key=operator.attrgetter("memory_pressure", "occupancy")
+                )
             else:  # dumb but fast in large case
                 worker = self.idle[self.n_tasks % len(self.idle)]
         else:
@@ -4173,6 +4216,7 @@ class Scheduler(ServerNode):
     def remove_key(self, key):
         ts = self.tasks.pop(key)
         assert ts.state == "forgotten"
+        self._release_payloads(ts.run_spec)
         self.unrunnable.discard(ts)
         for cs in ts.who_wants:
             cs.wants_what.remove(ts)
@@ -4183,6 +4227,36 @@ class Scheduler(ServerNode):
         if key in self.task_metadata:
             del self.task_metadata[key]
 
+    def _acquire_payloads(self, run_spec):
+        for digest in task_payload_digests(run_spec):
+            self.task_payload_refs[digest] = self.task_payload_refs.get(digest, 0) + 1
+
+    def _release_payloads(self, run_spec):
+        for digest in task_payload_digests(run_spec):
+            self.task_payload_refs[digest] -= 1
+            if not self.task_payload_refs[digest]:
+                del self.task_payload_refs[digest]
+                self._forget_payload(digest)
+
+    def _forget_payload(self, digest):
+        self.task_payloads.pop(digest, None)
+        self.task_payload_holders.pop(digest, None)
+
+    def get_payloads(self, comm=None, digests=None):
+        """ Pickled functions and arguments of tasks, by their digests """
+        return {d: self.task_payloads[d] for d in digests if d in self.task_payloads}
+
+    def resolve_payloads(self, run_spec):
+        """ A task specification with the payloads it refers to put back in """
+        if not task_payload_digests(run_spec):
+            return run_spec
+        resolved = dict(run_spec)
+        for field, part in run_spec.items():
+            digest = ref_digest(part)
+            if digest is not None:
+                resolved[field] = self.task_payloads.get(digest, part)
+        return resolved
+
     def _propagate_forgotten(self, ts, recommendations):
         ts.state = "forgotten"
         key = ts.key
@@ -4439,7 +4513,9 @@ class Scheduler(ServerNode):
 
         They are considered saturated if they both have enough tasks to occupy
         all of their threads, and if the expected runtime of those tasks is
-        large enough.
+        large enough.  Workers that are short of memory take on less work:
+        while spilling they are only idle with threads to spare, and while
+        paused only with nothing to do at all.
 
         This is useful for load balancing and adaptivity.
         """
@@ -4452,7 +4528,14 @@ class Scheduler(ServerNode):
 
         avg = self.total_occupancy / self.total_nthreads
 
-        if p < nc or occ / nc < avg / 2:
+        if ws.memory_pressure > 1:
+            idle = not p
+        elif ws.memory_pressure:
+            idle = p < nc
+        else:
+            idle = p < nc or occ / nc < avg / 2
+
+        if idle:
             self.idle.add(ws)
             self.saturated.discard(ws)
         else:
@@ -4609,17 +4692,22 @@ class Scheduler(ServerNode):
         Objective function to determine which worker should get the task
 
         Minimize expected start time.  If a tie then break with data storage.
+        Workers that are paused because they are short of memory come last,
+        and we expect workers that spill to disk to take twice as long.
         """
         comm_bytes = sum(
             [dts.get_nbytes() for dts in ts.dependencies if ws not in dts.who_has]
         )
         stack_time = ws.occupancy / ws.nthreads
         start_time = comm_bytes / self.bandwidth + stack_time
+        if ws.memory_pressure == 1:
+            start_time *= 2
+        paused = ws.memory_pressure > 1
 
         if ts.actor:
-            return (len(ws.actors), start_time, ws.nbytes)
+            return (paused, len(ws.actors), start_time, ws.nbytes)
         else:
-            return (start_time, ws.nbytes)
+            return (paused, start_time, ws.nbytes)
 
     async def get_profile(
         self,
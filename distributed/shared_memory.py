@@ -0,0 +1,148 @@
+""" Move values between processes on the same host through shared memory
+
+Values are pickled with protocol 5.  Their large buffers, like the memory of
+NumPy arrays, are copied into a ``multiprocessing.shared_memory`` segment.
+Only the small pickle header and the name of the segment go to the other
+process, which copies the buffers out of the segment and unlinks it right
+away.  Segments therefore only hold values in transit, and ``/dev/shm``, which
+is small in containers, doesn't fill up with values that processes keep.
+Values that don't fit into the free space of ``/dev/shm`` are pickled instead.
+
+Python versions before 3.8 have neither protocol 5 nor shared memory, and
+values are pickled whole with the highest protocol that they support.
+"""
+import os
+import pickle
+import socket
+
+import cloudpickle
+import dask
+import psutil
+
+try:
+    from multiprocessing import resource_tracker, shared_memory
+except ImportError:  # Python < 3.8
+    resource_tracker = shared_memory = None
+
+from .utils import ignoring, parse_bytes
+
+
+def enabled():
+    """ Whether to move values between processes through shared memory """
+    return shared_memory is not None and dask.config.get(
+        "distributed.comm.shared-memory.enabled"
+    )
+
+
+def min_shared_size():
+    """ Values with buffers at least this large move through shared memory """
+    return parse_bytes(dask.config.get("distributed.comm.shared-memory.min-size"))
+
+
+_namespace = None
+
+
+def namespace():
+    """ Identifies the processes that see the same shared memory segments
+
+    Processes with equal host names in their addresses may still not share
+    memory, for example if one of them connects through an SSH tunnel, or if
+    they run in separate containers.  We identify the boot of the host, and,
+    where there is one, the ``/dev/shm`` file system.
+    """
+    global _namespace
+    if _namespace is None:
+        parts = [socket.gethostname(), str(psutil.boot_time())]
+        try:
+            with open("/proc/sys/kernel/random/boot_id") as f:
+                parts.append(f.read().strip())
+            st = os.stat("/dev/shm")
+            parts.append("%d:%d" % (st.st_dev, st.st_ino))
+        except OSError:
+            pass
+        _namespace = "/".join(parts)
+    return _namespace
+
+
+def has_room(nbytes):
+    """ Whether ``/dev/shm`` has room for a segment of nbytes, if we can tell
+
+    Writing to a segment beyond the free space of the file system kills the
+    process with SIGBUS, rather than raising an error.
+    """
+    try:
+        st = os.statvfs("/dev/shm")
+    except (AttributeError, OSError):
+        return True
+    return st.f_bavail * st.f_frsize > nbytes
+
+
+def dumps_value(value, min_size=None):
+    """ Prepare a value to be sent to another process
+
+    Returns a small tuple to send to the other process.  The buffers of
+    large values are copied into a shared memory segment, which the receiving
+    ``loads_value`` copies them out of and unlinks.
+    """
+    if min_size is None:
+        min_size = min_shared_size()
+    if pickle.HIGHEST_PROTOCOL < 5:
+        header = cloudpickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        return ("pickle", header, [])
+    buffers = []
+    header = cloudpickle.dumps(value, protocol=5, buffer_callback=buffers.append)
+    buffers = [b.raw() for b in buffers]
+    lengths = [b.nbytes for b in buffers]
+    if shared_memory is None or sum(lengths) < min_size or not has_room(sum(lengths)):
+        return ("pickle", header, [b.tobytes() for b in buffers])
+
+    segment = shared_memory.SharedMemory(create=True, size=max(sum(lengths), 1))
+    offset = 0
+    for b, n in zip(buffers, lengths):
+        segment.buf[offset : offset + n] = b
+        offset += n
+    name = segment.name
+    segment.close()
+    # The receiving process unlinks the segment, don't let our resource tracker
+    # unlink it once more at exit
+    with ignoring(Exception):
+        resource_tracker.unregister(segment._name, "shared_memory")
+    return ("shared-memory", header, name, lengths)
+
+
+def loads_value(msg):
+    """ Reconstruct a value from the output of ``dumps_value`` """
+    if msg[0] == "pickle":
+        _, header, buffers = msg
+        if not buffers:  # protocol < 5 doesn't take buffers
+            return pickle.loads(header)
+        return pickle.loads(header, buffers=buffers)
+
+    _, header, name, lengths = msg
+    segment = shared_memory.SharedMemory(name=name)
+    try:
+        buffers = []
+        offset = 0
+        for n in lengths:
+            with segment.buf[offset : offset + n] as view:
+                buffers.append(bytearray(view))
+            offset += n
+    finally:
+        segment.close()
+        segment.unlink()
+    return pickle.loads(header, buffers=buffers)
+
+
+def unlink(name):
+    """ Remove a segment that no process will load """
+    with ignoring(FileNotFoundError):
+        segment = shared_memory.SharedMemory(name=name)
+        segment.unlink()
+        segment.close()
+
+
+def unlink_values(msgs):
+    """ Remove the segments of dumps_value outputs that no process will load """
+    for msg in msgs:
+        if msg[0] == "shared-memory":
+            unlink(msg[2])
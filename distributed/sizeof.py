@@ -1,17 +1,122 @@
+from collections import defaultdict
 import logging
+import sys
 
 from dask.sizeof import sizeof
 
 logger = logging.getLogger(__name__)
 
 
+# Builtin types for which ``sizeof`` is ``sys.getsizeof``.  Tasks often return
+# these, and skipping the dispatch saves time on every such task.
+_scalar_types = frozenset([int, float, bool, complex, str, bytes, type(None)])
+
+
 def safe_sizeof(obj, default_size=1e6):
     """ Safe variant of sizeof that captures and logs exceptions
 
     This returns a default size of 1e6 if the sizeof function fails
     """
+    typ = type(obj)
+    if typ in _scalar_types:
+        return sys.getsizeof(obj)
     try:
         return sizeof(obj)
     except Exception:
         logger.warning("Sizeof calculation failed.  Defaulting to 1MB", exc_info=True)
         return int(default_size)
+
+
+class SizeCorrector(object):
+    """ Learn corrections to sizeof estimates from process memory
+
+    ``sizeof`` is only an estimate, and for some types, like object-dtype
+    Pandas dataframes or nested Python structures, it can be far off.  We
+    compare estimates with the change in resident memory (RSS) of the process
+    while a task computes its result and keep a moving average of their ratio
+    for each task prefix.  After a few samples we scale estimates by it.
+
+    RSS deltas are noisy: the allocator may reuse freed memory or not touch
+    pages that it handed out, and other threads free memory concurrently.  We
+    therefore only learn from large deltas and bound the ratios.  A small or
+    negative delta doesn't tell us that an estimate is too large.
+
+    Parameters
+    ----------
+    min_bytes: int
+        Noise level of RSS deltas, we ignore samples with smaller deltas
+    nsamples: int
+        Number of samples needed before we correct estimates of a prefix
+    sample_every: int
+        After the first ``nsamples``, sample one out of this many tasks
+    alpha: float
+        Weight of a new sample in the moving average
+    bounds: tuple
+        Smallest and largest correction factor
+    tolerance: float
+        Don't correct estimates that are off by less than this factor
+
+    Examples
+    --------
+    >>> sc = SizeCorrector(min_bytes=0, nsamples=1)
+    >>> sc.observe('x', 100, 300)
+    >>> sc.correct('x', 1000)
+    3000
+    >>> sc.correct('y', 1000)
+    1000
+    """
+
+    def __init__(
+        self,
+        min_bytes=2 ** 20,
+        nsamples=3,
+        sample_every=10,
+        alpha=0.2,
+        bounds=(0.5, 16),
+        tolerance=1.25,
+    ):
+        self.min_bytes = min_bytes
+        self.nsamples = nsamples
+        self.sample_every = sample_every
+        self.alpha = alpha
+        self.bounds = bounds
+        self.tolerance = tolerance
+        self.ratios = dict()
+        self.samples = defaultdict(int)
+        self.counts = defaultdict(int)
+
+    def should_sample(self, prefix):
+        """ Whether to measure the memory used by the next task of a prefix """
+        self.counts[prefix] += 1
+        return (
+            self.samples[prefix] < self.nsamples
+            or self.counts[prefix] % self.sample_every == 0
+        )
+
+    def observe(self, prefix, estimate, rss_delta):
+        """ Record that computing a value of ``estimate`` bytes grew RSS """
+        if rss_delta <= self.min_bytes:
+            return
+        lower, upper = self.bounds
+        ratio = min(max(rss_delta / max(estimate, 1), lower), upper)
+        old = self.ratios.get(prefix)
+        if old is None:
+            self.ratios[prefix] = ratio
+        else:
+            self.ratios[prefix] = (1 - self.alpha) * old + self.alpha * ratio
+        self.samples[prefix] += 1
+
+    def factor(self, prefix):
+        if self.samples.get(prefix, 0) < self.nsamples:
+            return 1
+        ratio = self.ratios[prefix]
+        if 1 / self.tolerance < ratio < self.tolerance:
+            return 1  # most likely noise
+        return ratio
+
+    def correct(self, prefix, nbytes):
+        """ Corrected estimate of the size of a value of a prefix """
+        factor = self.factor(prefix)
+        if factor == 1:
+            return nbytes
+        return int(nbytes * factor)
@@ -0,0 +1,751 @@
+import asyncio
+from collections.abc import MutableMapping
+from concurrent.futures import wait
+from itertools import chain
+import logging
+import mmap
+import os
+import tempfile
+import threading
+
+try:
+    from cytoolz import partial
+except ImportError:
+    from toolz import partial
+from tornado.ioloop import IOLoop
+from zict import Buffer, File, Func, LRU
+
+from .metrics import time
+from .protocol import (
+    compressions,
+    deserialize_bytes,
+    frames_to_bytelist,
+    select_compression,
+    serialize,
+)
+from .sizeof import safe_sizeof as sizeof
+from .threadpoolexecutor import ThreadPoolExecutor
+from .utils import ignoring, nbytes
+
+logger = logging.getLogger(__name__)
+
+
+def weight(k, v):
+    return sizeof(v)
+
+
+class _Slab(object):
+    """A preallocated file holding many values back to back"""
+
+    def __init__(self, directory, size):
+        self.fd, self.path = tempfile.mkstemp(prefix="slab-", dir=directory)
+        try:
+            os.posix_fallocate(self.fd, 0, size)
+        except (AttributeError, OSError):
+            # Not available on this platform or file system
+            os.ftruncate(self.fd, size)
+        self.size = size
+        self.used = 0  # bytes allocated so far
+        self.live = 0  # bytes of values that have not been deleted
+        self.pending = 0  # writes that have been allocated but not completed
+        self.keys = set()
+
+    def close(self):
+        os.close(self.fd)
+        with ignoring(OSError):
+            os.remove(self.path)
+
+
+class SlabStore(MutableMapping):
+    """Store bytes in a few large preallocated files
+
+    Writing each spilled value to its own file costs an inode and an
+    open/close per access, which adds up with hundreds of thousands of small
+    keys.  Instead we append values to large preallocated slab files and keep
+    an in-memory index from key to slab, offset and length.
+
+    Slabs are append-only: deleting a value only marks its bytes as garbage.
+    Once most of a slab is garbage, ``compact`` copies its remaining values to
+    the current slab and removes the file.
+
+    Values larger than ``mmap_threshold`` are read back through a private
+    memory map of the slab, so that for example NumPy arrays are constructed
+    on top of the page cache without copying.  Because slab regions are never
+    reused, these arrays remain valid after their key has been deleted or
+    their slab has been compacted away.  Compressed values gain nothing from
+    this, as they are decompressed into new memory anyway.
+
+    This mapping is safe to use from several threads.  Reads and writes don't
+    hold the lock while they touch the disk.  Writes to the same key must not
+    run concurrently.
+
+    Parameters
+    ----------
+    directory: str
+        Location on disk for slab files
+    slab_size: int
+        Size in bytes of each slab file.  Larger values get a slab of their own.
+    compact_fraction: float
+        Compact slabs once this fraction of their bytes is garbage
+    mmap_threshold: int or None
+        Read values at least this large through memory maps, or never if None
+
+    Examples
+    --------
+    >>> s = SlabStore('/tmp/slabs')  # doctest: +SKIP
+    >>> s['x'] = b'123'  # doctest: +SKIP
+    >>> bytes(s['x'])  # doctest: +SKIP
+    b'123'
+    """
+
+    alignment = 64
+
+    def __init__(
+        self, directory, slab_size=2 ** 26, compact_fraction=0.5, mmap_threshold=2 ** 16
+    ):
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self.directory = directory
+        self.slab_size = int(slab_size)
+        self.compact_fraction = compact_fraction
+        self.mmap_threshold = mmap_threshold
+        self.index = dict()
+        self.slabs = set()
+        self.lock = threading.Lock()
+        self._active = None
+
+    def _allocate(self, length):
+        """Reserve room for ``length`` bytes, call while holding the lock"""
+        slab = self._active
+        if slab is None or slab.used + length > slab.size:
+            slab = _Slab(self.directory, max(self.slab_size, length))
+            self.slabs.add(slab)
+            self._active = slab
+        offset = slab.used
+        slab.used += -(-length // self.alignment) * self.alignment
+        slab.pending += 1
+        return slab, offset
+
+    def _release(self, key, entry):
+        """Mark a value as garbage, call while holding the lock"""
+        slab, offset, length = entry
+        slab.live -= length
+        slab.keys.discard(key)
+        self._maybe_remove(slab)
+
+    def _maybe_remove(self, slab):
+        if slab is not self._active and not slab.keys and not slab.pending:
+            self.slabs.discard(slab)
+            slab.close()
+
+    def _pin(self, key):
+        """Keep the slab of a key open while we read it, call holding the lock"""
+        entry = self.index[key]
+        entry[0].pending += 1
+        return entry
+
+    def _unpin(self, slab):
+        with self.lock:
+            slab.pending -= 1
+            self._maybe_remove(slab)
+
+    def _write(self, slab, offset, parts):
+        for part in parts:
+            view = memoryview(part).cast("B")
+            while view:
+                n = os.pwrite(slab.fd, view, offset)
+                view = view[n:]
+                offset += n
+
+    def _read(self, entry, copy=False):
+        slab, offset, length = entry
+        if copy or self.mmap_threshold is None or length < self.mmap_threshold:
+            parts = []
+            while length:
+                part = os.pread(slab.fd, length, offset)
+                if not part:
+                    raise EOFError("Unexpected end of slab file %s" % slab.path)
+                parts.append(part)
+                offset += len(part)
+                length -= len(part)
+            return b"".join(parts) if len(parts) != 1 else parts[0]
+        start = offset - offset % mmap.ALLOCATIONGRANULARITY
+        mm = mmap.mmap(
+            slab.fd, offset + length - start, access=mmap.ACCESS_COPY, offset=start
+        )
+        return memoryview(mm)[offset - start : offset - start + length]
+
+    def __setitem__(self, key, value):
+        if not isinstance(value, (tuple, list)):
+            value = [value]
+        length = sum(map(nbytes, value))
+        with self.lock:
+            slab, offset = self._allocate(length)
+        try:
+            self._write(slab, offset, value)
+        except BaseException:
+            with self.lock:
+                slab.pending -= 1
+                self._maybe_remove(slab)
+            raise
+        with self.lock:
+            slab.pending -= 1
+            if key in self.index:
+                self._release(key, self.index.pop(key))
+            self.index[key] = (slab, offset, length)
+            slab.live += length
+            slab.keys.add(key)
+
+    def __getitem__(self, key):
+        with self.lock:
+            entry = self._pin(key)
+        try:
+            return self._read(entry)
+        finally:
+            self._unpin(entry[0])
+
+    def __delitem__(self, key):
+        with self.lock:
+            self._release(key, self.index.pop(key))
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def __iter__(self):
+        with self.lock:
+            return iter(list(self.index))
+
+    def __len__(self):
+        return len(self.index)
+
+    def disk_usage(self):
+        """Bytes of slab files on disk, including garbage"""
+        with self.lock:
+            return sum(slab.size for slab in self.slabs)
+
+    def garbage(self):
+        """Bytes allocated to values that have been deleted"""
+        with self.lock:
+            return sum(slab.used - slab.live for slab in self.slabs)
+
+    def _sparse_slabs(self):
+        return [
+            slab
+            for slab in self.slabs
+            if slab is not self._active
+            and not slab.pending
+            and slab.used - slab.live > self.compact_fraction * slab.used
+        ]
+
+    def needs_compaction(self):
+        with self.lock:
+            return bool(self._sparse_slabs())
+
+    def compact(self):
+        """Move live values out of sparse slabs and remove those slabs
+
+        Returns the number of bytes of disk space reclaimed.
+        """
+        before = self.disk_usage()
+        with self.lock:
+            slabs = [(slab, list(slab.keys)) for slab in self._sparse_slabs()]
+        for slab, keys in slabs:
+            for key in keys:
+                with self.lock:
+                    entry = self.index.get(key)
+                    if entry is None or entry[0] is not slab:
+                        continue
+                    slab.pending += 1
+                try:
+                    data = self._read(entry, copy=True)
+                finally:
+                    self._unpin(slab)
+                with self.lock:
+                    new, offset = self._allocate(len(data))
+                try:
+                    self._write(new, offset, [data])
+                finally:
+                    with self.lock:
+                        new.pending -= 1
+                        if self.index.get(key) is entry:
+                            self.index[key] = (new, offset, len(data))
+                            new.live += len(data)
+                            new.keys.add(key)
+                            self._release(key, entry)
+                        else:
+                            # Deleted or overwritten while we were copying
+                            self._maybe_remove(new)
+        return before - self.disk_usage()
+
+    def close(self):
+        with self.lock:
+            for slab in self.slabs:
+                slab.close()
+            self.slabs.clear()
+            self.index.clear()
+            self._active = None
+
+
+class PriorityLRU(LRU):
+    """An LRU mapping that evicts keys of low priority first
+
+    Keys are evicted in order of ``(priority(key), last access)``, so among
+    keys of equal priority the least recently used goes first.  Priorities
+    are computed when a key is set or accessed, after its weight is known;
+    call ``reprioritize`` when the priority of a key changes in between.
+
+    See Also
+    --------
+    zict.LRU
+    """
+
+    def __init__(self, n, d, priority, on_evict=None, weight=lambda k, v: 1):
+        super(PriorityLRU, self).__init__(n, d, on_evict=on_evict, weight=weight)
+        self.priority = priority
+
+    def _touch(self, key):
+        self.i += 1
+        self.heap[key] = (self.priority(key), self.i)
+
+    def reprioritize(self, key):
+        if key in self.heap:
+            self.heap[key] = (self.priority(key), self.heap[key][1])
+
+    def __getitem__(self, key):
+        result = self.d[key]
+        self._touch(key)
+        return result
+
+    def __setitem__(self, key, value):
+        if key in self.d:
+            del self[key]
+        weight = self.weight(key, value)
+        if weight <= self.n:
+            self.d[key] = value
+            self.weights[key] = weight
+            self._touch(key)
+            self.total_weight += weight
+        else:
+            for cb in self.on_evict:
+                cb(key, value)
+        while self.total_weight > self.n:
+            self.evict()
+
+
+class SpillBuffer(Buffer):
+    """A zict.Buffer that writes evicted values to disk in background threads
+
+    Values evicted from the fast (in-memory) mapping are handed to a dedicated
+    thread pool that serializes them and writes them to disk.  Until a write
+    completes the value stays in the ``spilling`` dictionary, so it remains
+    readable (and is not read back from disk) while it is being written.
+
+    Evictions never write on the caller's thread, which is usually the event
+    loop.  Once ``max_spilling`` values are queued or in flight,
+    ``spill_queue_full`` is true, and callers that produce or evict data,
+    like ``Worker.memory_monitor`` and the worker's task execution, should
+    wait with ``wait_for_spill`` before adding more.
+
+    Spilled frames are compressed with ``maybe_compress``.  By default we
+    choose a compressor for each key separately, by compressing a sample of
+    its largest frame with each of lz4, blosc and zstd.  Counts of bytes
+    serialized and written and of the time spent compressing are available
+    from ``get_metrics``.
+
+    Rather than evicting purely in LRU order we first evict keys that no
+    local task is waiting for, then keys whose consumers are least urgent,
+    and the largest keys among those.  The owner reports the tasks that will
+    consume each key, and how urgently, with ``update_consumers``.
+
+    Parameters
+    ----------
+    spill_directory: str
+        Location on disk for spilled values
+    target: int
+        Number of bytes to hold in memory before evicting
+    spill_threads: int
+        Number of threads writing to disk concurrently
+    max_spilling: int
+        Number of values queued or in flight above which callers should wait
+    compression: str or None
+        Name of the compressor for spilled data, ``"auto"`` to choose one per
+        key, or ``None`` to write uncompressed data
+    backend: {"file", "slab"}
+        Write one file per key with ``zict.File`` or append values to large
+        slab files with ``SlabStore``
+    slab_size: int
+        Size of slab files for the ``"slab"`` backend
+    weight: callable
+        Function:: key, value -> size in bytes.  Defaults to ``sizeof(value)``
+    loop: tornado.ioloop.IOLoop, optional
+
+    See Also
+    --------
+    zict.Buffer
+    """
+
+    def __init__(
+        self,
+        spill_directory,
+        target,
+        spill_threads=2,
+        max_spilling=16,
+        compression="auto",
+        backend="file",
+        slab_size=2 ** 26,
+        weight=weight,
+        loop=None,
+    ):
+        if compression not in compressions and compression != "auto":
+            raise ValueError(
+                "Spill compression '%s' not found.\n"
+                "Choices include auto, %s"
+                % (compression, ", ".join(sorted(map(str, compressions))))
+            )
+        if backend == "file":
+            store = File(spill_directory)
+        elif backend == "slab":
+            # Compressed values are decompressed into new memory anyway
+            fixed = compression not in ("auto", None, False)
+            store = SlabStore(
+                spill_directory,
+                slab_size=slab_size,
+                mmap_threshold=None if fixed else 2 ** 16,
+            )
+        else:
+            raise ValueError(
+                "Spill backend '%s' not found.\n" "Choices include file, slab" % backend
+            )
+        storage = Func(self._dump, deserialize_bytes, store)
+        super(SpillBuffer, self).__init__({}, storage, target, weight)
+        self.fast = PriorityLRU(
+            target, {}, self.priority, on_evict=[self.fast_to_slow], weight=weight
+        )
+        self.memory = self.fast
+        self.consumers = dict()
+        self.disk = self.slow
+        self.spilling = dict()
+        self.max_spilling = max(1, max_spilling)
+        self.loop = loop or IOLoop.current()
+        self._spill_futures = dict()
+        self._discard = set()
+        self._loading = dict()
+        self._executor = ThreadPoolExecutor(
+            max(1, spill_threads), thread_name_prefix="Dask-Spill-Threads"
+        )
+        self.compression = compression
+        self._metrics_lock = threading.Lock()
+        self.spilled_count = 0
+        self.serialized_bytes = 0
+        self.disk_bytes = 0
+        self.compress_time = 0
+        self.compressor_counts = dict()
+        self.unspilled_count = 0
+        self.evicted_needed_count = 0
+        self._compacting = None
+
+    def _select_compression(self, frames):
+        if self.compression != "auto":
+            return self.compression or False
+        if not frames:
+            return False
+        return select_compression(max(frames, key=nbytes)) or False
+
+    def _dump(self, value):
+        """Serialize and compress a value on its way to disk
+
+        This runs in the spill threads, so metrics are updated under a lock.
+        """
+        header, frames = serialize(value, on_error="raise")
+        start = time()
+        compression = self._select_compression(frames)
+        out = frames_to_bytelist(header, frames, compression=compression)
+        stop = time()
+
+        with self._metrics_lock:
+            self.spilled_count += 1
+            self.serialized_bytes += sum(map(nbytes, frames))
+            self.disk_bytes += sum(map(nbytes, out))
+            self.compress_time += stop - start
+            name = compression or "none"
+            self.compressor_counts[name] = self.compressor_counts.get(name, 0) + 1
+        return out
+
+    def get_metrics(self):
+        """Counts of spilled values and bytes, and time spent compressing"""
+        with self._metrics_lock:
+            return {
+                "spilled": self.spilled_count,
+                "spilling": len(self.spilling),
+                "serialized-bytes": self.serialized_bytes,
+                "disk-bytes": self.disk_bytes,
+                "saved-bytes": self.serialized_bytes - self.disk_bytes,
+                "compress-time": self.compress_time,
+                "compressors": dict(self.compressor_counts),
+                "unspilled": self.unspilled_count,
+                "evicted-needed": self.evicted_needed_count,
+            }
+
+    def priority(self, key):
+        """How urgently local tasks need a key, lower values are evicted first
+
+        Keys without consumers go first, then keys by the urgency of their most
+        urgent consumer, and larger keys before smaller ones.
+        """
+        counts = self.consumers.get(key)
+        size = self.fast.weights.get(key, 0)
+        if counts:
+            return (True, max(counts), -size)
+        else:
+            return (False, (), -size)
+
+    def update_consumers(self, key, old, new):
+        """Record that a local consumer of ``key`` changed its urgency
+
+        Urgencies are comparable values such as tuples, where larger values are
+        more urgent, or ``None`` for tasks that no longer need the key (or did
+        not need it before).  A key is kept in memory as urgently as its most
+        urgent consumer.  Consumers are only tracked while we hold the key, see
+        ``put``.
+        """
+        if key not in self:
+            return
+        counts = self.consumers.get(key)
+        if counts is None:
+            counts = self.consumers[key] = dict()
+        if old and old in counts:
+            counts[old] -= 1
+            if not counts[old]:
+                del counts[old]
+        if new:
+            counts[new] = counts.get(new, 0) + 1
+        if not counts:
+            del self.consumers[key]
+        self.fast.reprioritize(key)
+
+    def put(self, key, value, consumers=()):
+        """Store a value along with the urgencies of its current consumers
+
+        Unlike setting the key and then calling ``update_consumers``, this
+        doesn't risk evicting a value that is needed right away.
+        """
+        counts = dict()
+        for urgency in consumers:
+            counts[urgency] = counts.get(urgency, 0) + 1
+        if counts:
+            self.consumers[key] = counts
+        else:
+            self.consumers.pop(key, None)
+        self[key] = value
+
+    def spill_queue_full(self):
+        """Whether callers should wait for writes before adding more"""
+        return len(self._spill_futures) >= self.max_spilling
+
+    def fast_to_slow(self, key, value):
+        if key in self.consumers:
+            self.evicted_needed_count += 1
+        previous = self._spill_futures.get(key)
+        self.spilling[key] = value
+        if previous is None:
+            future = self._executor.submit(self.slow.__setitem__, key, value)
+        else:
+            # An overwritten value of this key is still being written.  We
+            # replace it once that's done, so two writes never race.
+            self._discard.discard(key)
+            future = self._executor.submit(self._write_after, previous, key, value)
+        self._spill_futures[key] = future
+        self.loop.add_future(future, partial(self._finish_spill, key))
+
+        for cb in self.fast_to_slow_callbacks:
+            cb(key, value)
+
+    def _finish_spill(self, key, future):
+        """Account for a completed background write"""
+        if self._spill_futures.get(key) is not future:
+            return  # already handled
+        del self._spill_futures[key]
+        value = self.spilling.pop(key, None)
+
+        if key in self._discard:
+            # The key was deleted or overwritten while we were writing it
+            self._discard.remove(key)
+            with ignoring(KeyError, EnvironmentError):
+                del self.slow[key]
+            return
+
+        exc = future.exception()
+        if exc is not None:
+            logger.error("Failed to spill %s to disk: %s", key, exc)
+            with ignoring(KeyError, EnvironmentError):
+                del self.slow[key]
+            self._restore(key, value)
+
+    def _restore(self, key, value):
+        """Put a value that failed to spill back into memory
+
+        This bypasses ``LRU.__setitem__`` so that we don't immediately evict
+        (and try to write) other values in turn.  We retry at the next
+        eviction.
+        """
+        lru = self.fast
+        w = self.weight(key, value)
+        lru.d[key] = value
+        lru.weights[key] = w
+        lru._touch(key)
+        lru.total_weight += w
+
+    def _write_after(self, previous, key, value):
+        """Write a value once an earlier write of the same key has completed
+
+        This runs in the spill threads.
+        """
+        wait([previous])
+        self.slow[key] = value
+
+    async def wait_for_spill(self, wait_all=False):
+        """Wait until one (or all) of the in-flight writes have completed"""
+        futures = list(self._spill_futures.items())
+        if not futures:
+            return
+        await asyncio.wait(
+            [asyncio.wrap_future(future) for _, future in futures],
+            return_when=asyncio.ALL_COMPLETED if wait_all else asyncio.FIRST_COMPLETED,
+        )
+        for key, future in futures:
+            if future.done():
+                self._finish_spill(key, future)
+
+    def _maybe_compact(self):
+        """Compact slab storage in a spill thread if it has become sparse"""
+        store = self.slow.d
+        if (
+            self._compacting is None
+            and isinstance(store, SlabStore)
+            and store.needs_compaction()
+        ):
+            self._compacting = self._executor.submit(store.compact)
+            self.loop.add_future(self._compacting, self._finish_compact)
+
+    def _finish_compact(self, future):
+        self._compacting = None
+        exc = future.exception()
+        if exc is not None:
+            logger.error("Failed to compact spilled data: %s", exc)
+        else:
+            logger.debug(
+                "Compaction reclaimed %d bytes of spill storage", future.result()
+            )
+
+    def slow_to_fast(self, key):
+        value = super(SpillBuffer, self).slow_to_fast(key)
+        self.unspilled_count += 1
+        self._maybe_compact()
+        return value
+
+    def _in_slow(self, key):
+        return key in self.slow and key not in self._discard
+
+    def is_spilled(self, key):
+        """Whether reading a key would load it from disk"""
+        return key not in self.fast and key not in self.spilling and self._in_slow(key)
+
+    async def unspill(self, key):
+        """Load a spilled value back into memory in a spill thread
+
+        Reading the value afterwards doesn't touch the disk, unless it was
+        evicted again in the meantime.  Concurrent calls for the same key share
+        a single read.
+        """
+        future = self._loading.get(key)
+        if future is None:
+            if not self.is_spilled(key):
+                return
+            future = self._executor.submit(self.slow.__getitem__, key)
+            self._loading[key] = future
+        try:
+            value = await asyncio.wrap_future(future)
+        finally:
+            current = self._loading.get(key) is future
+            if current:
+                del self._loading[key]
+
+        # Unless the key was deleted or overwritten while we were reading it
+        if current and self.is_spilled(key):
+            del self.slow[key]
+            self.fast[key] = value
+            self.unspilled_count += 1
+            for cb in self.slow_to_fast_callbacks:
+                cb(key, value)
+            self._maybe_compact()
+
+    def __getitem__(self, key):
+        if key in self.spilling:
+            return self.spilling[key]
+        elif key in self.fast:
+            return self.fast[key]
+        elif self._in_slow(key):
+            return self.slow_to_fast(key)
+        else:
+            raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        self._loading.pop(key, None)
+        if key in self.spilling:
+            del self.spilling[key]
+            self._discard.add(key)
+        if key in self._spill_futures:
+            # Leave the entry in ``slow`` to the write in flight, which
+            # ``_finish_spill`` or the next eviction of the key cleans up
+            self.fast[key] = value
+        else:
+            super(SpillBuffer, self).__setitem__(key, value)
+
+    def __delitem__(self, key):
+        self._loading.pop(key, None)
+        self.consumers.pop(key, None)
+        if key in self.spilling:
+            del self.spilling[key]
+            self._discard.add(key)
+        elif key in self.fast:
+            del self.fast[key]
+        elif self._in_slow(key):
+            del self.slow[key]
+            self._maybe_compact()
+        else:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in self.spilling or key in self.fast or self._in_slow(key)
+
+    def __len__(self):
+        # ``spilling`` and ``_discard`` are disjoint, and their keys may or may
+        # not have reached ``slow`` yet
+        written = sum(
+            1 for key in chain(self.spilling, self._discard) if key in self.slow
+        )
+        return len(self.fast) + len(self.spilling) + len(self.slow) - written
+
+    def __iter__(self):
+        # Spill threads add keys to ``slow`` concurrently, so we iterate over
+        # snapshots rather than over the live mappings
+        spilling = list(self.spilling)
+        slow = [
+            key
+            for key in list(self.slow)
+            if key not in self.spilling and key not in self._discard
+        ]
+        return chain(list(self.fast), spilling, slow)
+
+    def keys(self):
+        return iter(self)
+
+    def values(self):
+        return (self[key] for key in self)
+
+    def items(self):
+        return ((key, self[key]) for key in self)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        super(SpillBuffer, self).close()
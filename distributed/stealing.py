@@ -296,6 +296,8 @@ class WorkStealing(SchedulerPlugin):
             return ws.occupancy + self.in_flight_occupancy[ws]
 
         def maybe_move_task(level, ts, sat, idl, duration, cost_multiplier):
+            if idl.memory_pressure > 1:  # paused, short of memory
+                return
             occ_idl = combined_occupancy(idl)
             occ_sat = combined_occupancy(sat)
 
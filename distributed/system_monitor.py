@@ -1,6 +1,7 @@
 from collections import deque
 import psutil
 
+from .comm.buffers import get_buffer_pool
 from .compatibility import WINDOWS
 from .metrics import time
 
@@ -8,6 +9,7 @@ from .metrics import time
 class SystemMonitor(object):
     def __init__(self, n=10000):
         self.proc = psutil.Process()
+        self.count_children = False
 
         self.time = deque(maxlen=n)
         self.cpu = deque(maxlen=n)
@@ -33,6 +35,14 @@ class SystemMonitor(object):
             self.num_fds = deque(maxlen=n)
             self.quantities["num_fds"] = self.num_fds
 
+        self.buffer_pool = get_buffer_pool()
+        if self.buffer_pool is not None:
+            # Rate of memory maps allocated to receive frames, see BufferPool
+            self.buffer_allocations = deque(maxlen=n)
+            self.quantities["buffer_allocations"] = self.buffer_allocations
+            self._last_buffer_allocations = self.buffer_pool.allocations
+            self._last_buffer_time = time()
+
         self.update()
 
     def recent(self):
@@ -41,10 +51,24 @@ class SystemMonitor(object):
         except IndexError:
             return {k: None for k, v in self.quantities.items()}
 
+    def process_memory(self):
+        """ Resident memory of the process in bytes
+
+        This includes the memory of its subprocesses if ``count_children``.
+        """
+        memory = self.proc.memory_info().rss
+        if self.count_children:
+            for child in self.proc.children(recursive=True):
+                try:
+                    memory += child.memory_info().rss
+                except psutil.Error:  # it exited in the meantime
+                    pass
+        return memory
+
     def update(self):
         with self.proc.oneshot():
             cpu = self.proc.cpu_percent()
-            memory = self.proc.memory_info().rss
+            memory = self.process_memory()
         now = time()
 
         self.cpu.append(cpu)
@@ -71,6 +95,15 @@ class SystemMonitor(object):
                 result["read_bytes"] = read_bytes
                 result["write_bytes"] = write_bytes
 
+        if self.buffer_pool is not None:
+            allocations = self.buffer_pool.allocations
+            duration = now - self._last_buffer_time
+            rate = (allocations - self._last_buffer_allocations) / (duration or 0.5)
+            self._last_buffer_allocations = allocations
+            self._last_buffer_time = now
+            self.buffer_allocations.append(rate)
+            result["buffer_allocations"] = rate
+
         if not WINDOWS:
             num_fds = self.proc.num_fds()
             self.num_fds.append(num_fds)
@@ -0,0 +1,167 @@
+""" Caches of pickled functions and arguments of tasks
+
+Many tasks of a graph often share a function, for example a partial or a
+closure that captures a large model in ``Client.map``.  Clients send each
+distinct large payload once per graph and refer to it by the hash of its
+contents (a *digest*), wrapped in a ``PayloadRef``, in the tasks themselves.
+The scheduler keeps payloads
+while tasks refer to them and sends a payload to a worker only if it hasn't
+sent it to that worker before.  Workers that evicted a payload from their cache
+fetch it from the scheduler again.
+"""
+from collections import OrderedDict
+import hashlib
+import threading
+
+import dask
+
+from .utils import parse_bytes
+
+
+def payload_digest(payload):
+    """ Hash of the contents of a payload, as a string of 32 hex digits """
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+
+class PayloadRef(dict):
+    """ Stands in for a payload in a serialized task, by its digest
+
+    Payloads are bytes, so unlike a bare digest this can't be mistaken for
+    one.  It is a dict so that it survives msgpack, which turns it into a plain
+    ``{"digest": digest}``, and ``ref_digest`` recognises both.
+    """
+
+    def __init__(self, digest):
+        super(PayloadRef, self).__init__(digest=digest)
+
+
+def ref_digest(part):
+    """ The digest of the payload that a part of a task refers to, or None """
+    if isinstance(part, dict):
+        return part.get("digest")
+    return None
+
+
+def min_payload_size():
+    """ Payloads at least this large are sent once and then referred to """
+    return parse_bytes(dask.config.get("distributed.comm.task-cache.min-payload"))
+
+
+def task_payload_digests(task):
+    """ Digests of the payloads that a serialized task refers to """
+    if type(task) is dict:
+        return [d for d in map(ref_digest, task.values()) if d is not None]
+    return []
+
+
+def extract_payloads(tasks, min_size=None):
+    """ Replace large payloads of serialized tasks by references to them
+
+    Parameters
+    ----------
+    tasks: dict
+        Mapping of keys to serialized tasks, as produced by ``dumps_task``.
+        Tasks are changed in place.
+    min_size: int, optional
+        Leave smaller payloads in place
+
+    Returns
+    -------
+    Dictionary mapping digests to payloads, holding each distinct payload once
+    """
+    if min_size is None:
+        min_size = min_payload_size()
+    payloads = dict()
+    digests = dict()  # id(payload): digest, for payloads shared by many tasks
+    for task in tasks.values():
+        if type(task) is not dict:
+            continue
+        for field, payload in task.items():
+            if isinstance(payload, bytes) and len(payload) >= min_size:
+                try:
+                    digest = digests[id(payload)]
+                except KeyError:
+                    digest = digests[id(payload)] = payload_digest(payload)
+                    payloads[digest] = payload
+                task[field] = PayloadRef(digest)
+    return payloads
+
+
+class PayloadCache(object):
+    """ A mapping that evicts its least recently used items beyond a size in bytes
+
+    This is safe to use from several threads at once.
+
+    Parameters
+    ----------
+    maxsize: int or str
+        Total size of the items in the cache, in bytes
+
+    Examples
+    --------
+    >>> cache = PayloadCache(maxsize=10)
+    >>> cache['x'] = b'12345'
+    >>> cache.put('y', 'any value', nbytes=8)  # evicts x
+    >>> 'x' in cache
+    False
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = parse_bytes(maxsize)
+        self.data = OrderedDict()
+        self.sizes = dict()
+        self.nbytes = 0
+        self.lock = threading.Lock()
+
+    def put(self, key, value, nbytes):
+        """ Store a value of ``nbytes`` bytes, unless it is larger than the cache """
+        if nbytes > self.maxsize:
+            return
+        with self.lock:
+            if key in self.data:
+                self.nbytes -= self.sizes[key]
+            self.data[key] = value
+            self.data.move_to_end(key)
+            self.sizes[key] = nbytes
+            self.nbytes += nbytes
+            while self.nbytes > self.maxsize:
+                old, _ = self.data.popitem(last=False)
+                self.nbytes -= self.sizes.pop(old)
+
+    def __setitem__(self, key, payload):
+        self.put(key, payload, len(payload))
+
+    def update(self, payloads):
+        for key, payload in payloads.items():
+            self[key] = payload
+
+    def __getitem__(self, key):
+        with self.lock:
+            value = self.data[key]
+            self.data.move_to_end(key)
+            return value
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def __len__(self):
+        return len(self.data)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+            self.sizes.clear()
+            self.nbytes = 0
+
+    def __repr__(self):
+        return "<PayloadCache: %d items, %d/%d bytes>" % (
+            len(self),
+            self.nbytes,
+            self.maxsize,
+        )
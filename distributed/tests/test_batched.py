@@ -1,5 +1,6 @@
 import asyncio
 from datetime import timedelta
+import os
 import random
 
 import pytest
@@ -10,7 +11,7 @@ from distributed.batched import BatchedSend
 from distributed.core import listen, connect, CommClosedError
 from distributed.metrics import time
 from distributed.utils import All
-from distributed.utils_test import captured_logger
+from distributed.utils_test import captured_logger, gen_cluster, inc
 from distributed.protocol import to_serialize
 
 
@@ -256,3 +257,171 @@ async def test_serializers():
 
         with pytest.raises(gen.TimeoutError):
             msg = await gen.with_timeout(timedelta(milliseconds=100), comm.read())
+
+
+@pytest.mark.asyncio
+async def test_send_when_idle():
+    async with EchoServer() as e:
+        comm = await connect(e.address)
+
+        b = BatchedSend(interval="1s", min_batch_size=1)
+        b.start(comm)
+        start = time()
+        for i in range(5):
+            b.send(i)
+            assert await comm.read() == (i,)
+        assert time() < start + 1
+        assert b.batch_count == 5
+
+        # Small batches wait for the interval
+        b.min_batch_size = 10
+        b.interval = 0.2
+        b.send("x")
+        assert await comm.read() == ("x",)
+        b.send("y")
+        b.send("z")
+        start = time()
+        assert await comm.read() == ("y", "z")
+        assert time() > start + 0.1
+
+        await comm.close()
+        await b.close()
+
+
+@pytest.mark.asyncio
+async def test_max_batch_bytes():
+    async with EchoServer() as e:
+        comm = await connect(e.address)
+
+        b = BatchedSend(interval="1ms", max_batch_bytes="1kB")
+        b.start(comm)
+        b.send("x" * 100)
+        assert await comm.read() == ("x" * 100,)
+
+        for i in range(50):
+            b.send("%100d" % i)
+        results = []
+        while len(results) < 50:
+            batch = await comm.read()
+            assert len(batch) <= 10
+            results.extend(batch)
+        assert results == ["%100d" % i for i in range(50)]
+
+        await comm.close()
+        await b.close()
+
+
+@pytest.mark.asyncio
+async def test_next_batch_restamps_oldest():
+    b = BatchedSend(interval="1ms", max_batch_bytes="1kB")
+    b.bytes_per_message = 100
+    for i in range(15):
+        b.send(i)
+    first = b.oldest
+    await asyncio.sleep(0.01)
+    payload, oldest = b._next_batch()
+    assert payload == list(range(10))
+    assert oldest == first
+    assert b.oldest > first  # the rest doesn't count the wait of this batch
+    payload, oldest = b._next_batch()
+    assert payload == list(range(10, 15))
+    assert b.oldest is None
+
+
+@pytest.mark.asyncio
+async def test_backpressure_before_first_batch():
+    comms = asyncio.Queue()
+    listener = listen("", comms.put)
+    await listener.start()
+    comm = await connect(listener.contact_address)
+    peer = await comms.get()
+
+    # A burst before any batch was measured
+    b = BatchedSend(interval="1ms", max_buffer_bytes="1MB")
+    b.start(comm)
+    data = to_serialize(b"x" * 100000)
+    for i in range(20):
+        b.send({"i": i, "data": data})
+    assert 1e6 < b.buffer_bytes < 3e6
+    assert not b.below_limit.is_set()
+    assert b.get_metrics()["backpressure"] == 1
+
+    await asyncio.wait_for(b.wait_for_buffer(), 5)
+    results = []
+    while len(results) < 20:
+        results.extend(msg["i"] for msg in await peer.read())
+    assert results == list(range(20))
+
+    await b.close()
+    await peer.close()
+    listener.stop()
+
+
+@pytest.mark.asyncio
+async def test_backpressure():
+    comms = asyncio.Queue()
+    listener = listen("", comms.put)
+    await listener.start()
+    comm = await connect(listener.contact_address)
+    peer = await comms.get()  # doesn't read until we ask it to
+
+    b = BatchedSend(interval="1ms", max_batch_bytes="2MB", max_buffer_bytes="10MB")
+    b.start(comm)
+    data = to_serialize(os.urandom(1000000))
+    i = 0
+    start = time()
+    while b.below_limit.is_set():
+        b.send({"i": i, "data": data})
+        i += 1
+        await asyncio.sleep(0.001)
+        assert time() < start + 10
+    assert b.get_metrics()["backpressure"] == 1
+    wait = asyncio.ensure_future(b.wait_for_buffer())
+    await asyncio.sleep(0.05)
+    assert not wait.done()
+
+    results = []
+    while len(results) < i:
+        batch = await peer.read()
+        assert len(batch) <= 2
+        results.extend(msg["i"] for msg in batch)
+    assert results == list(range(i))
+    await wait
+    assert b.get_metrics()["queue-depth"] == 0
+
+    await b.close()
+    await peer.close()
+    listener.stop()
+
+
+@pytest.mark.asyncio
+async def test_metrics():
+    async with EchoServer() as e:
+        comm = await connect(e.address)
+
+        b = BatchedSend(interval="10ms")
+        b.start(comm)
+        for i in range(3):
+            b.send(i)
+        await comm.read()
+        b.send("x")
+        await comm.read()
+
+        metrics = b.get_metrics()
+        assert metrics["messages"] == 4
+        assert metrics["batches"] == 2
+        assert metrics["batch-sizes"] == {2: 1, 1: 1}
+        assert sum(metrics["batch-bytes"].values()) == 2
+        assert metrics["max-queue-depth"] == 3
+        assert metrics["queue-depth"] == 0
+        assert 0 < metrics["latency-mean"] <= metrics["latency-max"] < 1
+
+        await comm.close()
+        await b.close()
+
+
+@gen_cluster(client=True)
+async def test_worker_metrics(c, s, a, b):
+    await c.submit(inc, 1, workers=[a.address])
+    metrics = await a.get_metrics()
+    assert metrics["batched-send"]["messages"] >= 1
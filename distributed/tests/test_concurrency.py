@@ -0,0 +1,59 @@
+import pytest
+
+from distributed import concurrency
+from distributed.concurrency import AdaptiveLimit
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(concurrency, "time", lambda: now[0])
+    return now
+
+
+def run_round(limit, clock, nbytes=1e6, duration=0.1, **kwargs):
+    for i in range(limit.limit):
+        clock[0] += duration / limit.limit
+        limit.observe(nbytes, duration, **kwargs)
+
+
+def test_additive_increase(clock):
+    limit = AdaptiveLimit(2, maximum=4)
+    run_round(limit, clock, in_use=2)
+    assert limit.limit == 3
+    run_round(limit, clock, in_use=3)
+    assert limit.limit == 4
+    run_round(limit, clock, in_use=4)
+    assert limit.limit == 4  # maximum
+    assert limit.increases == 2
+
+    # Don't grow a limit that isn't used
+    limit = AdaptiveLimit(2, maximum=4)
+    run_round(limit, clock, in_use=1)
+    assert limit.limit == 2
+
+
+def test_multiplicative_decrease(clock):
+    limit = AdaptiveLimit(8, maximum=16)
+    run_round(limit, clock, in_use=8)
+    assert limit.limit == 9
+
+    # Transfers became much slower
+    run_round(limit, clock, duration=1, in_use=9)
+    assert limit.limit == 4
+
+    run_round(limit, clock, in_use=4, pressure=True)
+    assert limit.limit == 2
+
+    limit.failure()
+    limit.failure()
+    assert limit.limit == 1  # minimum
+    assert limit.decreases == 3
+    assert limit.get_metrics()["limit"] == 1
+
+
+def test_fixed(clock):
+    limit = AdaptiveLimit(4, maximum=16, adaptive=False)
+    run_round(limit, clock, in_use=4)
+    limit.failure()
+    assert limit.limit == 4
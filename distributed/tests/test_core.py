@@ -17,6 +17,7 @@ from distributed.core import (
     coerce_to_address,
     ConnectionPool,
 )
+from distributed.comm.multiplex import Channel
 from distributed.protocol.compression import compressions
 
 from distributed.metrics import time
@@ -654,6 +655,59 @@ async def test_connection_pool_remove():
     rpc.close()
 
 
+@pytest.mark.asyncio
+async def test_connection_pool_multiplex():
+    async def ping(comm, delay=0.1):
+        await asyncio.sleep(delay)
+        return "pong"
+
+    server = Server({"ping": ping})
+    await server.listen(0)
+
+    rpc = ConnectionPool(limit=10, multiplex=True)
+    results = await asyncio.gather(*[rpc(server.address).ping() for i in range(20)])
+    assert results == ["pong"] * 20
+    assert rpc.open == 10
+    assert rpc.active == 0
+    assert list(rpc._multiplexers) == [server.address]
+    # One connection, with a logical comm for each comm of the pool
+    assert len(rpc._multiplexers[server.address].channels) == 10
+    assert len([c for c in server._comms if not isinstance(c, Channel)]) == 1
+
+    rpc.remove(server.address)
+    assert not rpc._multiplexers
+    assert await rpc(server.address).ping(delay=0) == "pong"
+    assert list(rpc._multiplexers) == [server.address]
+
+    rpc.close()
+    server.stop()
+
+
+@pytest.mark.asyncio
+async def test_connection_pool_multiplex_refused():
+    server = Server({"ping": pingpong}, blocked_handlers=["multiplex"])
+    await server.listen(0)
+
+    rpc = ConnectionPool(multiplex=True)
+    results = await asyncio.gather(*[rpc(server.address).ping() for i in range(3)])
+    assert results == [b"pong"] * 3
+    assert server.address in rpc._plain
+    assert not rpc._multiplexers
+    assert not any(isinstance(c, Channel) for c in server._comms)
+
+    rpc.close()
+    server.stop()
+
+
+@gen_cluster(client=True, config={"distributed.comm.multiplex.enabled": True})
+async def test_multiplex_cluster(c, s, a, b):
+    x = c.submit(inc, 1, workers=[a.address])
+    y = c.submit(inc, x, workers=[b.address])
+    assert await y == 3
+    assert a.address in b.rpc._multiplexers
+    assert s.address in c.rpc._multiplexers
+
+
 @pytest.mark.asyncio
 async def test_counters():
     server = Server({"div": stream_div})
@@ -0,0 +1,97 @@
+import pytest
+from tornado import gen
+
+from distributed.event_log import EventLog
+from distributed.utils_test import gen_cluster, inc
+
+
+def test_story():
+    log = EventLog(maxlen=100)
+    log.append(("x", "waiting", "ready"))
+    log.append(("gather-dependencies", "worker-1", ["x", "y"]), keys=["x", "y"])
+    log.append((("z", 0), "new"))
+    log.append(("y", "new"))
+
+    assert log.story("x") == [
+        ("x", "waiting", "ready"),
+        ("gather-dependencies", "worker-1", ["x", "y"]),
+    ]
+    assert log.story("y") == [
+        ("gather-dependencies", "worker-1", ["x", "y"]),
+        ("y", "new"),
+    ]
+    assert log.story(("z", 0)) == [(("z", 0), "new")]
+    assert log.story("x", "y") == [e for e in log if e[0] != ("z", 0)]
+    assert log.story("w") == []
+    assert len(log) == 4
+
+
+def test_ring_buffer():
+    log = EventLog(maxlen=10)
+    for i in range(25):
+        log.append(("x" if i % 2 else "y", i))
+    assert len(log) == 10
+    assert [e[1] for e in log] == list(range(15, 25))
+    assert [e[1] for e in log.story("x")] == [15, 17, 19, 21, 23]
+
+    # Events leave the index with the buffer
+    for i in range(10):
+        log.append(("z", i))
+    assert log.story("x") == log.story("y") == []
+    assert set(log._index) == {"z"}
+
+
+def test_levels():
+    log = EventLog(maxlen=10, level="info")
+    log.debug(("x", "communication pass"))
+    log.append(("x", "waiting", "ready"))
+    assert list(log) == [("x", "waiting", "ready")]
+
+    log = EventLog(maxlen=10)
+    log.debug(("x", "communication pass"))
+    assert log.story("x") == [("x", "communication pass")]
+
+    with pytest.raises(ValueError, match="level"):
+        EventLog(level="everything")
+
+
+def test_maxlen():
+    log = EventLog(maxlen=1)
+    log.append(("x", 1))
+    log.append(("x", 2))
+    assert log.story("x") == [("x", 2)]
+
+    with pytest.raises(ValueError, match="positive"):
+        EventLog(maxlen=0)
+
+
+@gen_cluster(client=True, config={"distributed.worker.event-log.level": "info"})
+async def test_worker_info_level(c, s, a, b):
+    x = c.submit(inc, 1, workers=[a.address])
+    y = c.submit(inc, x, workers=[b.address])
+    await y
+
+    story = b.story(x.key)
+    assert ("dep", x.key, "flight", "memory") in story
+    assert not any(e[0] in ("request-dep", "receive-dep") for e in b.log)
+    assert (y.key, "executing", "memory") in b.story(y.key)
+
+
+@gen_cluster(client=True)
+async def test_worker_multi_key_events(c, s, a, b):
+    x = c.submit(inc, 1, workers=[a.address])
+    await x
+    b.total_out_connections = 0  # hold fetches back
+    y = c.submit(inc, x, workers=[b.address])
+    while y.key not in b.waiting_for_data:
+        await gen.sleep(0.01)
+
+    async def who_has(keys):
+        return {key: [] for key in keys}  # as if all holders were lost
+
+    b.scheduler.who_has = who_has
+    await b.handle_missing_dep(x.key)
+    assert (x.key, "no workers found", {y.key}) in b.story(y.key)
+
+    b.release_key(y.key, cause=x.key)
+    assert (y.key, "release-key", {"cause": x.key}) in b.story(y.key)
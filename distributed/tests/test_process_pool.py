@@ -0,0 +1,100 @@
+import asyncio
+import os
+import signal
+
+import pytest
+
+from dask.sizeof import sizeof
+
+from distributed import wait
+from distributed.metrics import time
+from distributed.process_pool import ChildValue
+from distributed.utils_test import gen_cluster, inc, div
+
+pytest.importorskip("multiprocessing.shared_memory")
+
+
+def arange_sum(n):
+    import numpy as np
+
+    return np.arange(n).sum()
+
+
+@gen_cluster(
+    client=True,
+    nthreads=[("127.0.0.1", 2)],
+    worker_kwargs={"executor": "processes"},
+    timeout=60,
+)
+async def test_process_pool_executor(c, s, a):
+    np = pytest.importorskip("numpy")
+    assert len(a.process_pool.children) == 2
+    assert s.workers[a.address].nthreads == 2
+
+    pid = await c.submit(os.getpid)
+    assert pid != os.getpid()
+
+    x = c.submit(np.arange, 100000)
+    y = c.submit(np.sum, x)
+    z = c.submit(arange_sum, 10, pure=False)
+    assert await y == np.arange(100000).sum()
+    assert await z == 45
+
+    # Results stay in the subprocesses until asked for
+    assert isinstance(a.data[x.key], ChildValue)
+    assert a.types[x.key] is np.ndarray
+    assert a.nbytes[x.key] >= 800000
+    assert sizeof(a.data[x.key]) >= a.nbytes[x.key]
+    assert (await x == np.arange(100000)).all()
+
+    # The memory of the subprocesses counts
+    assert a.monitor.process_memory() > a.monitor.proc.memory_info().rss
+
+    with pytest.raises(ZeroDivisionError):
+        await c.submit(div, 1, 0)
+
+    del x, y, z
+    start = time()
+    while a.process_pool.holders or a.data:
+        await asyncio.sleep(0.01)
+        assert time() < start + 5
+
+
+@gen_cluster(client=True, worker_kwargs={"executor": "processes"}, timeout=60)
+async def test_process_pool_transfers(c, s, a, b):
+    futures = c.map(inc, range(20), workers=[a.address])
+    total = c.submit(sum, futures, workers=[b.address])
+    assert await total == sum(range(1, 21))
+    await wait(futures)
+    assert all(isinstance(a.data[f.key], ChildValue) for f in futures)
+
+
+@gen_cluster(
+    client=True,
+    nthreads=[("127.0.0.1", 1)],
+    worker_kwargs={"executor": "processes"},
+    timeout=60,
+)
+async def test_process_pool_child_dies(c, s, a):
+    x = c.submit(inc, 1)
+    await wait(x)
+    assert isinstance(a.data[x.key], ChildValue)
+
+    child = a.process_pool.children[0]
+    os.kill(child.process.pid, signal.SIGKILL)
+
+    # The child is restarted, and the value that it held is computed again
+    start = time()
+    while a.process_pool.children[0] is child:
+        await asyncio.sleep(0.01)
+        assert time() < start + 10
+    while not isinstance(a.data.get(x.key), ChildValue):
+        await asyncio.sleep(0.01)
+        assert time() < start + 10
+    assert a.process_pool.children[0].process.is_alive()
+    assert await x == 2
+
+    # A task that kills its child fails, and the pool carries on
+    with pytest.raises(RuntimeError, match="died"):
+        await c.submit(os._exit, 1)
+    assert await c.submit(inc, x) == 3
@@ -1847,3 +1847,46 @@ async def test_gather_allow_worker_reconnect(c, s, a, b):
         if "reducer" in key and finish == "processing":
             finish_processing_transitions += 1
     assert finish_processing_transitions == 1
+
+
+@gen_cluster(client=True, worker_kwargs={"memory_limit": 0})
+async def test_avoid_paused_workers(c, s, a, b):
+    x = c.submit(lambda: b"0" * 1000000, workers=[a.address])
+    y = c.submit(lambda: b"0", workers=[b.address])
+    await wait([x, y])
+
+    z = c.submit(lambda x, y: None, x, y)
+    await z
+    assert z.key in a.data  # close to the larger input
+
+    a.memory_pressure = 2
+    await a.heartbeat()
+    assert s.workers[a.address].memory_pressure == 2
+
+    z = c.submit(lambda x, y: None, x, y, pure=False)
+    await z
+    assert z.key in b.data
+
+    w = c.submit(inc, 1)
+    await w
+    assert w.key in b.data
+
+
+@gen_cluster(
+    client=True, nthreads=[("127.0.0.1", 1)], worker_kwargs={"memory_limit": 0}
+)
+async def test_spilling_workers_take_less_work(c, s, a):
+    ws = s.workers[a.address]
+    x = c.submit(slowinc, 1, delay=0.5)
+    while not ws.processing:
+        await gen.sleep(0.01)
+    s.check_idle_saturated(ws, occ=0)  # far less occupied than the average
+    assert ws in s.idle
+
+    a.memory_pressure = 1
+    await a.heartbeat()
+    s.check_idle_saturated(ws, occ=0)
+    assert ws not in s.idle  # no threads to spare
+
+    await x
+    assert ws in s.idle
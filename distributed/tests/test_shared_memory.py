@@ -0,0 +1,178 @@
+import asyncio
+import os
+import pickle
+
+import dask
+import pytest
+
+from distributed import wait
+from distributed.shared_memory import (
+    dumps_value,
+    loads_value,
+    namespace,
+    unlink,
+)
+from distributed.utils_test import gen_cluster
+
+shared_memory = pytest.importorskip("multiprocessing.shared_memory")
+np = pytest.importorskip("numpy")
+
+
+def shared_segments():
+    if not os.path.isdir("/dev/shm"):
+        return set()
+    return set(os.listdir("/dev/shm"))
+
+
+def test_dumps_loads_value():
+    before = shared_segments()
+    x = np.arange(100000)
+
+    msg = dumps_value(x, min_size=1000)
+    assert msg[0] == "shared-memory"
+    y = loads_value(msg)
+    assert (x == y).all()
+    assert shared_segments() == before
+    y[0] = 1
+
+    msg = dumps_value(x[:10], min_size=1000)
+    assert msg[0] == "pickle"
+    assert (loads_value(msg) == x[:10]).all()
+
+    assert loads_value(dumps_value({"a": 1}, min_size=1000)) == {"a": 1}
+
+
+def test_dumps_value_without_room(monkeypatch):
+    monkeypatch.setattr("distributed.shared_memory.has_room", lambda nbytes: False)
+    x = np.arange(100000)
+    msg = dumps_value(x, min_size=1000)
+    assert msg[0] == "pickle"
+    assert (loads_value(msg) == x).all()
+
+
+def test_dumps_loads_value_before_protocol_5(monkeypatch):
+    monkeypatch.setattr(pickle, "HIGHEST_PROTOCOL", 4)
+    x = np.arange(100000)
+    msg = dumps_value(x, min_size=1000)
+    assert msg[0] == "pickle"
+    assert msg[2] == []
+    assert (loads_value(msg) == x).all()
+
+
+def test_unlink():
+    before = shared_segments()
+    msg = dumps_value(np.ones(100000), min_size=1000)
+    unlink(msg[2])
+    unlink(msg[2])  # already gone
+    with pytest.raises(FileNotFoundError):
+        loads_value(msg)
+    assert shared_segments() == before
+
+
+enabled = {"distributed.comm.shared-memory.enabled": True}
+
+
+@gen_cluster(client=True, config=enabled)
+async def test_same_host_transfer(c, s, a, b):
+    before = shared_segments()
+    x = c.submit(np.arange, 1000000, workers=[a.address])
+    y = c.submit(np.sum, x, workers=[b.address])
+    assert await y == np.arange(1000000).sum()
+
+    # b and the client load what a put into shared memory
+    assert a.outgoing_transfer_log[-1]["shared-memory"] == 1
+    result = await x
+    assert (result == np.arange(1000000)).all()
+    assert a.outgoing_transfer_log[-1]["shared-memory"] == 1
+
+    # Small values take the usual path
+    z = c.submit(np.arange, 10, workers=[a.address])
+    assert (await c.submit(np.add, z, 1, workers=[b.address])).sum() == 55
+    assert a.outgoing_transfer_log[-1]["shared-memory"] == 0
+
+    assert shared_segments() == before
+
+
+class Unpicklable(object):
+    def __reduce__(self):
+        raise TypeError("Can't pickle me")
+
+
+class FakeComm(object):
+    """ A requester that records what we send, and may fail or hang """
+
+    def __init__(self, peer_address, fail=False, hang=False):
+        self.peer_address = peer_address
+        self.fail = fail
+        self.hang = hang
+        self.msgs = []
+
+    async def write(self, msg, serializers=None):
+        if self.fail:
+            raise ValueError("Can't send")
+        self.msgs.append(msg)
+        return 0
+
+    async def read(self, deserializers=None):
+        if self.hang:
+            await asyncio.sleep(10)
+        return "OK"
+
+    def abort(self):
+        pass
+
+
+@gen_cluster(client=True, config=enabled)
+async def test_same_host_transfer_failure(c, s, a, b):
+    before = shared_segments()
+    x = c.submit(np.arange, 1000000, workers=[a.address])
+    y = c.submit(Unpicklable, workers=[a.address])
+    await wait([x, y])
+    a.nbytes[y.key] = 10 ** 7
+
+    # x went to shared memory before y failed to
+    with pytest.raises(TypeError):
+        await a.get_data(
+            None, keys=[x.key, y.key], who=b.address, shared_memory=namespace()
+        )
+    assert a.outgoing_current_count == 0
+    assert shared_segments() == before
+
+    comm = FakeComm(b.address, fail=True)
+    with pytest.raises(ValueError):
+        await a.get_data(comm, keys=[x.key], who=b.address, shared_memory=namespace())
+    assert a.outgoing_current_count == 0
+    assert shared_segments() == before
+
+    # A requester that never loads the segments doesn't leak them
+    comm = FakeComm(b.address)
+    await a.get_data(comm, keys=[x.key], who=b.address, shared_memory=namespace())
+    assert comm.msgs[0]["shared"]
+    assert shared_segments() == before
+
+    comm = FakeComm(b.address, hang=True)
+    with dask.config.set({"distributed.comm.timeouts.tcp": "100ms"}):
+        with pytest.raises(asyncio.TimeoutError):
+            await a.get_data(
+                comm, keys=[x.key], who=b.address, shared_memory=namespace()
+            )
+    assert a.outgoing_current_count == 0
+    assert shared_segments() == before
+
+
+@gen_cluster(client=True, config=enabled)
+async def test_same_host_transfer_other_namespace(c, s, a, b):
+    x = c.submit(np.arange, 1000000, workers=[a.address])
+    await wait(x)
+    comm = FakeComm(b.address)
+    await a.get_data(comm, keys=[x.key], who=b.address, shared_memory="elsewhere")
+    assert "shared" not in comm.msgs[0]
+    assert (comm.msgs[0]["data"][x.key].data == np.arange(1000000)).all()
+
+
+@gen_cluster(client=True)
+async def test_same_host_transfer_disabled(c, s, a, b):
+    x = c.submit(np.arange, 1000000, workers=[a.address])
+    y = c.submit(lambda x: x, x, workers=[b.address])
+    await y
+    assert a.outgoing_transfer_log[-1]["shared-memory"] == 0
@@ -2,7 +2,7 @@ import pytest
 import logging
 from dask.sizeof import sizeof
 
-from distributed.sizeof import safe_sizeof
+from distributed.sizeof import safe_sizeof, SizeCorrector
 from distributed.utils_test import captured_logger
 
 
@@ -11,6 +11,20 @@ def test_safe_sizeof(obj):
     assert safe_sizeof(obj) == sizeof(obj)
 
 
+@pytest.mark.parametrize("obj", [1, 1.5, True, 1j, "abc", b"abc", None])
+def test_safe_sizeof_scalars(obj):
+    assert safe_sizeof(obj) == sizeof(obj)
+
+
+def test_safe_sizeof_later_registration():
+    class Sized:
+        pass
+
+    safe_sizeof(Sized())
+    sizeof.register(Sized, lambda obj: 123)
+    assert safe_sizeof(Sized()) == 123
+
+
 def test_safe_sizeof_raises():
     class BadlySized:
         def __sizeof__(self):
@@ -21,3 +35,44 @@ def test_safe_sizeof_raises():
         assert safe_sizeof(foo) == 1e6
 
     assert "Sizeof calculation failed.  Defaulting to 1MB" in logs.getvalue()
+
+
+def test_size_corrector():
+    sc = SizeCorrector(min_bytes=1000, nsamples=2, sample_every=5)
+    assert sc.should_sample("x")
+    sc.observe("x", 100, 200)  # too small to learn from
+    assert sc.factor("x") == 1
+
+    sc.observe("x", 10000, 40000)
+    assert sc.correct("x", 10000) == 10000  # not enough samples yet
+    assert sc.should_sample("x")
+    sc.observe("x", 10000, 40000)
+    assert sc.factor("x") == 4
+    assert sc.correct("x", 10000) == 40000
+    assert sc.correct("y", 10000) == 10000
+
+    assert sum(sc.should_sample("x") for i in range(100)) == 20
+
+
+def test_size_corrector_bounds_and_noise():
+    sc = SizeCorrector(min_bytes=0, nsamples=1)
+    sc.observe("x", 1000, 100)
+    assert sc.factor("x") == 0.5
+
+    sc.observe("y", 1000, 1e9)
+    assert sc.factor("y") == 16
+
+    sc.observe("z", 1000, 1100)
+    assert sc.factor("z") == 1
+
+
+def test_size_corrector_ignores_small_deltas():
+    sc = SizeCorrector(min_bytes=1000, nsamples=1)
+    # The allocator reused memory, or other threads freed some meanwhile
+    for delta in [-5000, 0, 1000]:
+        sc.observe("x", 10 ** 6, delta)
+    assert sc.factor("x") == 1
+    assert not sc.samples["x"]
+
+    sc.observe("x", 10 ** 6, 2 * 10 ** 5)
+    assert sc.factor("x") == 0.5
@@ -0,0 +1,365 @@
+import asyncio
+import os
+import threading
+
+import pytest
+
+from distributed.spill import SlabStore, SpillBuffer
+from distributed.utils_test import cleanup  # noqa: F401
+
+
+@pytest.mark.asyncio
+async def test_spill_buffer_background_write(cleanup, tmpdir):
+    buf = SpillBuffer(str(tmpdir), target=300)
+    buf["x"] = b"x" * 200
+    buf["y"] = b"y" * 200  # evicts x
+
+    assert set(buf) == {"x", "y"}
+    assert len(buf) == 2
+    assert "x" in buf
+    assert buf["x"] == b"x" * 200  # readable while (or after) being written
+
+    await buf.wait_for_spill(wait_all=True)
+    assert not buf.spilling
+    assert set(buf.fast) | set(buf.slow) == {"x", "y"}
+    assert len(buf) == 2
+    buf.close()
+
+
+@pytest.mark.asyncio
+async def test_spill_buffer_delete_while_spilling(cleanup, tmpdir):
+    buf = SpillBuffer(str(tmpdir), target=300)
+    buf["x"] = b"x" * 200
+    buf["y"] = b"y" * 200
+    if "x" in buf.spilling:
+        del buf["x"]
+        assert "x" not in buf
+    else:
+        del buf["x"]
+
+    await buf.wait_for_spill(wait_all=True)
+    assert "x" not in buf
+    assert "x" not in buf.slow
+    assert set(buf) == {"y"}
+    assert len(buf) == 1
+    buf.close()
+
+
+@pytest.mark.asyncio
+async def test_spill_buffer_overwrite_while_spilling(cleanup, tmpdir):
+    buf = SpillBuffer(str(tmpdir), target=300)
+    buf["x"] = b"x" * 200
+    buf["y"] = b"y" * 200
+    buf["x"] = b"z" * 100
+
+    await buf.wait_for_spill(wait_all=True)
+    assert buf["x"] == b"z" * 100
+    assert len(buf) == 2
+    buf.close()
+
+
+@pytest.mark.asyncio
+async def test_spill_buffer_overwrite_does_not_wait(cleanup, tmpdir):
+    buf = SpillBuffer(str(tmpdir), target=300)
+    dump = buf.slow.dump
+    written = threading.Event()
+
+    def slow_dump(x):
+        assert written.wait(5)
+        return dump(x)
+
+    buf.slow.dump = slow_dump
+    buf["x"] = b"x" * 200
+    buf["y"] = b"y" * 200  # evicts x
+    assert "x" in buf.spilling
+
+    # Neither overwriting x nor evicting its new value waits for the write
+    buf["x"] = b"z" * 200
+    assert buf["x"] == b"z" * 200
+    buf["y"] = b"w" * 200  # evicts x again
+    assert buf.spilling["x"] == b"z" * 200
+    assert not written.is_set()
+
+    written.set()
+    await buf.wait_for_spill(wait_all=True)
+    await buf.wait_for_spill(wait_all=True)
+    assert not buf.spilling and not buf._discard
+    assert buf["x"] == b"z" * 200
+    assert buf["y"] == b"w" * 200
+    assert len(buf) == 2
+    buf.close()
+
+
+@pytest.mark.asyncio
+async def test_spill_buffer_queue_limit(cleanup, tmpdir):
+    buf = SpillBuffer(str(tmpdir), target=100, max_spilling=1)
+    release = threading.Event()
+    dump = buf.slow.dump
+
+    def slow_dump(x):
+        release.wait(5)
+        return dump(x)
+
+    buf.slow.dump = slow_dump
+    for i in range(10):
+        buf["x%d" % i] = b"x" * 50
+
+    # Evictions never block the caller, who should wait once the queue is full
+    assert len(buf.spilling) == 9
+    assert buf.spill_queue_full()
+    release.set()
+    await buf.wait_for_spill(wait_all=True)
+    assert not buf.spill_queue_full()
+    assert len(buf) == 10
+    assert all(buf["x%d" % i] == b"x" * 50 for i in range(10))
+    buf.close()
+
+
+@pytest.mark.asyncio
+async def test_spill_buffer_failed_write_keeps_value(cleanup, tmpdir):
+    buf = SpillBuffer(str(tmpdir), target=300)
+
+    def bad_dump(x):
+        raise OSError("disk full")
+
+    buf.slow.dump = bad_dump
+    buf["x"] = b"x" * 200
+    buf["y"] = b"y" * 200
+
+    await buf.wait_for_spill(wait_all=True)
+    assert buf["x"] == b"x" * 200
+    assert "x" in buf.fast
+    assert not os.listdir(str(tmpdir))
+    buf.close()
+
+
+@pytest.mark.asyncio
+async def test_spill_buffer_compression(cleanup, tmpdir):
+    np = pytest.importorskip("numpy")
+    buf = SpillBuffer(str(tmpdir), target=100)
+    x = np.zeros(100000)
+    buf["x"] = x
+    buf["y"] = os.urandom(800000)  # incompressible
+
+    await buf.wait_for_spill(wait_all=True)
+    assert "x" in buf.slow and "y" in buf.slow
+    assert (buf["x"] == x).all()
+
+    metrics = buf.get_metrics()
+    assert metrics["spilled"] == 2
+    assert metrics["saved-bytes"] > x.nbytes / 2
+    assert metrics["disk-bytes"] < metrics["serialized-bytes"]
+    assert metrics["compress-time"] > 0
+    assert metrics["compressors"]["none"] == 1
+    assert sum(metrics["compressors"].values()) == 2
+    buf.close()
+
+
+@pytest.mark.asyncio
+async def test_spill_buffer_no_compression(cleanup, tmpdir):
+    buf = SpillBuffer(str(tmpdir), target=100, compression=False)
+    buf["x"] = b"0" * 100000
+    buf["y"] = b"0" * 100000
+
+    await buf.wait_for_spill(wait_all=True)
+    assert buf["x"] == b"0" * 100000
+    assert buf.get_metrics()["saved-bytes"] <= 0
+    buf.close()
+
+    with pytest.raises(ValueError, match="not found"):
+        SpillBuffer(str(tmpdir), target=100, compression="foo")
+
+
+def test_slab_store(tmpdir):
+    s = SlabStore(str(tmpdir), slab_size=1000)
+    s["x"] = b"123"
+    s["y"] = [b"abc", b"def"]
+    assert bytes(s["x"]) == b"123"
+    assert bytes(s["y"]) == b"abcdef"
+    assert set(s) == {"x", "y"}
+    assert len(s) == 2
+    assert len(os.listdir(str(tmpdir))) == 1
+
+    s["x"] = b"456"
+    assert bytes(s["x"]) == b"456"
+    del s["y"]
+    assert "y" not in s
+    with pytest.raises(KeyError):
+        s["y"]
+
+    s["z"] = b"0" * 5000  # larger than a slab
+    assert len(s.slabs) == 2
+    assert bytes(s["z"]) == b"0" * 5000
+
+    s.close()
+    assert not os.listdir(str(tmpdir))
+
+
+def test_slab_store_mmap(tmpdir):
+    np = pytest.importorskip("numpy")
+    s = SlabStore(str(tmpdir), slab_size=2 ** 20)
+    x = np.arange(100000)
+    s["x"] = x.data
+    view = s["x"]
+    assert isinstance(view, memoryview)
+    y = np.frombuffer(view, dtype=x.dtype)
+    assert (x == y).all()
+
+    # Private mapping: writable, without changing the stored data
+    y = np.ndarray(x.shape, dtype=x.dtype, buffer=view)
+    y[0] = 123
+    assert np.frombuffer(s["x"], dtype=x.dtype)[0] == 0
+
+    del s["x"]
+    assert y[1] == 1  # still valid
+    s.close()
+
+    s = SlabStore(str(tmpdir), slab_size=2 ** 20, mmap_threshold=None)
+    s["x"] = x.data
+    assert isinstance(s["x"], bytes)
+    s.close()
+
+
+def test_slab_store_compact(tmpdir):
+    s = SlabStore(str(tmpdir), slab_size=1000)
+    read = s._read
+
+    def _read(*args, **kwargs):
+        assert not s.lock.locked()  # other threads may use the store meanwhile
+        return read(*args, **kwargs)
+
+    s._read = _read
+    for i in range(20):
+        s["x%d" % i] = bytes([i]) * 100
+    assert len(s.slabs) > 2
+    usage = s.disk_usage()
+
+    for i in range(20):
+        if i % 4:
+            del s["x%d" % i]
+    assert s.needs_compaction()
+    assert s.compact() > 0
+    assert s.disk_usage() < usage
+    assert not s.needs_compaction()
+    assert len(os.listdir(str(tmpdir))) == len(s.slabs)
+    for i in range(0, 20, 4):
+        assert bytes(s["x%d" % i]) == bytes([i]) * 100
+    s.close()
+
+
+@pytest.mark.asyncio
+async def test_spill_buffer_slab_backend(cleanup, tmpdir):
+    np = pytest.importorskip("numpy")
+    buf = SpillBuffer(
+        str(tmpdir), target=2 ** 20, backend="slab", slab_size=2 ** 22
+    )
+    xs = [np.random.random(50000) for i in range(10)]
+    for i, x in enumerate(xs):
+        buf["x%d" % i] = x
+
+    await buf.wait_for_spill(wait_all=True)
+    assert len(buf.slow) >= 8
+    assert len(os.listdir(str(tmpdir))) == len(buf.slow.d.slabs)
+    for i, x in enumerate(xs):
+        assert (buf["x%d" % i] == x).all()
+    for i in range(10):
+        del buf["x%d" % i]
+    await buf.wait_for_spill(wait_all=True)
+    while buf._compacting is not None:
+        await asyncio.sleep(0.01)
+    assert not buf.slow.d.index
+    buf.close()
+
+    with pytest.raises(ValueError, match="not found"):
+        SpillBuffer(str(tmpdir), target=100, backend="foo")
+
+
+@pytest.mark.asyncio
+async def test_spill_buffer_evicts_unneeded_keys_first(cleanup, tmpdir):
+    buf = SpillBuffer(str(tmpdir), target=450)  # room for three values
+    buf.update_consumers("a", 0, 1)  # we don't hold a yet
+    assert not buf.consumers
+    buf["a"] = b"a" * 100
+    buf.update_consumers("a", 0, 1)
+    buf["b"] = b"b" * 100
+    buf["c"] = b"c" * 100
+    buf.update_consumers("b", 0, 2)
+
+    buf["d"] = b"d" * 100  # evicts c, the least recently used unneeded key
+    assert set(buf.fast) == {"a", "b", "d"}
+    buf["e"] = b"e" * 100
+    assert set(buf.fast) == {"a", "b", "e"}
+
+    # a is only needed by a task that waits for other data
+    buf.update_consumers("e", 0, 2)
+    buf.put("f", b"f" * 100, consumers=[2])
+    assert set(buf.fast) == {"b", "e", "f"}
+    buf.update_consumers("e", 2, 0)
+    buf.update_consumers("f", 2, 0)
+
+    buf.update_consumers("a", 1, 0)
+    buf.update_consumers("b", 2, 0)
+    assert not buf.consumers
+    buf["h"] = b"h" * 100
+    assert "b" not in buf.fast
+
+    await buf.wait_for_spill(wait_all=True)
+    assert buf.get_metrics()["evicted-needed"] == 1
+    assert buf["a"] == b"a" * 100
+    assert buf.get_metrics()["unspilled"] == 1
+    buf.close()
+
+
+@pytest.mark.asyncio
+async def test_spill_buffer_eviction_order(cleanup, tmpdir):
+    buf = SpillBuffer(str(tmpdir), target=500, weight=lambda k, v: len(v))
+    buf["small"] = b"s" * 100
+    buf["large"] = b"l" * 200
+    buf["later"] = b"x" * 100
+    buf["sooner"] = b"y" * 100
+    buf.update_consumers("later", None, (2, -5))
+    buf.update_consumers("sooner", None, (2, -1))
+
+    # Among unneeded keys, the larger one goes first
+    buf["z"] = b"z" * 100
+    assert set(buf.fast) == {"small", "later", "sooner", "z"}
+    del buf["small"], buf["z"]
+
+    # Then keys whose consumers run last
+    buf.put("big", b"b" * 350, consumers=[(2, -3)])
+    assert set(buf.fast) == {"sooner", "big"}
+    assert "later" in buf.consumers
+    del buf["later"]
+    assert "later" not in buf.consumers
+    await buf.wait_for_spill(wait_all=True)
+    buf.close()
+
+
+@pytest.mark.asyncio
+async def test_spill_buffer_unspill(cleanup, tmpdir):
+    buf = SpillBuffer(str(tmpdir), target=300)  # room for two values
+    buf["a"] = b"a" * 100
+    buf["b"] = b"b" * 100
+    buf["c"] = b"c" * 100
+    await buf.wait_for_spill(wait_all=True)
+    assert buf.is_spilled("a")
+    assert not buf.is_spilled("c")
+    assert not buf.is_spilled("z")
+
+    await asyncio.gather(buf.unspill("a"), buf.unspill("a"))
+    assert not buf.is_spilled("a")
+    assert "a" in buf.fast
+    assert buf.get_metrics()["unspilled"] == 1
+
+    await buf.unspill("c")  # already in memory
+    await buf.unspill("z")  # not stored at all
+    assert buf.get_metrics()["unspilled"] == 1
+
+    # a value overwritten during the read is not replaced by the old one
+    await buf.wait_for_spill(wait_all=True)
+    spilled = next(k for k in "bc" if buf.is_spilled(k))
+    future = asyncio.ensure_future(buf.unspill(spilled))
+    buf[spilled] = b"new"
+    await future
+    assert buf[spilled] == b"new"
+    buf.close()
@@ -0,0 +1,151 @@
+import pickle
+
+import pytest
+from tornado import gen
+
+from distributed import wait
+from distributed.task_cache import (
+    PayloadCache,
+    PayloadRef,
+    extract_payloads,
+    payload_digest,
+    ref_digest,
+    task_payload_digests,
+)
+from distributed.utils_test import gen_cluster, inc
+from distributed.worker import cache_loads, loads_function
+
+
+def test_payload_cache():
+    cache = PayloadCache(maxsize="10 B")
+    cache["x"] = b"12345"
+    cache["y"] = b"123"
+    assert cache["x"] == b"12345"  # y is now the least recently used
+    cache["z"] = b"1234"
+    assert "y" not in cache
+    assert set(cache.data) == {"x", "z"}
+    assert cache.nbytes == 9
+
+    cache.put("big", object(), nbytes=11)
+    assert "big" not in cache
+    cache.put("x", "replaced", nbytes=1)
+    assert cache.nbytes == 5
+    assert cache.get("y") is None
+
+    cache.clear()
+    assert not cache and not cache.nbytes
+
+
+def test_extract_payloads():
+    big = b"x" * 2000
+    tasks = {
+        "a": {"function": big, "args": b"small"},
+        "b": {"function": big, "args": b"y" * 2000},
+        "c": object(),
+    }
+    payloads = extract_payloads(tasks, min_size=1000)
+    assert len(payloads) == 2
+    assert tasks["a"]["function"] == tasks["b"]["function"] == PayloadRef(
+        payload_digest(big)
+    )
+    assert payloads[payload_digest(big)] is big
+    assert tasks["a"]["args"] == b"small"
+    assert task_payload_digests(tasks["b"]) == [
+        payload_digest(big),
+        payload_digest(b"y" * 2000),
+    ]
+    assert task_payload_digests(tasks["c"]) == []
+    assert task_payload_digests({"function": b"x", "args": "abc"}) == []
+
+
+def test_payload_ref():
+    ref = PayloadRef("abc")
+    assert ref_digest(ref) == "abc"
+    assert ref_digest(dict(ref)) == "abc"  # as received through msgpack
+    assert ref_digest("abc") is None
+    assert ref_digest(b"abc") is None
+
+
+@gen_cluster(client=True)
+def test_payloads_sent_once(c, s, a, b):
+    lookup = dict.fromkeys(range(10000))
+
+    def f(x):
+        return x in lookup
+
+    futures = c.map(f, range(20), workers=a.address)
+    results = yield c.gather(futures)
+    assert results == [True] * 20
+
+    [digest] = s.task_payloads
+    assert s.task_payload_refs[digest] == 20
+    assert s.task_payload_holders[digest] == {a.address}
+    assert digest in a.payloads
+    assert not b.payloads
+
+    del futures
+    while s.tasks:
+        yield gen.sleep(0.01)
+    assert not s.task_payloads
+    assert not s.task_payload_refs
+    assert not s.task_payload_holders
+
+
+@gen_cluster(client=True)
+def test_workers_fetch_missing_payloads(c, s, a, b):
+    lookup = dict.fromkeys(range(10000))
+
+    def f(x):
+        return x in lookup
+
+    x = c.submit(f, 1, workers=a.address)
+    yield wait(x)
+    a.payloads.clear()
+
+    futures = c.map(f, range(10), workers=a.address)
+    assert (yield c.gather(futures)) == [True] * 10
+    assert any(msg[1] == "fetch-payloads" for msg in a.log)
+    assert len(a.payloads) == 1
+
+    y = c.submit(inc, 1, workers=a.address)
+    assert (yield y) == 2
+
+
+@gen_cluster(client=True, config={"distributed.comm.task-cache.size": "3kB"})
+def test_payload_larger_than_cache(c, s, a, b):
+    def f(x, y):
+        return x + len(y)
+
+    payload = b"x" * 5000
+    # The first task brings its arguments, the second fetches them
+    x = c.submit(f, 1, payload, workers=a.address, pure=False)
+    assert (yield x) == 5001
+    assert not a.payloads
+    y = c.submit(f, 1, payload, workers=a.address, pure=False)
+    assert (yield y) == 5001
+    assert any(msg[1] == "fetch-payloads" for msg in a.log)
+
+
+@gen_cluster(client=True)
+def test_unresolved_payload(c, s, a, b):
+    lookup = dict.fromkeys(range(10000))
+
+    def f(x):
+        return x in lookup
+
+    yield wait(c.submit(f, 1, workers=a.address))
+    a.payloads.clear()
+    s.handlers["get_payloads"] = lambda comm=None, digests=None: {}
+
+    with pytest.raises(ValueError, match="Could not get the pickled"):
+        yield c.submit(f, 2, workers=a.address)
+
+
+def test_loads_function_caches_small_payloads():
+    small = pickle.dumps(inc)
+    assert loads_function(small) is inc
+    assert small in cache_loads
+
+    large = pickle.dumps((inc, b"x" * 200000))
+    assert loads_function(large)[0] is inc
+    assert large not in cache_loads
@@ -45,6 +45,7 @@ from distributed.utils_test import (  # noqa: F401
     div,
     dec,
     slowinc,
+    slowadd,
     gen_test,
     captured_logger,
 )
@@ -392,6 +393,30 @@ async def test_io_loop(cleanup):
             assert w.io_loop is s.loop
 
 
+@gen_cluster(client=True)
+def test_spill_consumers(c, s, a, b):
+    x = c.submit(inc, 1, workers=a.address)
+    yield wait(x)
+    assert not a.data.consumers
+
+    y = c.submit(slowadd, x, 1, delay=0.5, workers=a.address)
+    while a.task_state.get(y.key) != "executing":
+        yield gen.sleep(0.01)
+    [urgency] = a.data.consumers[x.key]
+    assert urgency[0] == 2
+
+    # b only tracks consumers of keys it holds
+    z = c.submit(slowadd, x, y, delay=0.5, workers=b.address)
+    while x.key not in b.data:
+        yield gen.sleep(0.01)
+    assert x.key in b.data.consumers
+    assert all(key in b.data for key in b.data.consumers)
+
+    yield wait(z)
+    assert not a.data.consumers
+    assert not b.data.consumers
+
+
 @gen_cluster(client=True, nthreads=[])
 def test_spill_to_disk(c, s):
     np = pytest.importorskip("numpy")
@@ -415,12 +440,15 @@ def test_spill_to_disk(c, s):
     z = c.submit(np.random.randint, 0, 255, size=500, dtype="u1", key="z")
     yield wait(z)
     assert set(w.data) == {x.key, y.key, z.key}
+    yield w.data.wait_for_spill(wait_all=True)  # evicted values are written async
+    assert set(w.data) == {x.key, y.key, z.key}
     assert set(w.data.memory) == {y.key, z.key}
     assert set(w.data.disk) == {x.key} or set(w.data.slow) == {x.key, y.key}
     assert set(w.data.fast) == set(w.data.memory)
     assert set(w.data.slow) == set(w.data.disk)
 
     yield x
+    yield w.data.wait_for_spill(wait_all=True)
     assert set(w.data.memory) == {x.key, z.key}
     assert set(w.data.disk) == {y.key} or set(w.data.slow) == {x.key, y.key}
     assert set(w.data.fast) == set(w.data.memory)
@@ -428,6 +456,142 @@ def test_spill_to_disk(c, s):
     yield w.close()
 
 
+@gen_cluster(client=True, nthreads=[])
+def test_unspill_dependencies_before_execution(c, s):
+    np = pytest.importorskip("numpy")
+    w = yield Worker(
+        s.address,
+        loop=s.loop,
+        memory_limit=1200 / 0.6,
+        memory_pause_fraction=None,
+        memory_spill_fraction=None,
+    )
+    futures = [
+        c.submit(np.random.randint, 0, 255, size=500, dtype="u1", key="x-%d" % i)
+        for i in range(3)
+    ]
+    yield wait(futures)
+    yield w.data.wait_for_spill(wait_all=True)
+    [x] = [f for f in futures if w.data.is_spilled(f.key)]
+
+    y = c.submit(np.sum, x, key="y")
+    yield wait(y)
+    assert w.data.get_metrics()["unspilled"] == 1
+    assert "disk-read" in [action for action, _, _ in w.startstops["y"]]
+    assert not w._preparing and not w._prepared
+    yield w.close()
+
+
+async def _spilled_future(c, w):
+    """ A future of a value that w spilled to disk """
+    np = pytest.importorskip("numpy")
+    futures = [
+        c.submit(np.random.randint, 0, 255, size=500, dtype="u1", key="x-%d" % i)
+        for i in range(3)
+    ]
+    await wait(futures)
+    await w.data.wait_for_spill(wait_all=True)
+    [x] = [f for f in futures if w.data.is_spilled(f.key)]
+    return x
+
+
+def _startstop(w, key, action):
+    [(start, stop)] = [(a, b) for name, a, b in w.startstops[key] if name == action]
+    return start, stop
+
+
+@gen_cluster(client=True, nthreads=[])
+async def test_prefetch_next_ready_tasks(c, s):
+    np = pytest.importorskip("numpy")
+    w = await Worker(
+        s.address,
+        nthreads=1,
+        memory_limit=1200 / 0.6,
+        memory_pause_fraction=None,
+        memory_spill_fraction=None,
+    )
+    x = await _spilled_future(c, w)
+
+    first = c.submit(slowinc, 1, delay=0.3, key="first")
+    while not w.executing:
+        await gen.sleep(0.01)
+    second = c.submit(slowinc, 2, delay=0.3, key="second", priority=10)
+    y = c.submit(np.sum, x, key="y")
+    await wait([first, second, y])
+
+    # We read x from disk while second was running
+    assert _startstop(w, "y", "disk-read")[1] < _startstop(w, "second", "compute")[1]
+    await w.close()
+
+
+@gen_cluster(client=True, nthreads=[])
+async def test_run_prepared_tasks_while_others_prepare(c, s):
+    np = pytest.importorskip("numpy")
+    w = await Worker(
+        s.address,
+        nthreads=1,
+        memory_limit=1200 / 0.6,
+        memory_pause_fraction=None,
+        memory_spill_fraction=None,
+    )
+    x = await _spilled_future(c, w)
+
+    first = c.submit(slowinc, 1, delay=0.3, key="first")
+    while not w.executing:
+        await gen.sleep(0.01)
+    y = c.submit(np.sum, x, key="y", priority=10)
+    z = c.submit(inc, 1, key="z")
+    await wait([first, y, z])
+
+    # The thread didn't wait for x to be read from disk
+    assert "disk-read" in [action for action, _, _ in w.startstops["y"]]
+    assert _startstop(w, "z", "compute")[0] < _startstop(w, "y", "compute")[0]
+    await w.close()
+
+
+def fail_on_500(x):
+    if x == 500:
+        raise ValueError(x)
+    return x
+
+
+class TransitionRecorder(object):
+    def __init__(self):
+        self.transitions = []
+
+    def transition(self, key, start, finish, **kwargs):
+        self.transitions.append((start, finish, kwargs))
+
+
+@gen_cluster(
+    client=True,
+    nthreads=[("127.0.0.1", 2)],
+    config={"distributed.worker.batch.task-duration": "1ms"},
+)
+def test_batch_short_tasks(c, s, a):
+    yield c.register_worker_plugin(TransitionRecorder(), name="recorder")
+    yield wait(c.map(inc, range(10)))  # learn how long these tasks take
+    yield wait(c.map(fail_on_500, range(10)))
+    n = a.batched_count
+
+    results = yield c.gather(c.map(inc, range(10, 1000)))
+    assert results == list(range(11, 1001))
+    assert a.batched_count > n
+    assert a.executed_count == 1010
+
+    futures = c.map(fail_on_500, range(10, 1000))
+    yield wait(futures)
+    assert [f.status for f in futures].count("error") == 1
+    with pytest.raises(ValueError):
+        yield futures[490]
+
+    assert not a._batched and not a._nbatches
+    assert not a.executing
+    transitions = a.plugins["recorder"].transitions
+    assert ("ready", "executing", {}) in transitions
+    assert all(not kwargs for _, finish, kwargs in transitions if finish == "executing")
+
+
 @gen_cluster(client=True)
 def test_access_key(c, s, a, b):
     def f(i):
@@ -1115,6 +1279,17 @@ def test_robust_to_bad_sizeof_estimates(c, s, a):
         assert time() < start + 5
 
 
+@gen_cluster(nthreads=[])
+async def test_memory_monitor_with_custom_data(s):
+    zict = pytest.importorskip("zict")
+    data = zict.Buffer({}, {}, n=10 ** 9)
+    async with Worker(s.address, data=data, memory_limit="10 MB") as w:
+        w.data["x"] = b"x" * 1000
+        await w.memory_monitor()
+        assert "x" in w.data.slow
+        assert w.data["x"] == b"x" * 1000
+
+
 @pytest.mark.slow
 @gen_cluster(
     nthreads=[("127.0.0.1", 2)],
@@ -1157,6 +1332,36 @@ def test_pause_executor(c, s, a):
     yield wait(futures)
 
 
+def make_bytes(n):
+    return b"0" * n
+
+
+def count_bytes(x):
+    return len(x)
+
+
+@gen_cluster(
+    client=True, nthreads=[("127.0.0.1", 1)], worker_kwargs={"memory_limit": 0}
+)
+async def test_graceful_pause(c, s, a):
+    x = c.submit(make_bytes, 100000)
+    await c.submit(count_bytes, x)  # learn that count_bytes frees memory
+
+    a.paused = True
+    y = c.submit(count_bytes, x, pure=False)
+    z = c.submit(make_bytes, 1000)
+    assert await y == 100000
+    await gen.sleep(0.1)
+    assert a.task_state[z.key] == "ready"
+    assert not z.done()
+    metrics = await a.get_metrics()
+    assert metrics["ready"] == 1
+
+    a.paused = False
+    a.ensure_computing()
+    await z
+
+
 @gen_cluster(client=True, worker_kwargs={"profile_cycle_interval": "50 ms"})
 def test_statistical_profiling_cycle(c, s, a, b):
     futures = c.map(slowinc, range(20), delay=0.05)
@@ -1309,7 +1514,10 @@ def test_prefer_gather_from_local_address(c, s, w1, w2, w3):
     client=True,
     nthreads=[("127.0.0.1", 1)] * 20,
     timeout=30,
-    config={"distributed.worker.connections.incoming": 1},
+    config={
+        "distributed.worker.connections.incoming": 1,
+        "distributed.worker.connections.adaptive": False,
+    },
 )
 def test_avoid_oversubscription(c, s, *workers):
     np = pytest.importorskip("numpy")
@@ -1327,6 +1535,91 @@ def test_avoid_oversubscription(c, s, *workers):
     assert len([w for w in workers if len(w.outgoing_transfer_log) > 0]) >= 3
 
 
+@gen_cluster(client=True)
+async def test_adaptive_connection_limits(c, s, a, b):
+    futures = c.map(inc, range(20), workers=[a.address])
+    assert await c.submit(sum, futures, workers=[b.address]) == sum(range(1, 21))
+
+    metrics = await b.get_metrics()
+    assert metrics["connections"]["outgoing"]["limit"] == b.total_out_connections
+    assert metrics["connections"]["incoming"]["limit"] == b.total_in_connections
+    assert b.outgoing_limit.maximum == 4 * 50
+
+    b.total_out_connections = 3
+    assert b.outgoing_limit.limit == 3
+
+
+@gen_cluster(client=True)
+async def test_data_needed_without_duplicates(c, s, a, b):
+    x = c.submit(inc, 1, workers=[a.address])
+    await wait(x)
+    b.total_out_connections = 0  # hold fetches back
+    y = c.submit(inc, x, workers=[b.address])
+    while y.key not in b.waiting_for_data:
+        await gen.sleep(0.01)
+    for i in range(3):
+        await b.handle_missing_dep(x.key)
+    assert b.data_needed == [(b.priorities[y.key], y.key)]
+
+    b.total_out_connections = 1
+    b.ensure_communicating()
+    assert await y == 3
+    assert not b.data_needed
+
+
+class OKComm(object):
+    def __init__(self, peer_address):
+        self.peer_address = peer_address
+
+    async def write(self, msg, serializers=None):
+        return 0
+
+    async def read(self, deserializers=None):
+        return "OK"
+
+
+@gen_cluster(
+    client=True,
+    worker_kwargs={"memory_limit": "1 GB"},
+    config={"distributed.worker.connections.incoming": 2},
+)
+async def test_memory_pressure_keeps_serving(c, s, a, b):
+    x = c.submit(inc, 1, workers=[a.address])
+    await wait(x)
+    a.monitor.memory.append(10 ** 12)  # far above the target
+    for i in range(4):
+        await a.get_data(OKComm(b.address), keys=[x.key], who=b.address)
+    assert a.incoming_limit.limit == 2
+    assert not a.incoming_limit.decreases
+
+
+@gen_cluster(
+    client=True,
+    nthreads=[("127.0.0.1", 1)] * 2,
+    worker_kwargs={"memory_limit": "1 GB"},
+    config={"distributed.worker.memory.prefetch": 0.0025},
+)
+async def test_prefetch_budget(c, s, a, b):
+    np = pytest.importorskip("numpy")
+    assert b.prefetch_budget == 2500000
+    xs = [c.submit(np.ones, 125000, workers=[a.address], pure=False) for i in range(10)]
+    await wait(xs)
+
+    # While b is busy it only fetches data for a few of the queued tasks
+    slow = c.submit(slowinc, 1, delay=0.5, workers=[b.address])
+    while b.task_state.get(slow.key) != "executing":
+        await gen.sleep(0.01)
+    ys = c.map(np.sum, xs, workers=[b.address])
+    await gen.sleep(0.3)
+    assert b.waiting_for_data
+    assert 0 < b.fetched_nbytes + b.comm_nbytes <= b.prefetch_budget + 1000000
+
+    assert await c.gather(ys) == [125000] * 10
+    metrics = await b.get_metrics()
+    assert metrics["prefetch"]["budget"] == b.prefetch_budget
+    assert metrics["prefetch"]["idle-time"] >= 0
+
+
 @gen_cluster(client=True, worker_kwargs={"metrics": {"my_port": lambda w: w.port}})
 def test_custom_metrics(c, s, a, b):
     assert s.workers[a.address].metrics["my_port"] == a.port
@@ -1586,3 +1879,39 @@ async def test_bad_startup(cleanup):
             w = await Worker(s.address, startup_information={"bad": bad_startup})
         except Exception:
             pytest.fail("Startup exception was raised")
+
+
+@gen_cluster(client=True, nthreads=[("127.0.0.1", 1)])
+def test_size_correction(c, s, a):
+    class Underestimated(object):
+        def __init__(self):
+            self.data = bytearray(20 * 2 ** 20)
+
+        def __sizeof__(self):
+            return 2 ** 20
+
+    futures = c.map(lambda i: Underestimated(), range(5), pure=False)
+    yield wait(futures)
+    assert a.size_corrector.factor("lambda") > 5
+    assert a.nbytes[futures[-1].key] > 5 * 2 ** 20
+    assert s.tasks[futures[-1].key].nbytes > 5 * 2 ** 20
+
+    with dask.config.set({"distributed.worker.memory.size-correction": False}):
+        w = yield Worker(s.address)
+        assert w.size_corrector is None
+        yield w.close()
+
+
+@gen_cluster(
+    client=True,
+    nthreads=[("127.0.0.1", 1)],
+    config={"distributed.worker.batch.task-duration": "1ms"},
+)
+def test_batch_stops_on_slow_tasks(c, s, a):
+    yield wait(c.submit(slowinc, 0, delay=0))
+    # The scheduler expects these to be fast, but they aren't
+    futures = c.map(slowinc, range(1, 10), delay=0.1)
+    assert (yield c.gather(futures)) == list(range(2, 11))
+    # The first batch stops after one task and we stop batching them
+    assert a.batched_count <= 1
+    assert not a._batched and not a._nbatches
@@ -1437,6 +1437,7 @@ def check_thread_leak():
             and "Threaded" not in v.name
             and "watch message" not in v.name
             and "TCP-Executor" not in v.name
+            and "Compression-Executor" not in v.name
         ]
         if not bad:
             break
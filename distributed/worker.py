@@ -22,26 +22,50 @@ from dask.utils import format_bytes, funcname
 from dask.system import CPU_COUNT
 
 try:
-    from cytoolz import pluck, partial, merge, first, keymap
+    from cytoolz import pluck, partial, merge, first, keymap, valmap
 except ImportError:
-    from toolz import pluck, partial, merge, first, keymap
+    from toolz import pluck, partial, merge, first, keymap, valmap
 from tornado import gen
 from tornado.ioloop import IOLoop
 
 from . import profile, comm, system
 from .batched import BatchedSend
-from .comm import get_address_host, connect
+from .comm import get_address_host, connect, parse_address
 from .comm.addressing import address_from_user_args
+from .comm.buffers import get_buffer_pool
+from .comm.utils import FRAME_OFFLOAD_THRESHOLD
+from .concurrency import AdaptiveLimit
 from .core import error_message, CommClosedError, send_recv, pingpong, coerce_to_address
 from .diskutils import WorkSpace
+from .event_log import EventLog
 from .metrics import time
 from .node import ServerNode
 from .preloading import preload_modules
 from .proctitle import setproctitle
-from .protocol import pickle, to_serialize, deserialize_bytes, serialize_bytelist
+from .protocol import pickle, to_serialize
+from .process_pool import ChildValue, ProcessPool
+from .shared_memory import (
+    dumps_value,
+    loads_value,
+    enabled as shared_memory_enabled,
+    min_shared_size,
+    namespace as shared_memory_namespace,
+    unlink_values as unlink_shared,
+)
 from .pubsub import PubSubWorkerExtension
 from .security import Security
-from .sizeof import safe_sizeof as sizeof
+from .sizeof import safe_sizeof as sizeof, SizeCorrector
+
+try:
+    from .spill import SpillBuffer
+except ImportError:  # zict isn't installed
+
+    class SpillBuffer(object):
+        def __init__(self, *args, **kwargs):
+            raise ImportError("Please `pip install zict` for spill-to-disk workers")
+
+
+from .task_cache import PayloadCache, ref_digest
 from .threadpoolexecutor import ThreadPoolExecutor, secede as tpe_secede
 from .utils import (
     get_ip,
@@ -61,7 +85,6 @@ from .utils import (
     parse_timedelta,
     iscoroutinefunction,
     warn_on_duration,
-    LRU,
 )
 from .utils_comm import pack_data, gather_from_workers
 from .utils_perf import ThrottledGC, enable_gc_diagnosis, disable_gc_diagnosis
@@ -77,6 +100,16 @@ PENDING = ("waiting", "ready", "constrained")
 PROCESSING = ("waiting", "ready", "constrained", "executing", "long-running")
 READY = ("ready", "constrained")
 
+# How urgently tasks in each state need their dependencies in memory
+# Lower values are spilled to disk first, see Worker._consumer_urgency
+CONSUMER_URGENCY = {
+    "waiting": 1,
+    "ready": 2,
+    "constrained": 2,
+    "executing": 2,
+    "long-running": 2,
+}
+
 
 DEFAULT_EXTENSIONS = [PubSubWorkerExtension]
 
@@ -119,6 +152,9 @@ class Worker(ServerNode):
         Number of nthreads used by this worker process
     * **executor:** ``concurrent.futures.ThreadPoolExecutor``:
         Executor used to perform computation
+    * **process_pool:** ``ProcessPool`` or None:
+        Subprocesses that compute tasks and hold their results, if the worker
+        runs with ``executor="processes"``
     * **local_directory:** ``path``:
         Path on local machine to store temporary files
     * **scheduler:** ``rpc``:
@@ -132,11 +168,22 @@ class Worker(ServerNode):
         The maximum number of concurrent outgoing requests for data
     * **total_in_connections**: ``int``
         The maximum number of concurrent incoming requests for data
+    * **outgoing_limit**, **incoming_limit**: ``AdaptiveLimit``
+        Adapt the two limits above to measured throughput, latency and memory
     * **total_comm_nbytes**: ``int``
+    * **prefetch_budget**: ``int``
+        Bytes of data that we fetch for queued tasks while all threads are
+        busy, see ``distributed.worker.memory.prefetch``
+    * **fetched_nbytes**: ``int``
+        Bytes of data fetched from other workers that we still hold
+    * **idle_time**: ``float``
+        Seconds that threads sat idle while tasks waited for data, summed over
+        threads
     * **batched_stream**: ``BatchedSend``
         A batched stream along which we communicate to the scheduler
-    * **log**: ``[(message)]``
-        A structured and queryable log.  See ``Worker.story``
+    * **log**: ``EventLog``
+        A structured and queryable log of recent events.  See ``Worker.story``
+        and ``distributed.worker.event-log``
 
     **Volatile State**
 
@@ -149,13 +196,18 @@ class Worker(ServerNode):
         Prefer using the **host** attribute instead of this, unless
         memory_limit and at least one of memory_target_fraction or
         memory_spill_fraction values are defined, in that case, this attribute
-        is a zict.Buffer, from which information on LRU cache can be queried.
+        is a ``SpillBuffer`` (a zict.Buffer), from which information on LRU
+        cache can be queried.
     * **data.memory:** ``{key: object}``:
         Dictionary mapping keys to actual values stored in memory. Only
         available if condition for **data** being a zict.Buffer is met.
     * **data.disk:** ``{key: object}``:
         Dictionary mapping keys to actual values stored on disk. Only
         available if condition for **data** being a zict.Buffer is met.
+    * **data.spilling:** ``{key: object}``:
+        Dictionary mapping keys to values that are currently being written to
+        disk in a background thread.  They remain readable until the write
+        completes.  Only available if **data** is a ``SpillBuffer``.
     * **task_state**: ``{key: string}``:
         The state of all tasks that the scheduler has asked us to compute.
         Valid states include waiting, constrained, executing, memory, erred
@@ -165,13 +217,17 @@ class Worker(ServerNode):
         The data needed by this key to run
     * **dependents**: ``{dep: {keys}}``
         The keys that use this dependency
-    * **data_needed**: deque(keys)
-        The keys whose data we still lack, arranged in a deque
+    * **data_needed**: ``[(priority, key)]``
+        The keys whose data we still lack, arranged in a heap by priority
     * **waiting_for_data**: ``{kep: {deps}}``
         A dynamic verion of dependencies.  All dependencies that we still don't
         have for a particular key.
     * **ready**: [keys]
         Keys that are ready to run.  Stored in a LIFO stack
+    * **memory_pressure**: ``int``
+        0 normally, 1 while memory use is above the spill fraction and 2 while
+        it is above the pause fraction.  Reported to the scheduler in
+        heartbeats.
     * **constrained**: [keys]
         Keys for which we have the data to run, but are waiting on abstract
         resources like GPUs.  Stored in a FIFO deque
@@ -179,6 +235,8 @@ class Worker(ServerNode):
         Keys that are currently executing
     * **executed_count**: int
         A number of tasks that this worker has run in its lifetime
+    * **batched_count**: int
+        How many of these ran back to back with other short tasks in a batch
     * **long_running**: {keys}
         A set of keys of tasks that are running and have started their own
         long-running clients.
@@ -248,7 +306,9 @@ class Worker(ServerNode):
         Fraction of memory at which we start spilling to disk
     memory_pause_fraction: float
         Fraction of memory at which we stop running new tasks
-    executor: concurrent.futures.Executor
+    executor: concurrent.futures.Executor or "processes"
+        Use "processes" to compute tasks in a pool of ``nthreads``
+        subprocesses, see ``distributed.worker.executor``
     resources: dict
         Resources that this worker has like ``{'GPU': 2}``
     nanny: str
@@ -340,22 +400,36 @@ class Worker(ServerNode):
         self.nanny = nanny
         self._lock = threading.Lock()
 
-        self.data_needed = deque()  # TODO: replace with heap?
+        self.data_needed = list()
+        self._data_needed_priorities = dict()
 
         self.in_flight_tasks = dict()
         self.in_flight_workers = dict()
-        self.total_out_connections = dask.config.get(
-            "distributed.worker.connections.outgoing"
+        connections = dask.config.get("distributed.worker.connections")
+        self.outgoing_limit = AdaptiveLimit(
+            connections["outgoing"],
+            maximum=connections["outgoing"] * connections["maximum-factor"],
+            adaptive=connections["adaptive"],
         )
-        self.total_in_connections = dask.config.get(
-            "distributed.worker.connections.incoming"
+        self.incoming_limit = AdaptiveLimit(
+            connections["incoming"],
+            maximum=connections["incoming"] * connections["maximum-factor"],
+            adaptive=connections["adaptive"],
         )
         self.total_comm_nbytes = 10e6
         self.comm_nbytes = 0
+        self._fetched = set()
+        self.fetched_nbytes = 0
+        self.idle_time = 0
+        self._idle_time_last = time()
         self.suspicious_deps = defaultdict(lambda: 0)
         self._missing_dep_flight = set()
 
         self.nbytes = dict()
+        if dask.config.get("distributed.worker.memory.size-correction"):
+            self.size_corrector = SizeCorrector()
+        else:
+            self.size_corrector = None
         self.types = dict()
         self.threads = dict()
         self.exceptions = dict()
@@ -369,6 +443,7 @@ class Worker(ServerNode):
         self.profile_history = deque(maxlen=3600)
 
         self.priorities = dict()
+        self._urgencies = dict()
         self.generation = 0
         self.durations = dict()
         self.startstops = defaultdict(list)
@@ -376,17 +451,35 @@ class Worker(ServerNode):
 
         self.ready = list()
         self.constrained = deque()
+        self._preparing = set()
+        self._prepared = set()
+        self.shared_memory_min = min_shared_size()
+        self.payloads = PayloadCache(
+            dask.config.get("distributed.comm.task-cache.size")
+        )
         self.executing = set()
         self.executed_count = 0
         self.long_running = set()
 
+        batch_duration = dask.config.get("distributed.worker.batch.task-duration")
+        self.batch_duration = parse_timedelta(batch_duration) if batch_duration else 0
+        self.batch_size = dask.config.get("distributed.worker.batch.size")
+        self._batched = set()
+        self._nbatches = 0
+        self._batch_prefix_durations = dict()
+        self._task_durations = []  # buffered for the task-duration digest
+        self.batched_count = 0
+
         self.batched_stream = None
         self.recent_messages_log = deque(
             maxlen=dask.config.get("distributed.comm.recent-messages-log-length")
         )
         self.target_message_size = 50e6  # 50 MB
 
-        self.log = deque(maxlen=100000)
+        self.log = EventLog(
+            maxlen=dask.config.get("distributed.worker.event-log.length"),
+            level=dask.config.get("distributed.worker.event-log.level"),
+        )
         if validate is None:
             validate = dask.config.get("distributed.scheduler.validate")
         self.validate = validate
@@ -399,6 +492,7 @@ class Worker(ServerNode):
             ("ready", "memory"): self.transition_ready_memory,
             ("constrained", "executing"): self.transition_constrained_executing,
             ("executing", "memory"): self.transition_executing_done,
+            ("executing", "ready"): self.transition_executing_ready,
             ("executing", "error"): self.transition_executing_done,
             ("executing", "rescheduled"): self.transition_executing_done,
             ("executing", "long-running"): self.transition_executing_long_running,
@@ -513,6 +607,12 @@ class Worker(ServerNode):
         self.memory_limit = parse_memory_limit(memory_limit, self.nthreads)
 
         self.paused = False
+        self.memory_pressure = 0
+        self.graceful_pause = dask.config.get(
+            "distributed.worker.memory.graceful-pause"
+        )
+        self._deferred = list()  # ready tasks put aside while paused
+        self._output_ratios = dict()  # prefix -> output nbytes / input nbytes
 
         if "memory_target_fraction" in kwargs:
             self.memory_target_fraction = kwargs.pop("memory_target_fraction")
@@ -533,6 +633,12 @@ class Worker(ServerNode):
                 "distributed.worker.memory.pause"
             )
 
+        prefetch = dask.config.get("distributed.worker.memory.prefetch")
+        if prefetch and self.memory_limit:
+            self.prefetch_budget = int(prefetch * self.memory_limit)
+        else:
+            self.prefetch_budget = 0
+
         if isinstance(data, MutableMapping):
             self.data = data
         elif callable(data):
@@ -542,20 +648,25 @@ class Worker(ServerNode):
         elif self.memory_limit and (
             self.memory_target_fraction or self.memory_spill_fraction
         ):
-            try:
-                from zict import Buffer, File, Func
-            except ImportError:
-                raise ImportError("Please `pip install zict` for spill-to-disk workers")
             path = os.path.join(self.local_directory, "storage")
-            storage = Func(
-                partial(serialize_bytelist, on_error="raise"),
-                deserialize_bytes,
-                File(path),
-            )
             target = int(float(self.memory_limit) * self.memory_target_fraction)
-            self.data = Buffer({}, storage, target, weight)
-            self.data.memory = self.data.fast
-            self.data.disk = self.data.slow
+            self.data = SpillBuffer(
+                path,
+                target,
+                spill_threads=dask.config.get(
+                    "distributed.worker.memory.spill-threads"
+                ),
+                max_spilling=dask.config.get("distributed.worker.memory.spill-queue"),
+                compression=dask.config.get(
+                    "distributed.worker.memory.spill-compression"
+                ),
+                backend=dask.config.get("distributed.worker.memory.spill-backend"),
+                slab_size=parse_bytes(
+                    dask.config.get("distributed.worker.memory.spill-slab-size")
+                ),
+                weight=self._spill_weight,
+                loop=loop,
+            )
         else:
             self.data = dict()
 
@@ -563,6 +674,19 @@ class Worker(ServerNode):
         self.loop = loop or IOLoop.current()
         self.status = None
         self.reconnect = reconnect
+        if executor is None:
+            executor = dask.config.get("distributed.worker.executor")
+        if executor == "processes":
+            # Threads only drive the subprocesses, which measure their results
+            self.process_pool = ProcessPool(self.nthreads, on_lost=self._on_child_lost)
+            self.batch_duration = 0
+            self.size_corrector = None
+            executor = None
+        elif executor == "threads":
+            self.process_pool = None
+            executor = None
+        else:
+            self.process_pool = None
         self.executor = executor or ThreadPoolExecutor(
             self.nthreads, thread_name_prefix="Dask-Worker-Threads'"
         )
@@ -637,6 +761,10 @@ class Worker(ServerNode):
             **kwargs
         )
 
+        if self.process_pool is not None:
+            # Results live in the subprocesses
+            self.monitor.count_children = True
+
         self.scheduler = self.rpc(scheduler_addr)
         self.execution_state = {
             "scheduler": self.scheduler.address,
@@ -681,6 +809,13 @@ class Worker(ServerNode):
         )
         self.periodic_callbacks["profile-cycle"] = pc
 
+        pc = PeriodicCallback(self._account_idle_time, 100, io_loop=self.io_loop)
+        self.periodic_callbacks["idle-time"] = pc
+
+        if self.process_pool is not None:
+            pc = PeriodicCallback(self.check_process_pool, 1000, io_loop=self.io_loop)
+            self.periodic_callbacks["process-pool"] = pc
+
         self.plugins = {}
         self._pending_plugins = plugins
 
@@ -717,7 +852,7 @@ class Worker(ServerNode):
                 len(self.data),
                 len(self.executing),
                 self.nthreads,
-                len(self.ready),
+                len(self.ready) + len(self._deferred),
                 len(self.in_flight_tasks),
                 len(self.waiting_for_data),
             )
@@ -728,6 +863,22 @@ class Worker(ServerNode):
         """ For API compatibility with Nanny """
         return self.address
 
+    @property
+    def total_out_connections(self):
+        return self.outgoing_limit.limit
+
+    @total_out_connections.setter
+    def total_out_connections(self, value):
+        self.outgoing_limit.limit = value
+
+    @property
+    def total_in_connections(self):
+        return self.incoming_limit.limit
+
+    @total_in_connections.setter
+    def total_in_connections(self, value):
+        self.incoming_limit.limit = value
+
     @property
     def local_dir(self):
         """ For API compatibility with Nanny """
@@ -740,14 +891,31 @@ class Worker(ServerNode):
         core = dict(
             executing=len(self.executing),
             in_memory=len(self.data),
-            ready=len(self.ready),
+            ready=len(self.ready) + len(self._deferred),
             in_flight=len(self.in_flight_tasks),
+            memory_pressure=self.memory_pressure,
             bandwidth={
                 "total": self.bandwidth,
                 "workers": dict(self.bandwidth_workers),
                 "types": keymap(typename, self.bandwidth_types),
             },
         )
+        core["connections"] = {
+            "outgoing": self.outgoing_limit.get_metrics(),
+            "incoming": self.incoming_limit.get_metrics(),
+        }
+        core["prefetch"] = {
+            "budget": self.prefetch_budget,
+            "nbytes": self.comm_nbytes + self.fetched_nbytes,
+            "idle-time": self.idle_time,
+        }
+        if isinstance(self.data, SpillBuffer):
+            core["spill"] = self.data.get_metrics()
+        buffer_pool = get_buffer_pool()
+        if buffer_pool is not None:
+            core["receive-buffers"] = buffer_pool.get_metrics()
+        if self.batched_stream is not None:
+            core["batched-send"] = self.batched_stream.get_metrics()
         custom = {}
         for k, metric in self.metrics.items():
             try:
@@ -866,6 +1034,7 @@ class Worker(ServerNode):
         if not self.heartbeat_active:
             self.heartbeat_active = True
             logger.debug("Heartbeat: %s" % self.address)
+            self._flush_task_durations()
             try:
                 start = time()
                 response = await self.scheduler.heartbeat_worker(
@@ -1080,6 +1249,10 @@ class Worker(ServerNode):
                         ),
                     )
             await self.scheduler.close_rpc()
+            if isinstance(self.data, SpillBuffer):
+                self.data.close()
+            if self.process_pool is not None:
+                self.process_pool.close()
             self._workdir.release()
 
             for k, v in self.services.items():
@@ -1157,7 +1330,13 @@ class Worker(ServerNode):
         self.stream_comms[address].send(msg)
 
     async def get_data(
-        self, comm, keys=None, who=None, serializers=None, max_connections=None
+        self,
+        comm,
+        keys=None,
+        who=None,
+        serializers=None,
+        max_connections=None,
+        shared_memory=False,
     ):
         start = time()
 
@@ -1193,33 +1372,71 @@ class Worker(ServerNode):
             return {"status": "busy"}
 
         self.outgoing_current_count += 1
-        data = {k: self.data[k] for k in keys if k in self.data}
+        in_use = self.outgoing_current_count
+        shared = {}
+        try:
+            data = {k: self.data[k] for k in keys if k in self.data}
+            if (
+                shared_memory
+                and shared_memory == shared_memory_namespace()
+                and shared_memory_enabled()
+            ):
+                # The requester sees our segments, place large values there
+                shared = await offload(self._dumps_shared, data)
+                data = {k: v for k, v in data.items() if k not in shared}
+            if self.process_pool is not None and any(
+                isinstance(v, ChildValue) for v in data.values()
+            ):
+                data = await offload(valmap, self.process_pool.materialize, data)
 
-        if len(data) < len(keys):
-            for k in set(keys) - set(data):
-                if k in self.actors:
-                    from .actor import Actor
+            if len(data) < len(keys):
+                for k in set(keys) - set(data):
+                    if k in self.actors:
+                        from .actor import Actor
 
-                    data[k] = Actor(type(self.actors[k]), self.address, k)
+                        data[k] = Actor(type(self.actors[k]), self.address, k)
 
-        msg = {"status": "OK", "data": {k: to_serialize(v) for k, v in data.items()}}
-        nbytes = {k: self.nbytes.get(k) for k in data}
-        stop = time()
-        if self.digests is not None:
-            self.digests["get-data-load-duration"].add(stop - start)
-        start = time()
+            msg = {
+                "status": "OK",
+                "data": {k: to_serialize(v) for k, v in data.items()},
+            }
+            if shared:
+                msg["shared"] = shared
+            nbytes = {k: self.nbytes.get(k) for k in data}
+            nbytes.update({k: self.nbytes.get(k) for k in shared})
+            stop = time()
+            if self.digests is not None:
+                self.digests["get-data-load-duration"].add(stop - start)
+            start = time()
 
-        try:
-            compressed = await comm.write(msg, serializers=serializers)
-            response = await comm.read(deserializers=serializers)
-            assert response == "OK", response
-        except EnvironmentError:
-            logger.exception(
-                "failed during get data with %s -> %s", self.address, who, exc_info=True
-            )
-            comm.abort()
-            raise
+            try:
+                compressed = await comm.write(msg, serializers=serializers)
+                if shared:
+                    # Don't keep segments around for a requester that hangs
+                    timeout = parse_timedelta(
+                        dask.config.get("distributed.comm.timeouts.tcp"),
+                        default="seconds",
+                    )
+                    response = await asyncio.wait_for(
+                        comm.read(deserializers=serializers), timeout
+                    )
+                else:
+                    response = await comm.read(deserializers=serializers)
+                assert response == "OK", response
+            except (EnvironmentError, asyncio.TimeoutError):
+                logger.exception(
+                    "failed during get data with %s -> %s",
+                    self.address,
+                    who,
+                    exc_info=True,
+                )
+                comm.abort()
+                self.incoming_limit.failure()
+                raise
         finally:
+            # The requester unlinked the segments that it loaded, unless it
+            # failed or hung
+            unlink_shared(shared.values())
             self.outgoing_current_count -= 1
         stop = time()
         if self.digests is not None:
@@ -1229,6 +1446,8 @@ class Worker(ServerNode):
 
         self.outgoing_count += 1
         duration = (stop - start) or 0.5  # windows
+        # Serving data doesn't use our memory, so pressure doesn't limit it
+        self.incoming_limit.observe(total_bytes, duration, in_use=in_use)
         self.outgoing_transfer_log.append(
             {
                 "start": start + self.scheduler_delay,
@@ -1240,11 +1459,30 @@ class Worker(ServerNode):
                 "total": total_bytes,
                 "compressed": compressed,
                 "bandwidth": total_bytes / duration,
+                "shared-memory": len(shared),
             }
         )
 
         return "dont-reply"
 
+    def _dumps_shared(self, data):
+        """ Large values of data, prepared to be loaded from shared memory """
+        shared = {}
+        try:
+            for key, value in data.items():
+                if (self.nbytes.get(key) or 0) < self.shared_memory_min:
+                    continue
+                if isinstance(value, ChildValue):  # straight from the subprocess
+                    msg = self.process_pool.export(value)
+                else:
+                    msg = dumps_value(value, self.shared_memory_min)
+                if msg[0] == "shared-memory":  # otherwise use the usual serializers
+                    shared[key] = msg
+        except BaseException:
+            unlink_shared(shared.values())
+            raise
+        return shared
+
     ###################
     # Local Execution #
     ###################
@@ -1319,6 +1557,7 @@ class Worker(ServerNode):
         duration=None,
         resource_restrictions=None,
         actor=False,
+        payloads=None,
         **kwargs2
     ):
         try:
@@ -1351,7 +1590,13 @@ class Worker(ServerNode):
                 return
 
             self.log.append((key, "new"))
-            self.tasks[key] = SerializedTask(function, args, kwargs, task)
+            if payloads:
+                self.payloads.update(payloads)
+            self.tasks[key] = self._resolve_payloads(
+                SerializedTask(function, args, kwargs, task), payloads
+            )
+            if _missing_payloads(self.tasks[key]):
+                self._prepare(key)  # fetch them while we gather dependencies
             if actor:
                 self.actors[key] = None
 
@@ -1367,6 +1612,7 @@ class Worker(ServerNode):
             who_has = who_has or {}
             self.dependencies[key] = set(who_has)
             self.waiting_for_data[key] = set()
+            self._update_consumers(key, "waiting")
 
             for dep in who_has:
                 if dep not in self.dependents:
@@ -1396,7 +1642,7 @@ class Worker(ServerNode):
                         self.pending_data_per_worker[worker].append(dep)
 
             if self.waiting_for_data[key]:
-                self.data_needed.append(key)
+                self._push_data_needed(key)
             else:
                 self.transition(key, "ready")
             if self.validate:
@@ -1423,7 +1669,7 @@ class Worker(ServerNode):
             return
         func = self._dep_transitions[start, finish]
         state = func(dep, **kwargs)
-        self.log.append(("dep", dep, start, state or finish))
+        self.log.append(("dep", dep, start, state or finish), keys=(dep,))
         if dep in self.dep_state:
             self.dep_state[dep] = state or finish
             if self.validate:
@@ -1466,10 +1712,7 @@ class Worker(ServerNode):
                     self.loop.add_callback(self.handle_missing_dep, dep)
             for key in self.dependents.get(dep, ()):
                 if self.task_state[key] == "waiting":
-                    if remove:  # try a new worker immediately
-                        self.data_needed.appendleft(key)
-                    else:  # worker was probably busy, wait a while
-                        self.data_needed.append(key)
+                    self._push_data_needed(key)
 
             if not self.dependents[dep]:
                 self.release_dep(dep)
@@ -1490,6 +1733,9 @@ class Worker(ServerNode):
             if self.dependents[dep]:
                 self.dep_state[dep] = "memory"
                 self.put_key_in_memory(dep, value)
+                if dep not in self._fetched:
+                    self._fetched.add(dep)
+                    self.fetched_nbytes += self.nbytes.get(dep) or 0
                 self.batched_stream.send({"op": "add-keys", "keys": [dep]})
             else:
                 self.release_dep(dep)
@@ -1527,10 +1773,34 @@ class Worker(ServerNode):
         state = func(key, **kwargs)
         self.log.append((key, start, state or finish))
         self.task_state[key] = state or finish
+        self._update_consumers(key, state or finish)
         if self.validate:
             self.validate_key(key)
         self._notify_transition(key, start, finish, **kwargs)
 
+    def _consumer_urgency(self, key, state):
+        """ How urgently key, in state, needs its dependencies in memory
+
+        Tasks that run sooner, by state and then by priority, are more urgent.
+        """
+        urgency = CONSUMER_URGENCY.get(state)
+        if urgency is None:
+            return None
+        priority = self.priorities.get(key) or ()
+        return (urgency,) + tuple(-p for p in priority)
+
+    def _update_consumers(self, key, finish):
+        """ Tell the spill buffer how urgently we need the dependencies of key """
+        if not isinstance(self.data, SpillBuffer):
+            return
+        old = self._urgencies.pop(key, None)
+        new = self._consumer_urgency(key, finish)
+        if new is not None:
+            self._urgencies[key] = new
+        if old != new:
+            for dep in self.dependencies.get(key, ()):
+                self.data.update_consumers(dep, old, new)
+
     def transition_waiting_ready(self, key):
         try:
             if self.validate:
@@ -1590,7 +1860,8 @@ class Worker(ServerNode):
                 )
 
             self.executing.add(key)
-            self.loop.add_callback(self.execute, key)
+            if key not in self._batched:  # otherwise execute_batch runs it
+                self.loop.add_callback(self.execute, key)
         except Exception as e:
             logger.exception(e)
             if LOG_PDB:
@@ -1624,6 +1895,7 @@ class Worker(ServerNode):
 
             if self.task_state[key] == "executing":
                 self.executing.remove(key)
+                self._batched.discard(key)
                 self.executed_count += 1
             elif self.task_state[key] == "long-running":
                 self.long_running.remove(key)
@@ -1660,12 +1932,30 @@ class Worker(ServerNode):
                 pdb.set_trace()
             raise
 
+    def transition_executing_ready(self, key):
+        """ Put back a task that its batch didn't get to """
+        try:
+            if self.validate:
+                assert key in self._batched
+
+            self.executing.remove(key)
+            self._batched.remove(key)
+            heapq.heappush(self.ready, (self.priorities[key], key))
+        except Exception as e:
+            logger.exception(e)
+            if LOG_PDB:
+                import pdb
+
+                pdb.set_trace()
+            raise
+
     def transition_executing_long_running(self, key, compute_duration=None):
         try:
             if self.validate:
                 assert key in self.executing
 
             self.executing.remove(key)
+            self._batched.discard(key)
             self.long_running.add(key)
             self.batched_stream.send(
                 {"op": "long-running", "key": key, "compute_duration": compute_duration}
@@ -1688,22 +1978,12 @@ class Worker(ServerNode):
         return {
             "executing": key in self.executing,
             "waiting_for_data": key in self.waiting_for_data,
-            "heap": key in pluck(1, self.ready),
+            "heap": key in pluck(1, self.ready) or key in pluck(1, self._deferred),
             "data": key in self.data,
         }
 
     def story(self, *keys):
-        return [
-            msg
-            for msg in self.log
-            if any(key in msg for key in keys)
-            or any(
-                key in c
-                for key in keys
-                for c in msg
-                if isinstance(c, (tuple, list, set))
-            )
-        ]
+        return self.log.story(*keys)
 
     def ensure_communicating(self):
         changed = True
@@ -1721,19 +2001,22 @@ class Worker(ServerNode):
                     self.total_out_connections,
                 )
 
-                key = self.data_needed[0]
+                _, key = self.data_needed[0]
 
                 if key not in self.tasks:
-                    self.data_needed.popleft()
+                    self._pop_data_needed()
                     changed = True
                     continue
 
                 if self.task_state.get(key) != "waiting":
-                    self.log.append((key, "communication pass"))
-                    self.data_needed.popleft()
+                    self.log.debug((key, "communication pass"))
+                    self._pop_data_needed()
                     changed = True
                     continue
 
+                if self._prefetch_room() <= 0:
+                    break
+
                 deps = self.dependencies[key]
                 if self.validate:
                     assert all(dep in self.dep_state for dep in deps)
@@ -1754,7 +2037,7 @@ class Worker(ServerNode):
 
                     deps = [dep for dep in deps if dep not in missing_deps]
 
-                self.log.append(("gather-dependencies", key, deps))
+                self.log.debug(("gather-dependencies", key, deps), keys=[key] + deps)
 
                 in_flight = False
 
@@ -1762,6 +2045,9 @@ class Worker(ServerNode):
                     len(self.in_flight_workers) < self.total_out_connections
                     or self.comm_nbytes < self.total_comm_nbytes
                 ):
+                    room = self._prefetch_room()
+                    if room <= 0:
+                        break
                     dep = deps.pop()
                     if self.dep_state[dep] != "waiting":
                         continue
@@ -1779,7 +2065,9 @@ class Worker(ServerNode):
                         worker = random.choice(local)
                     else:
                         worker = random.choice(list(workers))
-                    to_gather, total_nbytes = self.select_keys_for_gather(worker, dep)
+                    to_gather, total_nbytes = self.select_keys_for_gather(
+                        worker, dep, room
+                    )
                     self.comm_nbytes += total_nbytes
                     self.in_flight_workers[worker] = to_gather
                     for d in to_gather:
@@ -1790,7 +2078,7 @@ class Worker(ServerNode):
                     changed = True
 
                 if not deps and not in_flight:
-                    self.data_needed.popleft()
+                    self._pop_data_needed()
         except Exception as e:
             logger.exception(e)
             if LOG_PDB:
@@ -1799,6 +2087,18 @@ class Worker(ServerNode):
                 pdb.set_trace()
             raise
 
+    def _push_data_needed(self, key):
+        """ Queue a waiting task to fetch its dependencies, at most once """
+        priority = self.priorities[key]
+        if self._data_needed_priorities.get(key, ()) != priority:
+            self._data_needed_priorities[key] = priority
+            heapq.heappush(self.data_needed, (priority, key))
+
+    def _pop_data_needed(self):
+        priority, key = heapq.heappop(self.data_needed)
+        if self._data_needed_priorities.get(key, ()) == priority:
+            del self._data_needed_priorities[key]
+
     def send_task_state_to_scheduler(self, key):
         if key in self.data or self.actors.get(key):
             try:
@@ -1846,20 +2146,32 @@ class Worker(ServerNode):
         if key in self.data:
             return
 
+        # Before storing the value, the spill buffer weighs it by its nbytes
+        if key not in self.nbytes:
+            self.nbytes[key] = sizeof(value)
+
         if key in self.actors:
             self.actors[key] = value
 
         else:
             start = time()
-            self.data[key] = value
+            if isinstance(self.data, SpillBuffer):
+                consumers = [
+                    self._urgencies[dep]
+                    for dep in self.dependents.get(key, ())
+                    if dep in self._urgencies
+                ]
+                self.data.put(key, value, consumers)
+            else:
+                self.data[key] = value
             stop = time()
             if stop - start > 0.020:
                 self.startstops[key].append(("disk-write", start, stop))
 
-        if key not in self.nbytes:
-            self.nbytes[key] = sizeof(value)
-
-        self.types[key] = type(value)
+        if isinstance(value, ChildValue):
+            self.types[key] = value.type
+        else:
+            self.types[key] = type(value)
 
         for dep in self.dependents.get(key, ()):
             if dep in self.waiting_for_data:
@@ -1873,17 +2185,89 @@ class Worker(ServerNode):
 
         self.log.append((key, "put-in-memory"))
 
-    def select_keys_for_gather(self, worker, dep):
+    def _prefetch_room(self):
+        """ Bytes that we may still fetch for tasks further down the queue
+
+        While threads have enough ready or running tasks, all further data is
+        fetched ahead of time, and we limit how much memory that takes.
+        """
+        if self.paused and self.graceful_pause and self.in_flight_workers:
+            return 0  # fetch from one worker at a time while paused
+        if not self.prefetch_budget:
+            return float("inf")
+        ready = len(self.ready) + len(self._deferred)
+        if self._busy_threads() + ready < self.nthreads:
+            return float("inf")  # threads need the data now
+        return self.prefetch_budget - self.comm_nbytes - self.fetched_nbytes
+
+    def _account_idle_time(self):
+        """ Add up the time that threads sit idle while tasks wait for data
+
+        This samples the worker's state periodically rather than on every
+        change of it.
+        """
+        now = time()
+        if self.waiting_for_data and not self.ready and not self._deferred:
+            idle = max(self.nthreads - self._busy_threads(), 0)
+            self.idle_time += idle * (now - self._idle_time_last)
+        self._idle_time_last = now
+
+    def _memory_pressure(self):
+        """ Whether process memory is above the target fraction of its limit """
+        fraction = (
+            self.memory_target_fraction
+            or self.memory_spill_fraction
+            or self.memory_pause_fraction
+        )
+        if not self.memory_limit or not fraction or not self.monitor.memory:
+            return False
+        return self.monitor.memory[-1] > fraction * self.memory_limit
+
+    def _spill_weight(self, key, value):
+        try:
+            return self.nbytes[key]
+        except KeyError:
+            return sizeof(value)
+
+    def _measure_rss(self, key):
+        """ Resident memory before computing key
+
+        Returns None unless we sample this task and can attribute changes of
+        memory to it, i.e. if no other tasks run and no data arrives.
+        """
+        if (
+            self.size_corrector is None
+            or len(self.executing) != 1
+            or self.in_flight_tasks
+            or not self.size_corrector.should_sample(key_split(key))
+        ):
+            return None
+        return self.monitor.proc.memory_info().rss
+
+    def _corrected_nbytes(self, key, nbytes, rss=None):
+        """ Correct the sizeof estimate of a computed value """
+        if self.size_corrector is None:
+            return nbytes
+        prefix = key_split(key)
+        if rss is not None and len(self.executing) == 1 and not self.in_flight_tasks:
+            delta = self.monitor.proc.memory_info().rss - rss
+            self.size_corrector.observe(prefix, nbytes, delta)
+        return self.size_corrector.correct(prefix, nbytes)
+
+    def select_keys_for_gather(self, worker, dep, max_nbytes=None):
         deps = {dep}
 
         total_bytes = self.nbytes[dep]
         L = self.pending_data_per_worker[worker]
+        if max_nbytes is None or max_nbytes > self.target_message_size:
+            max_nbytes = self.target_message_size
 
         while L:
             d = L.popleft()
             if self.dep_state.get(d) != "waiting":
                 continue
-            if total_bytes + self.nbytes[d] > self.target_message_size:
+            if total_bytes + self.nbytes[d] > max_nbytes:
+                L.appendleft(d)
                 break
             deps.add(d)
             total_bytes += self.nbytes[d]
@@ -1903,7 +2287,7 @@ class Worker(ServerNode):
                 # if a dep is no longer in-flight then don't fetch it
                 deps = tuple(dep for dep in deps if self.dep_state.get(dep) == "flight")
 
-                self.log.append(("request-dep", dep, worker, deps))
+                self.log.debug(("request-dep", dep, worker, deps), keys=(dep,) + deps)
                 logger.debug("Request %d keys", len(deps))
 
                 start = time()
@@ -1913,7 +2297,7 @@ class Worker(ServerNode):
                 stop = time()
 
                 if response["status"] == "busy":
-                    self.log.append(("busy-gather", worker, deps))
+                    self.log.debug(("busy-gather", worker, deps), keys=deps)
                     for dep in deps:
                         if self.dep_state.get(dep, None) == "flight":
                             self.transition_dep(dep, "waiting")
@@ -1931,6 +2315,12 @@ class Worker(ServerNode):
                 total_bytes = sum(self.nbytes.get(dep, 0) for dep in response["data"])
                 duration = (stop - start) or 0.010
                 bandwidth = total_bytes / duration
+                self.outgoing_limit.observe(
+                    total_bytes,
+                    duration,
+                    in_use=len(self.in_flight_workers),
+                    pressure=self._memory_pressure(),
+                )
                 self.incoming_transfer_log.append(
                     {
                         "start": start + self.scheduler_delay,
@@ -1962,10 +2352,13 @@ class Worker(ServerNode):
                 self.counters["transfer-count"].add(len(response["data"]))
                 self.incoming_count += 1
 
-                self.log.append(("receive-dep", worker, list(response["data"])))
+                if self.log.verbose:
+                    keys = list(response["data"])
+                    self.log.append(("receive-dep", worker, keys), keys=keys)
             except EnvironmentError as e:
                 logger.exception("Worker stream died during communication: %s", worker)
-                self.log.append(("receive-dep-failed", worker))
+                self.log.append(("receive-dep-failed", worker), keys=deps)
+                self.outgoing_limit.failure()
                 for d in self.has_what.pop(worker):
                     self.who_has[d].remove(worker)
                     if not self.who_has[d]:
@@ -1992,7 +2385,7 @@ class Worker(ServerNode):
                         )
 
                     if not busy and d not in data and d in self.dependents:
-                        self.log.append(("missing-dep", d))
+                        self.log.append(("missing-dep", d), keys=(d,))
                         self.batched_stream.send(
                             {"op": "missing-data", "errant_worker": worker, "key": d}
                         )
@@ -2025,7 +2418,7 @@ class Worker(ServerNode):
 
     async def handle_missing_dep(self, *deps, **kwargs):
         original_deps = list(deps)
-        self.log.append(("handle-missing", deps))
+        self.log.append(("handle-missing", deps), keys=deps)
         try:
             deps = {dep for dep in deps if dep in self.dependents}
             if not deps:
@@ -2053,18 +2446,22 @@ class Worker(ServerNode):
                 self.suspicious_deps[dep] += 1
 
                 if not who_has.get(dep):
-                    self.log.append((dep, "no workers found", self.dependents.get(dep)))
+                    dependents = self.dependents.get(dep)
+                    self.log.append(
+                        (dep, "no workers found", dependents),
+                        keys=(dep,) + tuple(dependents or ()),
+                    )
                     self.release_dep(dep)
                 else:
                     self.log.append((dep, "new workers found"))
                     for key in self.dependents.get(dep, ()):
                         if key in self.waiting_for_data:
-                            self.data_needed.append(key)
+                            self._push_data_needed(key)
 
         except Exception:
             logger.error("Handle missing dep failed, retrying", exc_info=True)
             retries = kwargs.get("retries", 5)
-            self.log.append(("handle-missing-failed", retries, deps))
+            self.log.append(("handle-missing-failed", retries, deps), keys=deps)
             if retries > 0:
                 await self.handle_missing_dep(self, *deps, retries=retries - 1)
             else:
@@ -2118,6 +2515,8 @@ class Worker(ServerNode):
             if key not in self.task_state:
                 return
             state = self.task_state.pop(key)
+            self._update_consumers(key, None)
+            self._prepared.discard(key)
             if cause:
                 self.log.append((key, "release-key", {"cause": cause}))
             else:
@@ -2128,6 +2527,8 @@ class Worker(ServerNode):
                     del self.data[key]
                 except FileNotFoundError:
                     logger.error("Tried to delete %s but no file found", exc_info=True)
+                if self.process_pool is not None:
+                    self.process_pool.forget(key)
                 del self.nbytes[key]
                 del self.types[key]
             if key in self.actors and key not in self.dep_state:
@@ -2162,6 +2563,7 @@ class Worker(ServerNode):
 
             if key in self.executing:
                 self.executing.remove(key)
+                self._batched.discard(key)
 
             if key in self.resource_restrictions:
                 if state == "executing":
@@ -2195,10 +2597,16 @@ class Worker(ServerNode):
                 for worker in self.who_has.pop(dep):
                     self.has_what[worker].remove(dep)
 
+            if dep in self._fetched:
+                self._fetched.remove(dep)
+                self.fetched_nbytes -= self.nbytes.get(dep) or 0
+
             if dep not in self.task_state:
                 if dep in self.data:
                     del self.data[dep]
                     del self.types[dep]
+                    if self.process_pool is not None:
+                        self.process_pool.forget(dep)
                 if dep in self.actors:
                     del self.actors[dep]
                     del self.types[dep]
@@ -2366,6 +2774,12 @@ class Worker(ServerNode):
         if not isinstance(self.tasks[key], SerializedTask):
             return self.tasks[key]
         try:
+            missing = _missing_payloads(self.tasks[key])
+            if missing:
+                raise ValueError(
+                    "Could not get the pickled functions or arguments %s of task %s"
+                    " from the scheduler" % (", ".join(missing), key)
+                )
             start = time()
             function, args, kwargs = _deserialize(*self.tasks[key])
             stop = time()
@@ -2382,17 +2796,171 @@ class Worker(ServerNode):
             self.log.append((key, "deserialize-error"))
             raise
 
+    def _is_prepared(self, key):
+        """ Whether we can start to execute key without blocking the event loop
+
+        Deserializing large tasks and reading spilled dependencies from disk
+        can take seconds, so ``_prepare`` does these in other threads first.
+        """
+        if key in self._prepared:
+            return True
+        if key in self._preparing:
+            return False
+        if _missing_payloads(self.tasks[key]) or _needs_offload(self.tasks[key]):
+            return False
+        if isinstance(self.data, SpillBuffer) and len(self.data.slow):
+            if any(self.data.is_spilled(dep) for dep in self.dependencies[key]):
+                return False
+        self._prepared.add(key)
+        return True
+
+    def _prepare(self, key):
+        if key not in self._preparing and key not in self._prepared:
+            self._preparing.add(key)
+            self.loop.add_callback(self._prepare_async, key)
+
+    def _resolve_payloads(self, task, payloads=None):
+        """ Replace references to payloads in a serialized task by payloads
+
+        We look in the ``payloads`` that we just received before our cache,
+        which doesn't keep payloads larger than itself.
+        """
+        if not _missing_payloads(task):
+            return task
+        payloads = payloads or {}
+        resolved = dict()
+        for field, part in zip(task._fields, task[:3]):
+            digest = ref_digest(part)
+            if digest is not None:
+                resolved[field] = payloads.get(digest) or self.payloads.get(
+                    digest, part
+                )
+        return task._replace(**resolved)
+
+    async def _prepare_async(self, key):
+        """ Fetch missing parts of a task, deserialize it and load its spilled
+        dependencies, without blocking the event loop """
+        try:
+            task = self.tasks.get(key)
+            missing = _missing_payloads(task)
+            if missing:
+                # We evicted these from our cache, the scheduler still has them
+                self.log.append((key, "fetch-payloads"))
+                payloads = await self.scheduler.get_payloads(digests=missing)
+                self.payloads.update(payloads)
+                if self.tasks.get(key) is task:
+                    self.tasks[key] = task = self._resolve_payloads(task, payloads)
+
+            if _needs_offload(task):
+                start = time()
+                try:
+                    result = await offload(_deserialize, *task)
+                except Exception:
+                    pass  # raised again, and reported, by _maybe_deserialize_task
+                else:
+                    if self.tasks.get(key) is task:
+                        self.tasks[key] = result
+                        self.startstops[key].append(("deserialize", start, time()))
+
+            if isinstance(self.data, SpillBuffer):
+                deps = [
+                    dep
+                    for dep in self.dependencies.get(key, ())
+                    if self.data.is_spilled(dep)
+                ]
+                if deps:
+                    start = time()
+                    # On failure we read from disk again in execute
+                    await asyncio.gather(
+                        *map(self.data.unspill, deps), return_exceptions=True
+                    )
+                    stop = time()
+                    if key in self.task_state:
+                        self.startstops[key].append(("disk-read", start, stop))
+                    if self.digests is not None:
+                        self.digests["disk-load-duration"].add(stop - start)
+        except Exception as e:
+            logger.exception(e)
+        finally:
+            self._preparing.discard(key)
+            if self.task_state.get(key) in READY:
+                self._prepared.add(key)
+                self.ensure_computing()
+
+    def _prefetch(self):
+        """ Prepare the tasks that we will probably run next
+
+        We only look at the first few entries of the heap.  They aren't
+        exactly the next tasks in priority order, but close, and cheap to find.
+        """
+        for _, key in self.ready[: self.nthreads]:
+            if self.task_state.get(key) in READY and not self._is_prepared(key):
+                self._prepare(key)
+
+    def _busy_threads(self):
+        """ Number of threads running tasks, each batch occupies one thread """
+        return len(self.executing) - len(self._batched) + self._nbatches
+
+    def _is_batchable(self, key):
+        # What we measured ourselves beats the estimate of the scheduler
+        duration = self._batch_prefix_durations.get(key_split(key))
+        if duration is None:
+            duration = self.durations.get(key)
+        return (
+            duration is not None
+            and duration < self.batch_duration
+            and key not in self.resource_restrictions
+        )
+
+    def _collect_batch(self, key):
+        """ Pop further short tasks of the same prefix as key from ready
+
+        We leave enough tasks in ``ready`` to keep the other threads busy.
+        """
+        batch = [key]
+        prefix = key_split(key)
+        size = min(self.batch_size, len(self.ready) // self.nthreads + 1)
+        while self.ready and len(batch) < size:
+            _, key = self.ready[0]
+            if self.task_state.get(key) not in READY:
+                heapq.heappop(self.ready)
+                continue
+            if not (
+                self._is_batchable(key)
+                and key_split(key) == prefix
+                and self._is_prepared(key)
+            ):
+                break
+            heapq.heappop(self.ready)
+            self._prepared.discard(key)
+            try:
+                self.tasks[key] = self._maybe_deserialize_task(key)
+            except Exception:
+                continue
+            batch.append(key)
+        return batch
+
     def ensure_computing(self):
         if self.paused:
+            if self.graceful_pause:
+                self._compute_while_paused()
             return
+        if self._deferred:
+            for item in self._deferred:
+                heapq.heappush(self.ready, item)
+            self._deferred = []
         try:
-            while self.constrained and len(self.executing) < self.nthreads:
+            while self.constrained and self._busy_threads() < self.nthreads:
                 key = self.constrained[0]
                 if self.task_state.get(key) != "constrained":
                     self.constrained.popleft()
                     continue
                 if self.meets_resource_constraints(key):
+                    if not self._is_prepared(key):
+                        self._prepare(key)  # calls ensure_computing when done
+                        break
                     self.constrained.popleft()
+                    self._prepared.discard(key)
                     try:
                         # Ensure task is deserialized prior to execution
                         self.tasks[key] = self._maybe_deserialize_task(key)
@@ -2401,15 +2969,73 @@ class Worker(ServerNode):
                     self.transition(key, "executing")
                 else:
                     break
-            while self.ready and len(self.executing) < self.nthreads:
-                _, key = heapq.heappop(self.ready)
+            # Tasks that we prepare go back to ready, we run the ones behind
+            # them rather than leave threads idle
+            skipped = []
+            popped = False
+            while self.ready and self._busy_threads() < self.nthreads:
+                _, key = self.ready[0]
+                if self.task_state.get(key) in READY and not self._is_prepared(key):
+                    self._prepare(key)  # calls ensure_computing when done
+                    if len(skipped) >= self.nthreads:
+                        break
+                    skipped.append(heapq.heappop(self.ready))
+                    continue
+                heapq.heappop(self.ready)
+                popped = True
                 if self.task_state.get(key) in READY:
+                    self._prepared.discard(key)
                     try:
                         # Ensure task is deserialized prior to execution
                         self.tasks[key] = self._maybe_deserialize_task(key)
                     except Exception:
                         continue
+                    if self.batch_duration and self._is_batchable(key):
+                        batch = self._collect_batch(key)
+                        if len(batch) > 1:
+                            self._batched.update(batch)
+                            for k in batch:
+                                self.transition(k, "executing")
+                            self._nbatches += 1
+                            self.loop.add_callback(self.execute_batch, batch)
+                            continue
                     self.transition(key, "executing")
+            for item in skipped:
+                heapq.heappush(self.ready, item)
+            if popped:
+                self._prefetch()
+        except Exception as e:
+            logger.exception(e)
+            if LOG_PDB:
+                import pdb
+
+                pdb.set_trace()
+            raise
+
+    def _compute_while_paused(self):
+        """ Only run tasks that free memory, like reductions
+
+        Other ready tasks wait in ``_deferred`` until the worker resumes.
+        """
+        try:
+            while self.ready and self._busy_threads() < self.nthreads:
+                _, key = self.ready[0]
+                if self.task_state.get(key) not in READY:
+                    heapq.heappop(self.ready)
+                    continue
+                if not self._frees_memory(key):
+                    heapq.heappush(self._deferred, heapq.heappop(self.ready))
+                    continue
+                if not self._is_prepared(key):
+                    self._prepare(key)  # calls ensure_computing when done
+                    break
+                heapq.heappop(self.ready)
+                self._prepared.discard(key)
+                try:
+                    self.tasks[key] = self._maybe_deserialize_task(key)
+                except Exception:
+                    continue
+                self.transition(key, "executing")
         except Exception as e:
             logger.exception(e)
             if LOG_PDB:
@@ -2429,88 +3055,65 @@ class Worker(ServerNode):
                 assert key not in self.waiting_for_data
                 assert self.task_state[key] == "executing"
 
-            function, args, kwargs = self.tasks[key]
-
-            start = time()
-            data = {}
-            for k in self.dependencies[key]:
-                try:
-                    data[k] = self.data[k]
-                except KeyError:
-                    from .actor import Actor  # TODO: create local actor
-
-                    data[k] = Actor(type(self.actors[k]), self.address, k, self)
-            args2 = pack_data(args, data, key_types=(bytes, str))
-            kwargs2 = pack_data(kwargs, data, key_types=(bytes, str))
-            stop = time()
-            if stop - start > 0.005:
-                self.startstops[key].append(("disk-read", start, stop))
-                if self.digests is not None:
-                    self.digests["disk-load-duration"].add(stop - start)
+            if self._uses_process_pool(key):
+                function, args2, kwargs2 = self.tasks[key]
+                data = {dep: self.data[dep] for dep in self.dependencies[key]}
+                func, args = self.process_pool.compute, (
+                    key,
+                    function,
+                    args2,
+                    kwargs2,
+                    data,
+                )
+            else:
+                data = None
+                if self.process_pool is not None:
+                    data = {
+                        dep: self.data[dep]
+                        for dep in self.dependencies[key]
+                        if dep in self.data
+                    }
+                    if any(isinstance(v, ChildValue) for v in data.values()):
+                        # Copying values out of the subprocesses takes a while
+                        data = await offload(
+                            valmap, self.process_pool.materialize, data
+                        )
+                        if key not in self.executing or key not in self.task_state:
+                            return
+                function, args2, kwargs2 = self._pack_task(key, data)
+                func, args = apply_function, (
+                    function,
+                    args2,
+                    kwargs2,
+                    self.execution_state,
+                    key,
+                    self.active_threads,
+                    self.active_threads_lock,
+                    self.scheduler_delay,
+                )
 
             logger.debug(
                 "Execute key: %s worker: %s", key, self.address
             )  # TODO: comment out?
+            rss = self._measure_rss(key)
             try:
-                result = await self.executor_submit(
-                    key,
-                    apply_function,
-                    args=(
-                        function,
-                        args2,
-                        kwargs2,
-                        self.execution_state,
-                        key,
-                        self.active_threads,
-                        self.active_threads_lock,
-                        self.scheduler_delay,
-                    ),
-                )
+                result = await self.executor_submit(key, func, args=args)
             except RuntimeError as e:
                 executor_error = e
                 raise
 
-            if self.task_state.get(key) not in ("executing", "long-running"):
-                return
-
-            result["key"] = key
-            value = result.pop("result", None)
-            self.startstops[key].append(("compute", result["start"], result["stop"]))
-            self.threads[key] = result["thread"]
-
-            if result["op"] == "task-finished":
-                self.nbytes[key] = result["nbytes"]
-                self.types[key] = result["type"]
-                self.transition(key, "memory", value=value)
-                if self.digests is not None:
-                    self.digests["task-duration"].add(result["stop"] - result["start"])
-            else:
-                if isinstance(result.pop("actual-exception"), Reschedule):
-                    self.batched_stream.send({"op": "reschedule", "key": key})
-                    self.transition(key, "rescheduled", report=False)
-                    self.release_key(key, report=False)
-                else:
-                    self.exceptions[key] = result["exception"]
-                    self.tracebacks[key] = result["traceback"]
-                    logger.warning(
-                        " Compute Failed\n"
-                        "Function:  %s\n"
-                        "args:      %s\n"
-                        "kwargs:    %s\n"
-                        "Exception: %s\n",
-                        str(funcname(function))[:1000],
-                        convert_args_to_str(args2, max_len=1000),
-                        convert_kwargs_to_str(kwargs2, max_len=1000),
-                        repr(result["exception"].data),
-                    )
-                    self.transition(key, "error")
-
-            logger.debug("Send compute response to scheduler: %s, %s", key, result)
+            self._finish_task(key, function, args2, kwargs2, result, rss)
 
             if self.validate:
                 assert key not in self.executing
                 assert key not in self.waiting_for_data
 
+            if self.batched_stream is not None:
+                # Don't start another task while the scheduler falls behind
+                await self.batched_stream.wait_for_buffer()
+            if isinstance(self.data, SpillBuffer) and self.data.spill_queue_full():
+                # Nor while the disk falls behind
+                await self.data.wait_for_spill()
             self.ensure_computing()
             self.ensure_communicating()
         except Exception as e:
@@ -2527,6 +3130,219 @@ class Worker(ServerNode):
             if key in self.executing:
                 self.executing.remove(key)
 
+    async def execute_batch(self, keys):
+        """ Run several short tasks back to back in a single thread
+
+        Submitting each task that runs in microseconds to the thread pool
+        costs more than running it, so we submit them together.  Results are
+        handled, and reported to the scheduler, together as well.
+        """
+        executor_error = None
+        try:
+            try:
+                if self.status in ("closing", "closed", "closing-gracefully"):
+                    return
+                tasks = [
+                    (key,) + self._pack_task(key)
+                    for key in keys
+                    if key in self.executing and key in self.task_state
+                ]
+                results = []
+                if tasks:
+                    try:
+                        results = await self.executor_submit(
+                            keys[0],
+                            apply_function_batch,
+                            args=(
+                                tasks,
+                                self.execution_state,
+                                self.active_threads,
+                                self.active_threads_lock,
+                                self.scheduler_delay,
+                                self.batch_duration * self.batch_size,
+                            ),
+                        )
+                    except RuntimeError as e:
+                        executor_error = e
+                        raise
+            finally:
+                self._nbatches -= 1  # the thread is free for other tasks
+
+            self.batched_count += len(results)
+            for (key, function, args2, kwargs2), result in zip(tasks, results):
+                self._finish_task(key, function, args2, kwargs2, result)
+
+            # Tasks took longer than expected and the batch stopped early
+            for key, _, _, _ in tasks[len(results) :]:
+                if key in self._batched:
+                    self.transition(key, "ready")
+
+            if self.batched_stream is not None:
+                await self.batched_stream.wait_for_buffer()
+            if isinstance(self.data, SpillBuffer) and self.data.spill_queue_full():
+                await self.data.wait_for_spill()
+            self.ensure_computing()
+            self.ensure_communicating()
+        except Exception as e:
+            if executor_error is e:
+                logger.error("Thread Pool Executor error: %s", e)
+            else:
+                logger.exception(e)
+                if LOG_PDB:
+                    import pdb
+
+                    pdb.set_trace()
+                raise
+        finally:
+            # Tasks that we never ran, e.g. because the executor failed
+            for key in keys:
+                if key in self._batched:
+                    if self.task_state.get(key) == "executing":
+                        self.transition(key, "ready")
+                    else:
+                        self._batched.remove(key)
+                        self.executing.discard(key)
+
+    def _uses_process_pool(self, key):
+        """ Whether to compute key in a subprocess, actors stay in threads """
+        return (
+            self.process_pool is not None
+            and key not in self.actors
+            and not any(dep in self.actors for dep in self.dependencies[key])
+        )
+
+    async def check_process_pool(self):
+        """ Restart the subprocesses of the process pool that died """
+        if any(not c.process.is_alive() for c in self.process_pool.children):
+            await offload(self.process_pool.check)
+
+    def _on_child_lost(self, child, keys):
+        self.loop.add_callback(self._lose_child_values, child, keys)
+
+    def _lose_child_values(self, child, keys):
+        """ Release the values of a subprocess that died
+
+        The scheduler computes them again if they are still needed.
+        """
+        lost = []
+        for key in keys:
+            value = self.data.get(key)
+            if not isinstance(value, ChildValue) or value.child != child:
+                continue
+            with self.process_pool.lock:
+                holders = self.process_pool.holders.get(key)
+                other = min(holders) if holders else None
+            if other is not None:  # another subprocess has a copy
+                self.data[key] = ChildValue(key, other, value.nbytes, value.type)
+                continue
+            self.log.append((key, "lost", child))
+            self.release_key(key, cause="lost", report=False)
+            self.release_dep(key)
+            lost.append(key)
+        if lost:
+            logger.warning("Lost %d values held by subprocess %d", len(lost), child)
+            self.batched_stream.send({"op": "release-worker-data", "keys": lost})
+
+    def _pack_task(self, key, loaded=None):
+        """ Function, args and kwargs of a task, with its dependencies in place
+
+        ``loaded`` holds dependencies that the caller loaded already.
+        """
+        function, args, kwargs = self.tasks[key]
+
+        start = time()
+        data = {}
+        for k in self.dependencies[key]:
+            if loaded and k in loaded:
+                data[k] = loaded[k]
+                continue
+            try:
+                data[k] = self.data[k]
+                if isinstance(data[k], ChildValue):
+                    data[k] = self.process_pool.materialize(data[k])
+            except KeyError:
+                from .actor import Actor  # TODO: create local actor
+
+                data[k] = Actor(type(self.actors[k]), self.address, k, self)
+        args2 = pack_data(args, data, key_types=(bytes, str))
+        kwargs2 = pack_data(kwargs, data, key_types=(bytes, str))
+        stop = time()
+        if stop - start > 0.005:
+            self.startstops[key].append(("disk-read", start, stop))
+            if self.digests is not None:
+                self.digests["disk-load-duration"].add(stop - start)
+        return function, args2, kwargs2
+
+    def _finish_task(self, key, function, args2, kwargs2, result, rss=None):
+        """ Handle the result of apply_function for a task """
+        if self.task_state.get(key) not in ("executing", "long-running"):
+            return
+
+        result["key"] = key
+        value = result.pop("result", None)
+        self.startstops[key].append(("compute", result["start"], result["stop"]))
+        self.threads[key] = result["thread"]
+        duration = result["stop"] - result["start"]
+        if self.batch_duration:
+            prefix = key_split(key)
+            old = self._batch_prefix_durations.get(prefix, duration)
+            self._batch_prefix_durations[prefix] = 0.5 * old + 0.5 * duration
+
+        if result["op"] == "task-finished":
+            self.nbytes[key] = self._corrected_nbytes(key, result["nbytes"], rss)
+            self.types[key] = result["type"]
+            self._observe_output_ratio(key)
+            self.transition(key, "memory", value=value)
+            if self.digests is not None:
+                self._task_durations.append(duration)
+                if len(self._task_durations) >= 100:
+                    self._flush_task_durations()
+        else:
+            if isinstance(result.pop("actual-exception"), Reschedule):
+                self.batched_stream.send({"op": "reschedule", "key": key})
+                self.transition(key, "rescheduled", report=False)
+                self.release_key(key, report=False)
+            else:
+                self.exceptions[key] = result["exception"]
+                self.tracebacks[key] = result["traceback"]
+                logger.warning(
+                    " Compute Failed\n"
+                    "Function:  %s\n"
+                    "args:      %s\n"
+                    "kwargs:    %s\n"
+                    "Exception: %s\n",
+                    str(funcname(function))[:1000],
+                    convert_args_to_str(args2, max_len=1000),
+                    convert_kwargs_to_str(kwargs2, max_len=1000),
+                    repr(result["exception"].data),
+                )
+                self.transition(key, "error")
+
+        logger.debug("Send compute response to scheduler: %s, %s", key, result)
+
+    def _observe_output_ratio(self, key):
+        """ Learn how large the results of a task prefix are to its inputs """
+        inputs = sum(self.nbytes.get(dep) or 0 for dep in self.dependencies[key])
+        if not inputs:
+            return
+        ratio = self.nbytes[key] / inputs
+        prefix = key_split(key)
+        old = self._output_ratios.get(prefix, ratio)
+        self._output_ratios[prefix] = 0.5 * old + 0.5 * ratio
+
+    def _frees_memory(self, key):
+        """ Whether a task is expected to return less data than it takes in """
+        if not self.dependencies.get(key):
+            return False
+        ratio = self._output_ratios.get(key_split(key))
+        return ratio is not None and ratio < 1
+
+    def _flush_task_durations(self):
+        """ Add buffered task durations to their digest in one batch """
+        if self._task_durations and self.digests is not None:
+            self.digests["task-duration"].update(self._task_durations)
+        self._task_durations = []
+
     ##################
     # Administrative #
     ##################
@@ -2534,19 +3350,35 @@ class Worker(ServerNode):
     async def memory_monitor(self):
         """ Track this process's memory usage and act accordingly
 
-        If we rise above 70% memory use, start dumping data to disk.
+        This includes the memory of the subprocesses of the process pool,
+        which hold the results that they computed.
 
-        If we rise above 80% memory use, stop execution of new tasks
+        If we rise above 70% memory use, start dumping data to disk.  Values
+        are written in background threads; see ``SpillBuffer``.
+
+        If we rise above 80% memory use, stop execution of new tasks, except
+        for tasks that are expected to free memory, like reductions.  See
+        ``distributed.worker.memory.graceful-pause``.
         """
         if self._memory_monitoring:
             return
         self._memory_monitoring = True
         total = 0
 
-        proc = self.monitor.proc
-        memory = proc.memory_info().rss
+        memory = self.monitor.process_memory()
         frac = memory / self.memory_limit
 
+        if self.memory_pause_fraction and frac > self.memory_pause_fraction:
+            pressure = 2
+        elif self.memory_spill_fraction and frac > self.memory_spill_fraction:
+            pressure = 1
+        else:
+            pressure = 0
+        if pressure != self.memory_pressure:
+            self.memory_pressure = pressure
+            # Tell the scheduler right away, rather than at the next heartbeat
+            self.loop.add_callback(self.heartbeat)
+
         # Pause worker threads if above 80% memory use
         if self.memory_pause_fraction and frac > self.memory_pause_fraction:
             # Try to free some memory while in paused state
@@ -2556,7 +3388,7 @@ class Worker(ServerNode):
                     "Worker is at %d%% memory usage. Pausing worker.  "
                     "Process memory: %s -- Worker memory limit: %s",
                     int(frac * 100),
-                    format_bytes(proc.memory_info().rss),
+                    format_bytes(self.monitor.process_memory()),
                     format_bytes(self.memory_limit)
                     if self.memory_limit is not None
                     else "None",
@@ -2567,7 +3399,7 @@ class Worker(ServerNode):
                 "Worker is at %d%% memory usage. Resuming worker. "
                 "Process memory: %s -- Worker memory limit: %s",
                 int(frac * 100),
-                format_bytes(proc.memory_info().rss),
+                format_bytes(self.monitor.process_memory()),
                 format_bytes(self.memory_limit)
                 if self.memory_limit is not None
                 else "None",
@@ -2577,34 +3409,52 @@ class Worker(ServerNode):
 
         # Dump data to disk if above 70%
         if self.memory_spill_fraction and frac > self.memory_spill_fraction:
+            buffer_pool = get_buffer_pool()
+            if buffer_pool is not None:
+                # Unused receive buffers are the cheapest memory to give back
+                buffer_pool.clear()
             target = self.memory_limit * self.memory_target_fraction
             count = 0
             need = memory - target
+            spill_buffer = isinstance(self.data, SpillBuffer)
             while memory > target:
+                if spill_buffer and not self.data.fast and self.data.spilling:
+                    # Everything left is already being written; wait for that
+                    await self.data.wait_for_spill(wait_all=True)
+                    self._throttled_gc.collect()
+                    memory = self.monitor.process_memory()
+                    continue
                 if not self.data.fast:
                     logger.warning(
                         "Memory use is high but worker has no data "
                         "to store to disk.  Perhaps some other process "
                         "is leaking memory?  Process memory: %s -- "
                         "Worker memory limit: %s",
-                        format_bytes(proc.memory_info().rss),
+                        format_bytes(self.monitor.process_memory()),
                         format_bytes(self.memory_limit)
                         if self.memory_limit is not None
                         else "None",
                     )
                     break
+                if spill_buffer and self.data.spill_queue_full():
+                    # Let the disk catch up before evicting more
+                    await self.data.wait_for_spill()
                 k, v, weight = self.data.fast.evict()
                 del k, v
                 total += weight
                 count += 1
                 await asyncio.sleep(0)
-                memory = proc.memory_info().rss
+                memory = self.monitor.process_memory()
                 if total > need and memory > target:
-                    # Issue a GC to ensure that the evicted data is actually
-                    # freed from memory and taken into account by the monitor
-                    # before trying to evict even more data.
+                    # Evicted values are only released once they have been
+                    # written.  Wait for that and issue a GC to ensure that
+                    # the evicted data is actually freed from memory and taken
+                    # into account by the monitor before trying to evict even
+                    # more data.
+                    if spill_buffer:
+                        await self.data.wait_for_spill(wait_all=True)
                     self._throttled_gc.collect()
-                    memory = proc.memory_info().rss
+                    memory = self.monitor.process_memory()
             if count:
                 logger.debug(
                     "Moved %d pieces of data data and %s to disk",
@@ -2765,7 +3615,7 @@ class Worker(ServerNode):
         )
 
     def validate_key_ready(self, key):
-        assert key in pluck(1, self.ready)
+        assert key in pluck(1, self.ready) or key in pluck(1, self._deferred)
         assert key not in self.data
         assert key not in self.executing
         assert key not in self.waiting_for_data
@@ -2853,8 +3703,11 @@ class Worker(ServerNode):
             for dep in self.dep_state:
                 self.validate_dep(dep)
 
+            assert set(self._data_needed_priorities).issubset(
+                pluck(1, self.data_needed)
+            )
             for key, deps in self.waiting_for_data.items():
-                if key not in self.data_needed:
+                if key not in self._data_needed_priorities:
                     for dep in deps:
                         assert (
                             dep in self.in_flight_tasks
@@ -3106,6 +3959,29 @@ def parse_memory_limit(memory_limit, nthreads, total_cores=CPU_COUNT):
     return min(memory_limit, system.MEMORY_LIMIT)
 
 
+def _use_shared_memory(comm, deserializers=None):
+    """ Whether to receive data through shared memory over this comm
+
+    Only if the peer may be on this host and we deserialize data with pickle.
+    Returns our shared memory namespace, which the peer compares to its own.
+    """
+    if not shared_memory_enabled():
+        return False
+    if deserializers is not None and "pickle" not in deserializers:
+        return False
+    try:
+        if not comm.deserialize:
+            return False
+        local, peer = comm.local_address, comm.peer_address
+    except (AttributeError, ValueError):
+        return False
+    if parse_address(peer)[0] not in ("tcp", "tls", "asyncio-tcp", "asyncio-tls"):
+        return False
+    if get_address_host(local) != get_address_host(peer):
+        return False
+    return shared_memory_namespace()
+
+
 async def get_data_from_worker(
     rpc,
     keys,
@@ -3146,6 +4022,7 @@ async def get_data_from_worker(
                 keys=keys,
                 who=who,
                 max_connections=max_connections,
+                shared_memory=_use_shared_memory(comm, deserializers),
             )
             try:
                 status = response["status"]
@@ -3153,6 +4030,10 @@ async def get_data_from_worker(
                 raise ValueError("Unexpected response", response)
             else:
                 if status == "OK":
+                    if "shared" in response:
+                        shared = response.pop("shared")
+                        loaded = await offload(valmap, loads_value, shared)
+                        response["data"].update(loaded)
                     await comm.write("OK")
             break
         except (EnvironmentError, CommClosedError):
@@ -3178,7 +4059,7 @@ async def get_data_from_worker(
 job_counter = [0]
 
 
-cache_loads = LRU(maxsize=100)
+cache_loads = PayloadCache(dask.config.get("distributed.comm.task-cache.size"))
 
 
 def loads_function(bytes_object):
@@ -3188,11 +4069,28 @@ def loads_function(bytes_object):
             result = cache_loads[bytes_object]
         except KeyError:
             result = pickle.loads(bytes_object)
-            cache_loads[bytes_object] = result
+            cache_loads.put(bytes_object, result, len(bytes_object))
         return result
     return pickle.loads(bytes_object)
 
 
+def _missing_payloads(task):
+    """ Digests of the parts of a serialized task that we don't hold yet """
+    if isinstance(task, SerializedTask):
+        return [d for d in map(ref_digest, task[:3]) if d is not None]
+    return []
+
+
+def _needs_offload(task):
+    """ Whether a task is so large that we deserialize it in another thread """
+    return (
+        isinstance(task, SerializedTask)
+        and FRAME_OFFLOAD_THRESHOLD
+        and sum(len(part) for part in task if isinstance(part, bytes))
+        > FRAME_OFFLOAD_THRESHOLD
+    )
+
+
 def _deserialize(function=None, args=None, kwargs=None, task=no_value):
     """ Deserialize task inputs and regularize to func, args, kwargs """
     if function is not None:
@@ -3228,7 +4126,7 @@ def execute_task(task):
         return task
 
 
-cache_dumps = LRU(maxsize=100)
+cache_dumps = PayloadCache(dask.config.get("distributed.comm.task-cache.size"))
 
 
 def dumps_function(func):
@@ -3237,8 +4135,7 @@ def dumps_function(func):
         result = cache_dumps[func]
     except KeyError:
         result = pickle.dumps(func)
-        if len(result) < 100000:
-            cache_dumps[func] = result
+        cache_dumps[func] = result
     except TypeError:  # Unhashable function
         result = pickle.dumps(func)
     return result
@@ -3316,13 +4213,13 @@ def apply_function(
     -------
     msg: dictionary with status, result/error, timings, etc..
     """
+    # Each thread only sets and removes its own entry, which is atomic, so
+    # we don't take active_threads_lock here.  Readers still copy under it.
     ident = threading.get_ident()
-    with active_threads_lock:
-        active_threads[ident] = key
-    thread_state.start_time = time()
+    active_threads[ident] = key
+    thread_state.start_time = start = time()
     thread_state.execution_state = execution_state
     thread_state.key = key
-    start = time()
     try:
         result = function(*args, **kwargs)
     except Exception as e:
@@ -3342,11 +4239,52 @@ def apply_function(
     msg["start"] = start + time_delay
     msg["stop"] = end + time_delay
     msg["thread"] = ident
-    with active_threads_lock:
-        del active_threads[ident]
+    del active_threads[ident]
     return msg
 
 
+def apply_function_batch(
+    tasks,
+    execution_state,
+    active_threads,
+    active_threads_lock,
+    time_delay,
+    time_limit=None,
+):
+    """ Run several tasks one after the other, collect information on each
+
+    Parameters
+    ----------
+    tasks: list of tuples
+        ``(key, function, args, kwargs)`` for each task
+    time_limit: float, optional
+        Don't start further tasks after this many seconds
+
+    Returns
+    -------
+    msgs: list of dictionaries, as returned by apply_function, for the tasks
+        that ran
+    """
+    msgs = []
+    start = time()
+    for key, function, args, kwargs in tasks:
+        if time_limit is not None and msgs and time() - start > time_limit:
+            break
+        msgs.append(
+            apply_function(
+                function,
+                args,
+                kwargs,
+                execution_state,
+                key,
+                active_threads,
+                active_threads_lock,
+                time_delay,
+            )
+        )
+    return msgs
+
+
 def apply_function_actor(
     function, args, kwargs, execution_state, key, active_threads, active_threads_lock
 ):
@@ -3357,17 +4295,14 @@ def apply_function_actor(
     msg: dictionary with status, result/error, timings, etc..
     """
     ident = threading.get_ident()
-
-    with active_threads_lock:
-        active_threads[ident] = key
+    active_threads[ident] = key
 
     thread_state.execution_state = execution_state
     thread_state.key = key
 
     result = function(*args, **kwargs)
 
-    with active_threads_lock:
-        del active_threads[ident]
+    del active_threads[ident]
 
     return result
 
@@ -3433,10 +4368,6 @@ def convert_kwargs_to_str(kwargs, max_len=None):
         return "{{{}}}".format(", ".join(strs))
 
 
-def weight(k, v):
-    return sizeof(v)
-
-
 async def run(server, comm, function, args=(), kwargs={}, is_coro=None, wait=True):
     function = pickle.loads(function)
     if is_coro is None: